@@ -1,5 +1,29 @@
-from .runner import Runner
-from .session import Session
-from .sessionconfig import SessionConfig
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .runner import Runner
+    from .session import Session
+    from .sessionconfig import SessionConfig
 
 __all__ = ["Runner", "Session", "SessionConfig"]
+
+# Submodules are imported on first use (PEP 562): Runner and Session pull in requests and
+# socketio, which tools that only read a session configuration do not need.
+_submodules = {
+    "Runner": ".runner",
+    "Session": ".session",
+    "SessionConfig": ".sessionconfig",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _submodules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_submodules[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
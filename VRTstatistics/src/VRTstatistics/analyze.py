@@ -1,10 +1,28 @@
 from __future__ import annotations
+import contextlib
 import fnmatch
-from typing import List, Optional, Sequence
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
-from .datastore import DataStoreError
+from .datastore import DataStore, DataStoreError, Predicate, FieldSpecifier, Query
+from .annotation import STAGE_LATENCY_FIELDS
 
-__all__ = ["DataFrameFilter", "TileCombiner", "SessionTimeFilter"]
+__all__ = [
+    "DataFrameFilter", "TileCombiner", "SessionTimeFilter",
+    "dataframe_to_pcindex_for_tile", "dataframe_to_pcindex_latencies_for_tile",
+    "dataframe_to_pcindex", "dataframe_to_pcindex_latencies",
+    "normalize_progress", "dataframe_to_frame_latencies",
+    "windowed_statistics", "histogram2d_over_time", "downsample_dataframe",
+    "STAGE_LATENCY_FIELDS",
+]
+
+
+def _copy_on_write() -> contextlib.AbstractContextManager:
+    """Context in which pandas uses Copy-on-Write, so intermediate frames share data instead of copying it."""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return contextlib.nullcontext()  # Always on in pandas 3
+    return pd.option_context("mode.copy_on_write", True)
 
 
 class DataFrameFilter:
@@ -14,6 +32,11 @@ class DataFrameFilter:
     filter before itself and returns the RHS filter.
     
     Not elegant, but it means filters can be stacked left-to-right with +.
+
+    When a chain is called it is compiled into a single execution plan where possible:
+    row filters are applied first, column patterns are resolved once, and all combined
+    columns are computed from the same frame and added in one pass (see _run_fused).
+    Chains that cannot be fused are run filter by filter.
     """
     previous_filter : Optional[DataFrameFilter]
 
@@ -25,11 +48,102 @@ class DataFrameFilter:
         return other
 
     def __call__(self, dataframe : pd.DataFrame) -> pd.DataFrame:
-        if self.previous_filter:
-            dataframe = self.previous_filter(dataframe)
-        dataframe = self._apply(dataframe)
+        with _copy_on_write():
+            return self._run(self.chain(), dataframe)
+
+    def query(self, datastore : DataStore, predicate : Optional[Predicate] = None, fields : Optional[List[FieldSpecifier]] = None) -> pd.DataFrame:
+        """
+        Get a DataFrame from datastore and apply this filter chain to it.
+
+        Row filters in the chain that can be expressed as a predicate are pushed down into
+        the datastore query, so the rows they remove are never materialized.
+        """
+        predicate, filters = self._push_down(predicate)
+        dataframe = datastore.get_dataframe(predicate=predicate, fields=fields)
+        with _copy_on_write():
+            return self._run(filters, dataframe)
+
+    def query_args(self, predicate : Optional[Predicate] = None, fields : Optional[List[FieldSpecifier]] = None) -> Query:
+        """Return the (predicate, fields) that query() passes to DataStore.get_dataframe(), for DataStore.prefetch()."""
+        return self._push_down(predicate)[0], fields
+
+    def _push_down(self, predicate : Optional[Predicate]) -> Tuple[Optional[Predicate], List[DataFrameFilter]]:
+        """
+        Combine the row predicates of the filters at the start of the chain with predicate.
+        Returns the predicate and the filters still to be run.
+        """
+        filters = self.chain()
+        npushed = 0
+        while npushed < len(filters) and filters[npushed].row_predicate() is not None:
+            npushed += 1
+        if npushed and (predicate is None or isinstance(predicate, str)):
+            clauses = ([f"({predicate})"] if predicate else []) + [f"({f.row_predicate()})" for f in filters[:npushed]]
+            predicate = " and ".join(clauses)
+            filters = filters[npushed:]
+        return predicate, filters
+
+    def chain(self) -> List[DataFrameFilter]:
+        """Return all filters in this chain, in the order in which they are applied."""
+        rv : List[DataFrameFilter] = []
+        f : Optional[DataFrameFilter] = self
+        while f is not None:
+            rv.insert(0, f)
+            f = f.previous_filter
+        return rv
+
+    def row_predicate(self) -> Optional[str]:
+        """If this filter only removes rows, a Predicate expression selecting the records it keeps. Otherwise None."""
+        return None
+
+    def _run(self, filters : List[DataFrameFilter], dataframe : pd.DataFrame) -> pd.DataFrame:
+        if len(filters) > 1:
+            rv = self._run_fused(filters, dataframe)
+            if rv is not None:
+                return rv
+        for f in filters:
+            dataframe = f._apply(dataframe)
         return dataframe
 
+    @staticmethod
+    def _run_fused(filters : List[DataFrameFilter], dataframe : pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Run a chain of row filters followed by combined TileCombiners as one plan. Returns None
+        if the chain cannot be fused (a filter that is neither, a row filter after a combiner,
+        whose input it would change, or a pattern matching a column that an earlier filter in
+        the chain produces or removes).
+        """
+        combiners : List[TileCombiner] = []
+        for f in filters:
+            if isinstance(f, TileCombiner) and f.combined:
+                combiners.append(f)
+            elif f.row_predicate() is None or combiners:
+                return None
+        for f in filters:
+            if f not in combiners:
+                dataframe = f._apply(dataframe)
+        all_columns : List[str] = list(dataframe.columns)
+        produced : set = set()
+        consumed : set = set()
+        plan : List[Tuple[TileCombiner, List[str]]] = []
+        for c in combiners:
+            column_names = sorted(col for col in all_columns if fnmatch.fnmatchcase(col, c.pattern))
+            produced_matches = [col for col in produced if fnmatch.fnmatchcase(col, c.pattern)]
+            if produced_matches or consumed & set(column_names) or c.column in all_columns:
+                return None
+            if column_names:
+                plan.append((c, column_names))
+                produced.add(c.column)
+                if not c.keep:
+                    consumed |= set(column_names)
+            elif not c.optional and not c.didwarn:
+                print(f'Warning: pattern {c.pattern} did not select any columns. Returning dataframe as-is.')
+                c.didwarn = True
+        new_columns = {c.column: c._combine(dataframe, column_names) for c, column_names in plan}
+        rv = dataframe.drop(columns=[col for col in all_columns if col in consumed])
+        if new_columns:
+            rv = pd.concat([rv, pd.DataFrame(new_columns, index=dataframe.index)], axis=1)
+        return rv
+
     def _apply(self, dataframe : pd.DataFrame) -> pd.DataFrame:
         return dataframe
 
@@ -38,6 +152,9 @@ class SessionTimeFilter(DataFrameFilter):
     DataFrameFilter that removes all items with sessiontime < 0
     """
 
+    def row_predicate(self) -> Optional[str]:
+        return '"sessiontime" in record and sessiontime >= 0'
+
     def _apply(self, dataframe : pd.DataFrame) -> pd.DataFrame:
         dataframe = dataframe[dataframe["sessiontime"] >= 0]
         return dataframe
@@ -46,6 +163,10 @@ class TileCombiner(DataFrameFilter):
     """
     DafaFrameFilter that combines columns matching a pattern into a new column.
 
+    The matched columns (usually one per tile) report at different session times. They are
+    aligned on the session times of the rows where the first matched column (in name order) has a value,
+    and then combined with a NaN-ignoring NumPy reduction.
+
     :param pattern: A (shell-like) pattern selecting one or more columns
     :type pattern: str
     :param column: name of the output column
@@ -58,16 +179,31 @@ class TileCombiner(DataFrameFilter):
     :type keep: bool
     :param optional: don't complain if pattern doesn't match anything, return the dataFrama as-is.
     :type optional: bool
+    :param align: How values of the other columns are found for each row: "nearest" (closest session time), "asof" (latest at or before the session time) or "bins" (mean over the fixed-interval bin containing the session time).
+    :type align: str
+    :param tolerance: For "nearest" and "asof": maximum session time difference in seconds, values further away are treated as missing. The default, None, is twice the median time between the samples of each column, so gaps in reporting stay gaps. Use math.inf for no limit.
+    :type tolerance: Optional[float]
+    :param interval: For "bins": bin width in seconds.
+    :type interval: Optional[float]
     """
 
-    def __init__(self, pattern : str, column : str, function : str, combined : bool = False, keep : bool = False, optional : bool = False) -> None:
+    def __init__(self, pattern : str, column : str, function : str, combined : bool = False, keep : bool = False, optional : bool = False, align : str = "nearest", tolerance : Optional[float] = None, interval : Optional[float] = None) -> None:
         super().__init__()
+        if function not in ("sum", "mean", "min", "max"):
+            raise DataStoreError(f"Unknown function {function}")
+        if align not in ("nearest", "asof", "bins"):
+            raise DataStoreError(f"Unknown alignment {align}")
+        if align == "bins" and not interval:
+            raise DataStoreError("align='bins' requires an interval")
         self.pattern = pattern
         self.column = column
         self.function = function
         self.combined = combined
         self.keep = keep
         self.optional = optional
+        self.align = align
+        self.tolerance = tolerance
+        self.interval = interval
         self.didwarn = False
 
     def _apply(self, dataframe : pd.DataFrame) -> pd.DataFrame:
@@ -77,53 +213,84 @@ class TileCombiner(DataFrameFilter):
                 print(f'Warning: pattern {self.pattern} did not select any columns. Returning dataframe as-is.')
                 self.didwarn = True
             return dataframe
-        rv = None
-        for n in column_names:
-            # Create scaffolding (sessiontimes) if we haven't done so.
-            filter = dataframe[n].notna()
-            if rv is None:
-                rv = dataframe[filter].copy()
-                rv.drop(column_names, axis=1, inplace=True)
-                # rv = rv["sessiontime"]
-            # filter out values for this column
-            c = dataframe.loc[filter, n]
-            
-            # Insert
-            new_values = list(c)
-            while len(new_values) < len(rv):
-                new_values.append(0)
-            while len(new_values) > len(rv):
-                new_values = new_values[:-1]
-            rv[n] = new_values
-        # Now sum the relevant columns
-        assert rv is not None
-        if self.function == "sum":
-            rv[self.column] = rv[column_names].sum(axis=1)
-        elif self.function == "mean":
-            rv[self.column] = rv[column_names].mean(axis=1)
-        elif self.function == "min":
-            rv[self.column] = rv[column_names].min(axis=1)
-        elif self.function == "max":
-            rv[self.column] = rv[column_names].max(axis=1)
-        else:
-            raise DataStoreError(f"Unknown function {self.function}")
-        rv.drop(column_names, axis=1, inplace=True)
+        combined = self._combine(dataframe, column_names)
         if self.combined:
-            orig_columns : List[str] = list(dataframe.keys())
-            rv_columns : List[str] = list(rv.keys())
-            todrop_columns : List[str] = []
-            for c in orig_columns:
-                if c in rv_columns:
-                    todrop_columns.append(c)
-            rv.drop(todrop_columns, axis=1, inplace=True)
-            rv = dataframe.join(rv)
+            rv = dataframe.assign(**{self.column: combined})
             if not self.keep:
-                rv.drop(column_names, axis=1, inplace=True)
+                rv = rv.drop(columns=column_names)
+        else:
+            rv = dataframe.loc[combined.index].drop(columns=column_names)
+            rv[self.column] = combined
         return rv
 
+    def _combine(self, dataframe : pd.DataFrame, column_names : List[str]) -> pd.Series:
+        """
+        Align the given columns on the session times of the first one and reduce them.
+
+        Returns a Series indexed by the rows of dataframe where the first column has a value.
+        """
+        times = dataframe["sessiontime"].to_numpy(dtype=float)
+        base_mask = dataframe[column_names[0]].notna().to_numpy()
+        base_times = times[base_mask]
+        aligned = np.empty((len(base_times), len(column_names)))
+        for i, n in enumerate(column_names):
+            values = dataframe[n].to_numpy(dtype=float)
+            present = ~np.isnan(values)
+            aligned[:, i] = self._align_column(times[present], values[present], base_times)
+        return pd.Series(self._reduce(aligned), index=dataframe.index[base_mask], name=self.column)
+
+    def _align_column(self, times : np.ndarray, values : np.ndarray, base_times : np.ndarray) -> np.ndarray:
+        """Look up the value of one column (samples at times) for every one of base_times. NaN where there is none."""
+        rv = np.full(len(base_times), np.nan)
+        if len(times) == 0:
+            return rv
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        values = values[order]
+        if self.align == "bins":
+            assert self.interval
+            bins = np.floor(times / self.interval)
+            unique_bins, inverse = np.unique(bins, return_inverse=True)
+            bin_means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+            base_bins = np.floor(base_times / self.interval)
+            idx = np.clip(np.searchsorted(unique_bins, base_bins), 0, len(unique_bins) - 1)
+            found = unique_bins[idx] == base_bins
+            rv[found] = bin_means[idx[found]]
+            return rv
+        if self.align == "asof":
+            idx = np.searchsorted(times, base_times, side="right") - 1
+            found = idx >= 0
+            idx = np.clip(idx, 0, len(times) - 1)
+        else:
+            after = np.clip(np.searchsorted(times, base_times), 0, len(times) - 1)
+            before = np.clip(after - 1, 0, len(times) - 1)
+            idx = np.where(np.abs(times[after] - base_times) < np.abs(base_times - times[before]), after, before)
+            found = np.ones(len(base_times), dtype=bool)
+        tolerance = self.tolerance
+        if tolerance is None:
+            spacing = np.diff(np.unique(times))
+            tolerance = 2 * float(np.median(spacing)) if len(spacing) else math.inf
+        found &= np.abs(times[idx] - base_times) <= tolerance
+        rv[found] = values[idx[found]]
+        return rv
+
+    def _reduce(self, aligned : np.ndarray) -> np.ndarray:
+        """Apply self.function across the aligned columns, ignoring NaN. All-NaN rows give NaN."""
+        present = ~np.isnan(aligned)
+        count = present.sum(axis=1)
+        if self.function == "min":
+            return np.fmin.reduce(aligned, axis=1)
+        if self.function == "max":
+            return np.fmax.reduce(aligned, axis=1)
+        total = np.where(present, aligned, 0).sum(axis=1)
+        if self.function == "mean":
+            total = total / np.maximum(count, 1)
+        return np.where(count > 0, total, np.nan)
+
     def _get_column_names(self, dataframe : pd.DataFrame, pattern : str) -> List[str]:
         """
-        Return all column names in a DataFrame that match the given pattern
+        Return all column names in a DataFrame that match the given pattern, sorted (so the
+        first one does not depend on the order of the records the DataFrame was made from)
         
         :param dataframe: the DataFrame
         :type dataframe: pd.DataFrame
@@ -137,7 +304,7 @@ class TileCombiner(DataFrameFilter):
         for col in all_columns:
             if fnmatch.fnmatchcase(col, pattern):
                 rv.append(col)
-        return rv
+        return sorted(rv)
 
 def _df_to_pc_index_1(df : pd.DataFrame, column : str) -> pd.DataFrame:
     """Helper - convert a single column from time->index mapping into index->time mapping"""
@@ -204,3 +371,317 @@ def dataframe_to_pcindex_latencies_for_tile(dataframe : pd.DataFrame, tilenum :
     rv.drop(f'{receiver}.pc.decoder.{tilenum}.sessiontime', axis=1, inplace=True)
     rv.drop(f'{receiver}.pc.reader.{tilenum}.sessiontime', axis=1, inplace=True)
     return rv
+
+
+def normalize_progress(dataframe : pd.DataFrame, sender : str="sender", nTiles : int=1, nQualities : int=1) -> pd.DataFrame:
+    """
+    Normalize aggregate_packets counts in a progress dataframe to point-cloud sequence numbers.
+
+    Umbrella (".all") components count packets for all tiles, and the sender encoder
+    counts one packet per tile per quality, so these are divided accordingly.
+    """
+    if nTiles <= 1:
+        return dataframe
+    dataframe = dataframe.copy()
+    for col in dataframe.columns:
+        if col == 'sessiontime':
+            continue
+        if '.all' in col:
+            dataframe[col] = dataframe[col] / nTiles
+        elif col == f"{sender}.pc.encoder":
+            dataframe[col] = dataframe[col] / (nTiles * nQualities)
+    return dataframe
+
+_PC_COLUMN_RE = r"^(?P<role>[^.]+)\.pc\.(?P<stage>[a-z]+)(?:\.(?P<tile>[^.]+))?$"
+
+def _progress_to_long(dataframe : pd.DataFrame) -> pd.DataFrame:
+    """
+    Helper - melt a progress dataframe into long form.
+
+    Returns one row per (role, stage, tile, pc_index): the first sessiontime at which that
+    pipeline stage reported that point-cloud sequence number. Columns that are not
+    "role.pc.stage[.tile]" are ignored, tile is "" for untiled stages.
+    """
+    columns = pd.Series([c for c in dataframe.columns if c != "sessiontime"], dtype=object)
+    parsed = columns.str.extract(_PC_COLUMN_RE).fillna({"tile": ""})
+    parsed.index = columns
+    parsed = parsed.dropna(subset=["role"])
+    long = dataframe.melt(id_vars=["sessiontime"], value_vars=list(parsed.index), var_name="column", value_name="pc_index")
+    long = long[long["pc_index"] > 0]
+    long = long.join(parsed, on="column")
+    long["pc_index"] = long["pc_index"].astype("int64")
+    rv = long.groupby(["role", "stage", "tile", "pc_index"], sort=False)["sessiontime"].min().reset_index()
+    return rv
+
+def dataframe_to_pcindex(dataframe : pd.DataFrame, include_sender : bool=False, sender : str="sender", receiver : str="receiver") -> pd.DataFrame:
+    """
+    Re-index a progress dataframe from session-time rows to per-pointcloud rows, for all tiles at once.
+
+    Same as dataframe_to_pcindex_for_tile, but the progress frame is melted once and pivoted
+    into a (tile, pc_index) MultiIndex. Columns hold the session time at which each stage first
+    reported that point cloud: {receiver}.pc.reader.sessiontime, {receiver}.pc.decoder.sessiontime,
+    {receiver}.pc.preparer.sessiontime, preceded by {sender}.pc.writer.sessiontime if include_sender.
+    Only numbered tiles are included (".all" umbrella columns are not per-tile).
+    """
+    stages = [(receiver, "reader"), (receiver, "decoder"), (receiver, "preparer")]
+    if include_sender:
+        stages.insert(0, (sender, "writer"))
+    long = _progress_to_long(dataframe)
+    long = long[long["tile"].str.isdigit()]
+    long = long.assign(column=long["role"] + ".pc." + long["stage"] + ".sessiontime", tile=long["tile"].astype("int64"))
+    columns = [f"{role}.pc.{stage}.sessiontime" for role, stage in stages]
+    long = long[long["column"].isin(columns)]
+    rv = long.pivot(index=["tile", "pc_index"], columns="column", values="sessiontime")
+    rv = rv.reindex(columns=columns).sort_index()
+    rv.columns.name = None
+    # As in the per-tile version: one row per point cloud seen by the first stage.
+    return rv[rv[columns[0]].notna()]
+
+def dataframe_to_pcindex_latencies(dataframe : pd.DataFrame, sender : str="sender", receiver : str="receiver") -> pd.DataFrame:
+    """
+    Stage-to-stage latencies per point cloud, for all tiles at once.
+
+    Same as dataframe_to_pcindex_latencies_for_tile, vectorized over all tiles. Output is indexed
+    by (tile, pc_index), with columns:
+      - sessiontime: when the reader received this point cloud
+      - {receiver}.pc.decoder.latency: seconds after reader arrival the decoder received it
+      - {receiver}.pc.preparer.latency: seconds after reader arrival the preparer received it
+    """
+    times = dataframe_to_pcindex(dataframe, include_sender=False, sender=sender, receiver=receiver)
+    basecol = times[f'{receiver}.pc.reader.sessiontime']
+    return pd.DataFrame({
+        'sessiontime': basecol,
+        f'{receiver}.pc.decoder.latency': times[f'{receiver}.pc.decoder.sessiontime'] - basecol,
+        f'{receiver}.pc.preparer.latency': times[f'{receiver}.pc.preparer.sessiontime'] - basecol,
+    })
+
+def _stage_to_tiles(stage : pd.DataFrame, tiles : Sequence[str]) -> pd.DataFrame:
+    """Helper - make tile keys of one stage match the sender tiles: broadcast ".all" rows or collapse into them."""
+    stage_tiles = set(stage["tile"])
+    if stage_tiles <= set(tiles):
+        return stage
+    if list(tiles) == ["all"]:
+        stage = stage.assign(tile="all")
+        return stage.groupby(["tile", "pc_index"], sort=False)["sessiontime"].min().reset_index()
+    if stage_tiles == {"all"}:
+        return pd.concat([stage.assign(tile=t) for t in tiles], ignore_index=True)
+    return stage
+
+_FRAME_STAGES = ["reader", "decoder", "preparer", "renderer"]
+
+def dataframe_to_frame_latencies(dataframe : pd.DataFrame, sender : str="sender", receiver : str="receiver") -> pd.DataFrame:
+    """
+    Trace individual point clouds from the sender writer through the receiver pipeline stages.
+
+    Input: a (normalized) progress dataframe, as in ProgressView: sessiontime rows and
+    aggregate_packets sequence-number columns per pipeline stage.
+
+    For every sequence number reported by a sender writer, each receiver stage (reader,
+    decoder, preparer, renderer) is matched with a sorted merge-join (merge_asof, per tile) to
+    the first report where that stage had reached at least that sequence number.
+
+    Output: one row per (tile, pc_index) with writer.sessiontime, {stage}.sessiontime and
+    {stage}.latency_ms (time after the writer, in milliseconds) for every stage present.
+    Stages that never reached a point cloud have NaN.
+    """
+    long = _progress_to_long(dataframe)
+    base = long[(long["role"] == sender) & (long["stage"] == "writer")]
+    rv = base[["tile", "pc_index", "sessiontime"]].rename(columns={"sessiontime": "writer.sessiontime"})
+    rv = rv.sort_values("pc_index", kind="stable")
+    tiles = sorted(set(rv["tile"]))
+    for stage_name in _FRAME_STAGES:
+        stage = long[(long["role"] == receiver) & (long["stage"] == stage_name)][["tile", "pc_index", "sessiontime"]]
+        if stage.empty:
+            continue
+        stage = _stage_to_tiles(stage, tiles)
+        stage = stage.rename(columns={"sessiontime": f"{stage_name}.sessiontime"}).sort_values("pc_index", kind="stable")
+        rv = pd.merge_asof(rv, stage, on="pc_index", by="tile", direction="forward")
+        rv[f"{stage_name}.latency_ms"] = (rv[f"{stage_name}.sessiontime"] - rv["writer.sessiontime"]) * 1000
+    return rv.sort_values(["tile", "pc_index"]).reset_index(drop=True)
+
+def _quantile_label(q : float) -> str:
+    """Helper - column suffix for a quantile: 0.95 -> p95, 0.999 -> p99.9"""
+    return f"p{q * 100:g}"
+
+def windowed_statistics(dataframe : pd.DataFrame, columns : Optional[List[str]] = None, *, window : float = 10.0, step : Optional[float] = None, quantiles : Sequence[float] = (0.5, 0.95, 0.99), x : str = "sessiontime") -> pd.DataFrame:
+    """
+    Compute count, mean, std and quantiles of columns over session-time windows.
+
+    With step None (or equal to window) windows are tumbling: consecutive, non-overlapping
+    windows [start, start + window) of `window` seconds. With a smaller step they are rolling:
+    at every multiple of `step` the statistics of the preceding window [end - window, end)
+    are reported, for every step that has samples. All columns are handled at once by pandas
+    groupby/rolling reductions, NaN values are ignored.
+
+    :param dataframe: Input, for example a wide latency frame with one column per pipeline stage.
+    :param columns: Columns to compute statistics for (default: all numeric columns except x).
+    :param window: Window length in seconds.
+    :param step: Distance between rolling windows in seconds, None for tumbling windows.
+    :param quantiles: Quantiles to compute, between 0 and 1.
+    :param x: The session time column.
+    :return: One row per window, with x set to the end of the window and columns
+        "{column}.count", "{column}.mean", "{column}.std" and "{column}.p50" etc. per input column.
+    """
+    if columns is None:
+        columns = [c for c in dataframe.select_dtypes("number").columns if c != x]
+    dataframe = dataframe[[x] + list(columns)].dropna(subset=[x]).sort_values(x, kind="stable")
+    if step is None or step >= window:
+        step = window
+        bins = np.floor(dataframe[x].to_numpy() / window)
+        grouped = dataframe[columns].groupby(bins)
+        stats : Dict[str, pd.DataFrame] = {
+            "count": grouped.count(),
+            "mean": grouped.mean(),
+            "std": grouped.std(),
+        }
+        if quantiles:
+            q = grouped.quantile(list(quantiles))
+            for qq in quantiles:
+                stats[_quantile_label(qq)] = q.xs(qq, level=-1)
+    else:
+        # Time-based rolling windows, evaluated at rows without values added at the step boundaries,
+        # so every window ends exactly at its label (and not at the last sample before it).
+        bins = np.unique(np.floor(dataframe[x].to_numpy() / step))
+        ends = pd.DataFrame({x: (bins + 1) * step})
+        combined = pd.concat([dataframe.assign(_end=False), ends.assign(_end=True)], ignore_index=True)
+        combined = combined.sort_values([x, "_end"], kind="stable")
+        is_end = combined.pop("_end").to_numpy(dtype=bool)
+        indexed = combined.set_index(pd.to_timedelta(combined[x], unit="s"))[columns]
+        rolling = indexed.rolling(pd.Timedelta(seconds=window), closed="left")
+        stats = {
+            "count": rolling.count(),
+            "mean": rolling.mean(),
+            "std": rolling.std(),
+        }
+        for qq in quantiles:
+            stats[_quantile_label(qq)] = rolling.quantile(qq)
+        for name in stats:
+            stats[name] = stats[name][is_end].set_axis(bins)
+    index = next(iter(stats.values())).index
+    rv = {x: (index.to_numpy() + 1) * step}
+    for c in columns:
+        for name, frame in stats.items():
+            rv[f"{c}.{name}"] = frame[c].to_numpy()
+    return pd.DataFrame(rv)
+
+
+
+def histogram2d_over_time(dataframe : pd.DataFrame, columns : Optional[List[str]] = None, *, x : str = "sessiontime", time_bins : int = 200, value_bins : int = 100, value_max : Optional[float] = None, clip_quantile : float = 0.999) -> Dict[str, pd.DataFrame]:
+    """
+    Bin the values of each column into (x bucket, value bucket) counts with numpy.histogram2d.
+
+    All columns share the same x (session time) buckets, so the histograms line up. The value
+    buckets of a column range from min(0, smallest value) to value_max, or (by default) to the
+    clip_quantile quantile of the column, so a few outliers don't squeeze the rest into one bucket.
+    Values above the range are counted in the top bucket. NaN values are ignored.
+
+    :return: Per column a DataFrame of counts, indexed by x bucket centre (named x) with the
+        value bucket centres as columns.
+    """
+    if columns is None:
+        columns = [c for c in dataframe.select_dtypes("number").columns if c != x]
+    xs = dataframe[x].to_numpy(dtype=float)
+    present = ~np.isnan(xs)
+    if not present.any():
+        raise DataStoreError(f"histogram2d_over_time: no {x} values")
+    x_edges = np.linspace(xs[present].min(), xs[present].max(), time_bins + 1)
+    x_centres = pd.Index((x_edges[:-1] + x_edges[1:]) / 2, name=x)
+    rv : Dict[str, pd.DataFrame] = {}
+    for c in columns:
+        values = dataframe[c].to_numpy(dtype=float)
+        mask = present & ~np.isnan(values)
+        values = values[mask]
+        if len(values) == 0:
+            continue
+        top = value_max if value_max is not None else float(np.quantile(values, clip_quantile))
+        bottom = min(0.0, float(values.min()))
+        if top <= bottom:
+            top = bottom + 1.0
+        v_edges = np.linspace(bottom, top, value_bins + 1)
+        counts, _, _ = np.histogram2d(xs[mask], np.minimum(values, top), bins=[x_edges, v_edges])
+        rv[c] = pd.DataFrame(counts.astype(np.int64), index=x_centres, columns=(v_edges[:-1] + v_edges[1:]) / 2)
+    return rv
+
+
+def _first_per_bucket(bucket : np.ndarray, key : np.ndarray) -> np.ndarray:
+    """Helper - per (nondecreasing) bucket number, the position of the smallest key in that bucket"""
+    order = np.lexsort((key, bucket))
+    starts = np.flatnonzero(np.append(True, bucket[order][1:] != bucket[order][:-1]))
+    return order[starts]
+
+def _lttb_indices(xs : np.ndarray, ys : np.ndarray, n : int) -> np.ndarray:
+    """
+    Helper - positions of the points Largest-Triangle-Three-Buckets keeps of (xs, ys).
+
+    The first and last point are kept, the other points are split into n-2 buckets of equal
+    size and of each bucket the point forming the largest triangle with the averages of the
+    neighbouring buckets is kept. Using the previous bucket's average (instead of the point
+    selected from it) makes all buckets independent, so they are handled in one numpy pass.
+    """
+    m = len(xs)
+    if m <= n or n < 3:
+        return np.arange(m)
+    edges = np.linspace(1, m - 1, n - 1).astype(np.int64)
+    counts = np.diff(edges)
+    bucket = np.repeat(np.arange(n - 2), counts)
+    mean_x = np.add.reduceat(xs[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(ys[1:-1], edges[:-1] - 1) / counts
+    prev_x = np.concatenate(([xs[0]], mean_x[:-1]))[bucket]
+    prev_y = np.concatenate(([ys[0]], mean_y[:-1]))[bucket]
+    next_x = np.concatenate((mean_x[1:], [xs[-1]]))[bucket]
+    next_y = np.concatenate((mean_y[1:], [ys[-1]]))[bucket]
+    px, py = xs[1:-1], ys[1:-1]
+    area = np.abs((prev_x - next_x) * (py - prev_y) - (prev_x - px) * (next_y - prev_y))
+    return np.concatenate(([0], _first_per_bucket(bucket, -area) + 1, [m - 1]))
+
+def _minmax_indices(xs : np.ndarray, ys : np.ndarray, n : int) -> np.ndarray:
+    """Helper - positions of the first and last point and of the minimum and maximum per each of n equal-width x buckets"""
+    m = len(xs)
+    if m <= 2 * n:
+        return np.arange(m)
+    span = xs[-1] - xs[0]
+    if span <= 0:
+        bucket = np.zeros(m, dtype=np.int64)
+    else:
+        bucket = np.clip(((xs - xs[0]) * (n / span)).astype(np.int64), 0, n - 1)
+    return np.unique(np.concatenate((
+        [0, m - 1],
+        _first_per_bucket(bucket, ys),
+        _first_per_bucket(bucket, -ys),
+    )))
+
+def downsample_dataframe(dataframe : pd.DataFrame, n : int, *, x : str = "sessiontime", columns : Optional[List[str]] = None, method : str = "lttb") -> pd.DataFrame:
+    """
+    Reduce the rows of a dataframe to those needed to draw its series at a horizontal resolution of n.
+
+    Every column is downsampled on its own (on the rows where it and x are not NaN) and the
+    union of the selected rows is returned, in the original order, so a wide frame with
+    sparse columns keeps the shape of every series. Columns not in `columns` are carried
+    along but do not select rows.
+
+    :param n: Horizontal resolution, typically the width of the plot in pixels.
+    :param x: The x-axis column; rows are expected to be ordered by it.
+    :param columns: Series to preserve (default: all numeric columns except x).
+    :param method: "lttb" keeps one point per bucket (Largest-Triangle-Three-Buckets),
+        "minmax" keeps the minimum and maximum of every one of n x intervals, so spikes
+        are never lost.
+    """
+    if method == "lttb":
+        select = _lttb_indices
+    elif method == "minmax":
+        select = _minmax_indices
+    else:
+        raise ValueError(f"downsample_dataframe: unknown method {method!r}, expected 'lttb' or 'minmax'")
+    if n < 1:
+        raise ValueError(f"downsample_dataframe: n must be positive, not {n}")
+    if columns is None:
+        columns = [c for c in dataframe.select_dtypes("number").columns if c != x]
+    if len(dataframe) <= n:
+        return dataframe
+    xs = dataframe[x].to_numpy(dtype=float)
+    keep = np.zeros(len(dataframe), dtype=bool)
+    for c in columns:
+        ys = dataframe[c].to_numpy(dtype=float)
+        rows = np.flatnonzero(~np.isnan(xs) & ~np.isnan(ys))
+        keep[rows[select(xs[rows], ys[rows], n)]] = True
+    return dataframe.iloc[np.flatnonzero(keep)]
@@ -1,10 +1,28 @@
 from __future__ import annotations
 import datetime
-from typing import Dict, List, Optional, Type, Any
+import sys
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Type, Any
 
 from .datastore import DataStore, DataStoreError
 
-__all__ = ["AnnotationStep", "AnnotationEngine", "engine"]
+__all__ = ["AnnotationStep", "AnnotationHook", "ProfilingHook", "AnnotationEngine", "engine", "format_profiles", "stored_profiles", "PROFILE_KEY", "STAGE_LATENCY_FIELDS", "frame_latencies", "latency_sketches"]
+
+# Reserved key in ds.applied_annotations[step name] under which ProfilingHook stores its measurements.
+PROFILE_KEY = "_profile"
+
+# Per-record stage duration and latency fields reported by the VR2Gather pipeline components.
+STAGE_LATENCY_FIELDS = [
+    'encoder_queue_ms',
+    'encoder_ms',
+    'transmitter_queue_ms',
+    'decoder_queue_ms',
+    'decoder_ms',
+    'renderer_queue_ms',
+    'latency_ms',
+]
 
 
 class AnnotationStep:
@@ -14,6 +32,17 @@ class AnnotationStep:
     Subclasses set class-level `name`, `dependencies`, `description`, and
     `params`, and implement `apply()`.
 
+    Subclasses should also declare `reads` and `writes`: the record fields
+    `apply()` reads and the record fields it adds or modifies. A step that only
+    produces metadata declares `writes = []`. `None` (the default) means
+    "undeclared": any field may be modified (see AnnotationEngine.written_fields).
+    apply() may set `self.records_touched` to the number of records it changed,
+    for ProfilingHook.
+
+    Set `releases_gil` if apply() spends most of its time in code that releases
+    the GIL (NumPy, pandas, I/O): AnnotationEngine.ensure_many() then runs it at
+    the same time as other independent steps, so they can use several cores.
+
     Register subclasses with the module-level `engine` singleton:
         from VRTstatistics.annotation import engine
         engine.register(MyAnnotationStep)
@@ -22,6 +51,10 @@ class AnnotationStep:
     dependencies: List[str] = []
     description: str = ""
     params: Dict[str, str] = {}  # param_name → description
+    reads: Optional[List[str]] = None  # record fields read, None if undeclared
+    writes: Optional[List[str]] = None  # record fields written, None if undeclared
+    records_touched: Optional[int] = None  # set by apply() for ProfilingHook, if it knows
+    releases_gil: bool = False  # apply() mostly runs code that releases the GIL
 
     def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
         """
@@ -33,17 +66,83 @@ class AnnotationStep:
         raise NotImplementedError
 
 
+class AnnotationHook:
+    """
+    Instrumentation hook called around every AnnotationStep.apply().
+
+    before_apply() may return a state object, which is passed back to after_apply()
+    for the same step. Per-step state should be kept there and not in the hook object:
+    AnnotationEngine.ensure_many() may apply several steps at the same time, in
+    different threads. Hooks that cannot measure concurrent steps set thread_safe
+    to False, and ensure_many() then applies steps one at a time.
+    """
+    thread_safe: bool = True
+
+    def before_apply(self, step: AnnotationStep, ds: DataStore) -> Any:
+        return None
+
+    def after_apply(self, step: AnnotationStep, ds: DataStore, result: Dict[str, Any], state: Any) -> None:
+        pass
+
+
+class ProfilingHook(AnnotationHook):
+    """
+    Records wall time, CPU time, peak traced memory and number of records touched
+    for every step, in ds.applied_annotations[step name][PROFILE_KEY] (so they are
+    saved with the DataStore, see stored_profiles()) and in self.profiles[step name].
+
+    Peak memory is measured with tracemalloc, which is only running while the step
+    itself runs. Records touched is what the step reports in step.records_touched,
+    0 for steps that declare no writes, and otherwise None (not known).
+
+    The traced memory peak is process-wide, so with this hook added ensure_many()
+    applies steps one at a time.
+    """
+    thread_safe = False
+
+    def __init__(self) -> None:
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+
+    def before_apply(self, step: AnnotationStep, ds: DataStore) -> Any:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return (started_tracing, tracemalloc.get_traced_memory()[0], time.perf_counter(), time.thread_time())
+
+    def after_apply(self, step: AnnotationStep, ds: DataStore, result: Dict[str, Any], state: Any) -> None:
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        started_tracing, mem_start, wall_start, cpu_start = state
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        touched = step.records_touched
+        if touched is None and step.writes == []:
+            touched = 0
+        profile = {
+            "wall_s": wall - wall_start,
+            "cpu_s": cpu - cpu_start,
+            "peak_mem_bytes": max(0, peak - mem_start),
+            "records_touched": touched,
+        }
+        result[PROFILE_KEY] = profile
+        self.profiles[step.name] = profile
+
+
 class AnnotationEngine:
     """
     Declarative, dependency-driven, idempotent annotation runner.
 
     Maintains a registry of AnnotationStep classes. Call ensure() to apply a
     named annotation (and all its dependencies) to a DataStore, skipping any
-    that are already applied.
+    that are already applied. Call ensure_many() to apply several annotations
+    and their shared dependencies in one go, running independent steps concurrently.
     """
 
     def __init__(self) -> None:
         self._registry: Dict[str, Type[AnnotationStep]] = {}
+        self._hooks: List[AnnotationHook] = []
 
     def register(self, step_class: Type[AnnotationStep]) -> None:
         """Register an AnnotationStep class by its name."""
@@ -51,6 +150,14 @@ class AnnotationEngine:
             raise ValueError(f"AnnotationStep class {step_class} has no name")
         self._registry[step_class.name] = step_class
 
+    def add_hook(self, hook: AnnotationHook) -> None:
+        """Add an instrumentation hook that is called around every step that is applied."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: AnnotationHook) -> None:
+        """Remove a hook previously added with add_hook()."""
+        self._hooks.remove(hook)
+
     def list_steps(self) -> str:
         """Return a human-readable listing of all registered annotation steps."""
         if not self._registry:
@@ -62,12 +169,29 @@ class AnnotationEngine:
                 lines.append(f"  {cls.description}")
             if cls.dependencies:
                 lines.append(f"  depends on: {', '.join(cls.dependencies)}")
+            if cls.reads:
+                lines.append(f"  reads: {', '.join(cls.reads)}")
+            if cls.writes:
+                lines.append(f"  writes: {', '.join(cls.writes)}")
             if cls.params:
                 lines.append("  parameters:")
                 for pname, pdesc in cls.params.items():
                     lines.append(f"    {pname}: {pdesc}")
         return "\n".join(lines)
 
+    def written_fields(self, names: Iterable[str]) -> Optional[List[str]]:
+        """
+        Return the record fields written by the named steps, or None if any of them
+        has undeclared writes (so any field may have been modified).
+        """
+        rv: List[str] = []
+        for name in names:
+            writes = self._get_step_class(name).writes
+            if writes is None:
+                return None
+            rv += [f for f in writes if f not in rv]
+        return rv
+
     def ensure(self, ds: DataStore, name: str, **params) -> None:
         """
         Ensure annotation `name` has been applied to `ds`.
@@ -77,14 +201,159 @@ class AnnotationEngine:
         """
         if name in ds.applied_annotations:
             return
+        step_class = self._get_step_class(name)
+        for dep in step_class.dependencies:
+            self.ensure(ds, dep)
+        result = self._apply_step(ds, step_class, params)
+        ds.applied_annotations[name] = result
+
+    def ensure_many(self, ds: DataStore, names: Iterable[str], params: Optional[Dict[str, Dict[str, Any]]] = None, max_workers: Optional[int] = None) -> None:
+        """
+        Ensure all annotations in `names` have been applied to `ds`.
+
+        Collects all steps not yet applied, including dependencies (shared dependencies
+        are applied once), and runs every step once its dependencies have been applied,
+        on a pool of up to max_workers threads. Steps that do not depend on each other
+        run at the same time if both declare their reads and writes and at least one of
+        them releases the GIL (see AnnotationStep.releases_gil; on a free-threaded Python
+        build all steps do): two pure-Python steps would only take turns. With
+        max_workers=1, or a hook that is not thread_safe, steps are applied one at a
+        time in dependency order.
+
+        `params` maps step names to parameters for that step; dependencies pulled in
+        implicitly get no parameters, as with ensure().
+
+        Steps that do not depend on each other must not write the same fields, or read a
+        field the other writes (as declared in their reads / writes).
+
+        Raises DataStoreError for unknown steps, dependency cycles, conflicting steps, or
+        a step that fails. Steps that were running when another one failed are completed
+        and recorded; no new steps are started.
+        """
+        params = params or {}
+        order = self._plan(ds, names)
+        if max_workers == 1 or len(order) < 2 or not all(hook.thread_safe for hook in self._hooks):
+            for name in order:
+                try:
+                    result = self._apply_step(ds, self._registry[name], params.get(name, {}))
+                except Exception as e:
+                    raise DataStoreError(f"annotation step '{name}' failed: {e}") from e
+                ds.applied_annotations[name] = result
+            return
+
+        ds.data  # Merges lazily loaded delta columns now, not in whichever step thread gets there first
+        pending = {name: {dep for dep in self._registry[name].dependencies if dep in order} for name in order}
+        running: Dict[Future, str] = {}
+        error: Optional[DataStoreError] = None
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="annotation") as pool:
+            while running or (pending and error is None):
+                if error is None:
+                    for name in list(pending):
+                        if pending[name] or not self._can_run_with(name, running.values()):
+                            continue
+                        del pending[name]
+                        running[pool.submit(self._apply_step, ds, self._registry[name], params.get(name, {}))] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = DataStoreError(f"annotation step '{name}' failed: {e}")
+                            error.__cause__ = e
+                        continue
+                    ds.applied_annotations[name] = result
+                    for deps in pending.values():
+                        deps.discard(name)
+        if error is not None:
+            raise error
+
+    def _get_step_class(self, name: str) -> Type[AnnotationStep]:
         step_class = self._registry.get(name)
         if step_class is None:
             raise DataStoreError(f"Unknown annotation step '{name}'. Registered: {list(self._registry)}")
-        for dep in step_class.dependencies:
-            self.ensure(ds, dep)
+        return step_class
+
+    def _apply_step(self, ds: DataStore, step_class: Type[AnnotationStep], params: Dict[str, Any]) -> Dict[str, Any]:
         step = step_class()
+        hooks = list(self._hooks)
+        states = [hook.before_apply(step, ds) for hook in hooks]
         result = step.apply(ds, **params)
-        ds.applied_annotations[name] = result if result is not None else {}
+        result = result if result is not None else {}
+        for hook, state in reversed(list(zip(hooks, states))):
+            hook.after_apply(step, ds, result, state)
+        return result
+
+    def _can_run_with(self, name: str, running: Iterable[str]) -> bool:
+        """
+        True if step `name` may start while the `running` steps run. They do not depend on
+        each other and their declared fields do not conflict (see _check_conflicts).
+        """
+        step_class = self._registry[name]
+        for other in running:
+            other_class = self._registry[other]
+            if None in (step_class.reads, step_class.writes, other_class.reads, other_class.writes):
+                return False
+            if not (_releases_gil(step_class) or _releases_gil(other_class)):
+                return False
+        return True
+
+    def _plan(self, ds: DataStore, names: Iterable[str]) -> List[str]:
+        """Return all unapplied steps needed to apply `names`, every step after its dependencies."""
+        order: List[str] = []
+        visiting: List[str] = []
+
+        def visit(name: str) -> None:
+            if name in ds.applied_annotations or name in order:
+                return
+            if name in visiting:
+                raise DataStoreError(f"Annotation dependency cycle: {' -> '.join(visiting + [name])}")
+            step_class = self._get_step_class(name)
+            visiting.append(name)
+            for dep in step_class.dependencies:
+                visit(dep)
+            visiting.pop()
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        self._check_conflicts(order)
+        return order
+
+    def _check_conflicts(self, names: List[str]) -> None:
+        """
+        Raise DataStoreError if two of the steps `names` that are not ordered by dependency
+        write the same field, or one reads a field the other writes: the outcome would then
+        depend on the order in which they happen to be applied. Undeclared reads or writes
+        are not checked.
+        """
+        ancestors: Dict[str, set] = {}
+
+        def ancestors_of(name: str) -> set:
+            if name not in ancestors:
+                ancestors[name] = set()
+                for dep in self._registry[name].dependencies:
+                    ancestors[name] |= {dep} | ancestors_of(dep)
+            return ancestors[name]
+
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                if a in ancestors_of(b) or b in ancestors_of(a):
+                    continue
+                step_a, step_b = self._registry[a], self._registry[b]
+                fields = set(step_a.writes or []) & set(step_b.writes or [])
+                if fields:
+                    raise DataStoreError(f"Annotation steps '{a}' and '{b}' both write {sorted(fields)}")
+                for reader, writer in ((step_a, step_b), (step_b, step_a)):
+                    fields = set(reader.reads or []) & set(writer.writes or [])
+                    if fields:
+                        raise DataStoreError(f"Annotation step '{reader.name}' reads {sorted(fields)} written by '{writer.name}', which it does not depend on")
+
+
+def _releases_gil(step_class: Type[AnnotationStep]) -> bool:
+    # sys._is_gil_enabled() is new in Python 3.13, and False on free-threaded builds.
+    return step_class.releases_gil or not getattr(sys, "_is_gil_enabled", lambda: True)()
 
 
 engine = AnnotationEngine()
@@ -99,6 +368,8 @@ class ComponentRoleAnnotation(AnnotationStep):
     dependencies: List[str] = []
     description = "Assign component_role to every record (e.g. sender.pc.grabber) based on discovered pipeline topology."
     params: Dict[str, str] = {}
+    reads = ["component", "role"]
+    writes = ["component_role"]
 
     def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
         component_map: Dict[str, Dict[str, str]] = ds.session_metadata.get("component_map", {})
@@ -108,6 +379,7 @@ class ComponentRoleAnnotation(AnnotationStep):
             comp = record.get("component", "")
             role = record.get("role", "")
             record["component_role"] = component_map.get(role, {}).get(comp, "")
+        self.records_touched = len(ds.data)
         roles = ds.session_metadata.get("roles", [])
         return {"roles": roles}
 
@@ -124,6 +396,8 @@ class LatencyAnnotation(AnnotationStep):
         "sender": "Role name of the point-cloud sender (default: first role in session)",
         "receiver": "Role name of the point-cloud receiver (default: second role in session)",
     }
+    reads: List[str] = []
+    writes: List[str] = []
 
     def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
         roles = ds.session_metadata.get("roles", [])
@@ -142,6 +416,7 @@ class LatencyAnnotation(AnnotationStep):
         combined_desync = sender_desync - receiver_desync
         combined_uncertainty = max(uncertainties.get(sender, 0), uncertainties.get(receiver, 0)) / 2
 
+        self.records_touched = 0
         return {
             "sender": sender,
             "receiver": receiver,
@@ -156,8 +431,134 @@ class LatencyAnnotation(AnnotationStep):
         }
 
 
+class FrameLatencyAnnotation(AnnotationStep):
+    """
+    Traces individual point clouds from the sender writers through the receiver
+    reader/decoder/preparer/renderer stages by matching aggregate_packets sequence
+    numbers with a sorted merge-join, and stores the per-frame stage timestamps and
+    latencies as a compact columnar table in ds.applied_annotations["frame_latency"].
+
+    Use frame_latencies(ds) to get the table as a DataFrame.
+    """
+    name = "frame_latency"
+    dependencies = ["latency"]
+    description = "Per-frame stage timestamps and latencies (sender writer to receiver stages), matched on aggregate_packets."
+    params: Dict[str, str] = {}
+    reads = ["component_role", "aggregate_packets", "sessiontime"]
+    writes: List[str] = []
+
+    def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
+        from .analyze import normalize_progress, dataframe_to_frame_latencies
+        latency = ds.applied_annotations["latency"]
+        sender = latency["sender"]
+        receiver = latency["receiver"]
+        progress = ds.get_dataframe(
+            predicate='"aggregate_packets" in record and component_role',
+            fields=['sessiontime', 'component_role=aggregate_packets']
+        )
+        progress = normalize_progress(progress, sender=sender, nTiles=latency.get("nTiles", 1), nQualities=latency.get("nQualities", 1))
+        frames = dataframe_to_frame_latencies(progress, sender=sender, receiver=receiver)
+        # Columnar, with NaN (stage never reached) stored as null to keep the JSON standard.
+        columns = {c: [None if v != v else v for v in frames[c].tolist()] for c in frames.columns}
+        self.records_touched = 0
+        return {
+            "sender": sender,
+            "receiver": receiver,
+            "nframes": len(frames),
+            "columns": columns,
+        }
+
+
+class LatencySketchAnnotation(AnnotationStep):
+    """
+    Summarizes the distribution of every stage duration / latency field (see
+    STAGE_LATENCY_FIELDS) per component_role as a mergeable QuantileSketch,
+    stored in ds.applied_annotations["latency_sketch"]["sketches"] under
+    "{component_role}.{field}" keys.
+
+    The sketches take kilobytes per run and can be merged across runs with
+    sketch.merge_sketches(); use latency_sketches(ds) to get them as QuantileSketch objects.
+    """
+    name = "latency_sketch"
+    dependencies = ["component_role"]
+    description = "Mergeable quantile sketches of the stage latency fields per component_role."
+    params = {
+        "relative_accuracy": "Relative accuracy of the quantiles (default: 0.01)",
+    }
+    fields = STAGE_LATENCY_FIELDS
+    reads = ["component_role"] + fields
+    writes: List[str] = []
+
+    def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
+        from .sketch import QuantileSketch
+        relative_accuracy = float(params.get("relative_accuracy", 0.01))
+        values: Dict[str, List[float]] = {}
+        for record in ds.data:
+            component_role = record.get("component_role")
+            if not component_role:
+                continue
+            for field in self.fields:
+                value = record.get(field)
+                if value is not None:
+                    values.setdefault(f"{component_role}.{field}", []).append(value)
+        sketches = {
+            key: QuantileSketch(relative_accuracy).add(vals).to_dict()
+            for key, vals in sorted(values.items())
+        }
+        self.records_touched = 0
+        return {
+            "relative_accuracy": relative_accuracy,
+            "sketches": sketches,
+        }
+
 engine.register(ComponentRoleAnnotation)
 engine.register(LatencyAnnotation)
+engine.register(FrameLatencyAnnotation)
+engine.register(LatencySketchAnnotation)
+
+
+def frame_latencies(ds: DataStore) -> Any:
+    """
+    Return the per-frame latency table of the frame_latency annotation (applied if needed) as a pandas DataFrame.
+
+    One row per (tile, pc_index) sent, with writer.sessiontime and {stage}.sessiontime / {stage}.latency_ms
+    columns for every receiver stage.
+    """
+    import pandas as pd
+    engine.ensure(ds, "frame_latency")
+    return pd.DataFrame(ds.applied_annotations["frame_latency"]["columns"])
+
+
+def latency_sketches(ds: DataStore) -> Dict[str, Any]:
+    """
+    Return the latency_sketch annotation (applied if needed) as a dict mapping
+    "{component_role}.{field}" to QuantileSketch.
+    """
+    from .sketch import QuantileSketch
+    engine.ensure(ds, "latency_sketch")
+    return {
+        key: QuantileSketch.from_dict(d)
+        for key, d in ds.applied_annotations["latency_sketch"]["sketches"].items()
+    }
+
+
+def stored_profiles(ds: DataStore) -> Dict[str, Dict[str, Any]]:
+    """Return the ProfilingHook measurements saved in the annotations of ds, by step name."""
+    return {name: result[PROFILE_KEY] for name, result in ds.applied_annotations.items() if isinstance(result, dict) and PROFILE_KEY in result}
+
+
+def format_profiles(profiles: Dict[str, Dict[str, Any]]) -> str:
+    """Return a table of ProfilingHook measurements (its profiles attribute, or stored_profiles(ds))."""
+    lines = [f"{'step':24s} {'wall (s)':>10s} {'cpu (s)':>10s} {'peak (MB)':>10s} {'records':>10s}"]
+    for name, prof in profiles.items():
+        touched = prof["records_touched"]
+        lines.append(
+            f"{name:24s} {prof['wall_s']:10.3f} {prof['cpu_s']:10.3f} "
+            f"{prof['peak_mem_bytes'] / 1e6:10.1f} {touched if touched is not None else '-':>10}"
+        )
+    if len(lines) == 1:
+        return "(no profiled annotation steps)"
+    return "\n".join(lines)
 
 
 def describe(ds: DataStore) -> str:
@@ -200,4 +601,6 @@ def describe(ds: DataStore) -> str:
             user = user_names.get(role, role)
             lines.append(f"{role}: {user}")
 
+    if ds.time_window:
+        lines.append(f"t = {ds.time_window[0]:g}–{ds.time_window[1]:g} s")
     return "\n".join(lines)
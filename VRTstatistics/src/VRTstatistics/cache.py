@@ -0,0 +1,228 @@
+"""
+On-disk cache of extracted Views.
+
+Extracting a View (querying the DataStore and combining tiles) usually costs much
+more than rendering it. ViewCache stores extracted Views as pickles in a directory
+next to the datastore, keyed on the content fingerprint of the store, the identity
+and version of the extractor and its arguments, so re-rendering with a different
+PlotStyle only pays for the rendering:
+
+    view = LatencyView.extract(ds, cache=True)
+
+Entries are evicted least-recently-used first when the cache directory grows
+beyond max_bytes.
+
+The fingerprint of a store is remembered (in this process and in a manifest in the
+cache directory) together with the size and modification time of its files, so the
+store is only hashed again after it changed.
+
+Entries are unpickled, which can run arbitrary code: only use cache directories that
+are as trusted as the code itself.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pickle
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .datastore import DataStore
+
+__all__ = ["ViewCache", "CACHE_DIRNAME", "package_version", "extractor_identity", "store_files"]
+
+# Name of the cache directory created next to the datastore file.
+CACHE_DIRNAME = ".viewcache"
+
+_SUFFIX = ".pickle"
+
+# Manifest in the cache directory: datastore path → sizes and mtimes of its files, and their fingerprint.
+_FINGERPRINTS_FILENAME = "fingerprints.json"
+
+# Fingerprints computed or read in this process, by (datastore path, sizes and mtimes of its files).
+_fingerprints: Dict[Tuple[str, Tuple[Tuple[str, int, int], ...]], str] = {}
+
+
+@lru_cache(maxsize=None)
+def package_version() -> str:
+    """The installed VRTstatistics version (looked up on first use, importlib.metadata is slow to import)."""
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return version("VRTstatistics")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def extractor_identity(extractor: Callable, version: Any) -> str:
+    """Qualified name, declared version and a hash of the bytecode of an extractor."""
+    code = getattr(extractor, "__code__", None)
+    code_hash = hashlib.blake2b(code.co_code + repr(code.co_consts).encode(), digest_size=8).hexdigest() if code else ""
+    return f"{getattr(extractor, '__module__', '')}.{getattr(extractor, '__qualname__', repr(extractor))}:{version}:{code_hash}"
+
+
+def store_files(ds: DataStore) -> List[Tuple[str, int, int]]:
+    """
+    (file name, size, modification time in ns) of the files of ds: its JSON file and delta
+    segments. While these are the same the content of the store, and so its fingerprint, is too.
+    """
+    assert ds.filename
+    dirname = os.path.dirname(ds.filename) or "."
+    stem = os.path.basename(ds.filename)[:-len(".json")]
+    rv = []
+    for fn in sorted(os.listdir(dirname)):
+        if fn == os.path.basename(ds.filename) or fn.startswith(stem + ".delta-"):
+            st = os.stat(os.path.join(dirname, fn))
+            rv.append((fn, st.st_size, st.st_mtime_ns))
+    return rv
+
+
+class ViewCache:
+    """
+    A directory of pickled Views, with size-based least-recently-used eviction.
+
+    Use ViewCache.for_datastore(ds) for the default cache directory next to the
+    datastore file. Failures to read or write the cache are never fatal: a corrupt
+    or unreadable entry is a cache miss.
+    """
+
+    def __init__(self, dirname: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.dirname = dirname
+        self.max_bytes = max_bytes
+
+    def __repr__(self) -> str:
+        return f"ViewCache({self.dirname!r})"
+
+    @classmethod
+    def for_datastore(cls, ds: DataStore, **kwargs: Any) -> ViewCache:
+        """Return the cache in the CACHE_DIRNAME directory next to the datastore file."""
+        assert ds.filename
+        return cls(os.path.join(os.path.dirname(os.path.abspath(ds.filename)), CACHE_DIRNAME), **kwargs)
+
+    def key(self, view_cls: type, ds: DataStore, kwargs: Dict[str, Any]) -> str:
+        """Return the cache key for extracting view_cls from ds with kwargs."""
+        extractor = getattr(view_cls, "_extractor", None)
+        if extractor is None:
+            raise NotImplementedError(f"No extractor registered for {view_cls.__name__}")
+        identity = extractor_identity(extractor, getattr(view_cls, "_extractor_version", None))
+        parts = [
+            package_version(),
+            view_cls.__module__ + "." + view_cls.__qualname__,
+            identity,
+            self._fingerprint(ds),
+            repr(sorted(kwargs.items())),
+        ]
+        return hashlib.blake2b("\0".join(parts).encode(), digest_size=20).hexdigest()
+
+    def _fingerprint(self, ds: DataStore) -> str:
+        # Hashing the store reads all of it: remember fingerprints while the files are unchanged.
+        assert ds.filename
+        stats = store_files(ds)
+        path = os.path.abspath(ds.filename)
+        memo_key = (path, tuple(stats))
+        if memo_key in _fingerprints:
+            return _fingerprints[memo_key]
+        manifest = self._read_fingerprints()
+        entry = manifest.get(path)
+        if isinstance(entry, dict) and entry.get("files") == [list(st) for st in stats]:
+            fingerprint = entry["fingerprint"]
+        else:
+            fingerprint = ds.fingerprint()
+            manifest[path] = {"files": stats, "fingerprint": fingerprint}
+            self._write_fingerprints(manifest)
+        _fingerprints[memo_key] = fingerprint
+        return fingerprint
+
+    def _read_fingerprints(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.dirname, _FINGERPRINTS_FILENAME)) as fp:
+                manifest = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def _write_fingerprints(self, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(self.dirname, _FINGERPRINTS_FILENAME)
+        tmpname = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            with open(tmpname, "w") as fp:
+                json.dump(manifest, fp)
+            os.replace(tmpname, path)
+        except Exception:
+            self._remove(tmpname)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dirname, key + _SUFFIX)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the View (or other object) cached under key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fp:
+                view = pickle.load(fp)
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._remove(path)
+            return None
+        return view
+
+    def put(self, key: str, view: Any) -> None:
+        """Store view under key, then evict old entries if the cache is too big."""
+        path = self._path(key)
+        tmpname = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            with open(tmpname, "wb") as fp:
+                pickle.dump(view, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, path)
+        except Exception:
+            self._remove(tmpname)
+            return
+        self.evict()
+
+    def evict(self, max_bytes: Optional[int] = None) -> None:
+        """Remove least-recently-used entries until the cache is at most max_bytes (default: self.max_bytes)."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self.evict(0)
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self) -> List[Tuple[str, int, int]]:
+        """(path, size, last used) of all entries."""
+        rv = []
+        try:
+            names = os.listdir(self.dirname)
+        except FileNotFoundError:
+            return []
+        for fn in names:
+            if not fn.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.dirname, fn)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            rv.append((path, st.st_size, st.st_mtime_ns))
+        return rv
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,230 @@
+"""
+Cross-run analysis: evaluate a View extractor or summary function over many
+combined.json DataStores in parallel and concatenate the results into one tidy
+DataFrame, tagged with the run and its latency-experiment metadata.
+"""
+from __future__ import annotations
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+from .datastore import DataStore, DataStoreError
+from .annotation import engine
+from .views import View
+
+if TYPE_CHECKING:
+    # Imported where the results are built, so finding the runs does not need pandas.
+    import pandas as pd
+
+__all__ = ["DataStoreCollection", "RunError"]
+
+# Something that can be evaluated per run: a View class, a registered View type name,
+# or a function f(ds, **kwargs) returning a DataFrame, a dict (one row) or a View.
+RunFunction = Union[str, Type[View], Callable[..., Any]]
+
+
+@dataclass
+class RunError:
+    """A run that could not be loaded or evaluated."""
+    run: str
+    filename: str
+    message: str
+
+
+def _view_frame(view: View, member: Optional[str]) -> pd.DataFrame:
+    """Return the DataFrame member of a View (the only one if member is None)."""
+    import pandas as pd
+    if member is not None:
+        frame = getattr(view, member, None)
+        if not isinstance(frame, pd.DataFrame):
+            raise DataStoreError(f"{type(view).__name__}.{member} is not a DataFrame")
+        return frame
+    frames = [f.name for f in dataclass_fields(view) if isinstance(getattr(view, f.name), pd.DataFrame)]
+    if len(frames) != 1:
+        raise DataStoreError(f"{type(view).__name__} has DataFrame members {', '.join(frames)}: pass member= to select one")
+    return getattr(view, frames[0])
+
+
+def _to_frame(value: Any, member: Optional[str]) -> pd.DataFrame:
+    import pandas as pd
+    if isinstance(value, View):
+        value = _view_frame(value, member)
+    if isinstance(value, pd.Series):
+        value = value.to_frame().T if value.name is None else value.to_frame()
+    if isinstance(value, dict):
+        return pd.DataFrame([value])
+    if not isinstance(value, pd.DataFrame):
+        raise DataStoreError(f"cannot convert {type(value).__name__} result to a DataFrame")
+    if isinstance(value.index, pd.RangeIndex):
+        return value.reset_index(drop=True)
+    return value.reset_index()
+
+
+def _run_tags(run: str, ds: DataStore) -> Dict[str, Any]:
+    tags: Dict[str, Any] = {"run": run}
+    for key, value in ds.applied_annotations.get("latency", {}).items():
+        if value is None or isinstance(value, (str, int, float, bool)):
+            tags[key] = value
+    return tags
+
+
+def _evaluate_run(
+        run: str,
+        filename: str,
+        func: RunFunction,
+        member: Optional[str],
+        annotations: Tuple[str, ...],
+        kwargs: Dict[str, Any]
+) -> Tuple[str, Optional[pd.DataFrame], str, float]:
+    """Worker: load one run, evaluate func on it and return (run, tagged frame or None, error message, elapsed)."""
+    import pandas as pd
+    t0 = time.perf_counter()
+    try:
+        ds = DataStore(filename)
+        ds.load()
+        for name in annotations:
+            engine.ensure(ds, name)
+        if isinstance(func, str):
+            func = View._registry[func]
+        if isinstance(func, type) and issubclass(func, View):
+            value = func.extract(ds, **kwargs)
+        else:
+            value = func(ds, **kwargs)
+        frame = _to_frame(value, member)
+        tags = _run_tags(run, ds)
+        frame = pd.concat([pd.DataFrame(tags, index=frame.index), frame.drop(columns=[c for c in tags if c in frame.columns])], axis=1)
+    except Exception as e:
+        return run, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+    return run, frame, "", time.perf_counter() - t0
+
+
+class DataStoreCollection:
+    """
+    A set of runs, each a combined.json DataStore, selected by one or more glob patterns.
+
+    Patterns may match run directories (containing `filename`, default combined.json) or
+    DataStore files directly. The run ID is the name of the directory containing the file.
+
+        runs = DataStoreCollection("results/2025-*/")
+        e2e = runs.map(LatencyView, member="end2end", jobs=8)
+        e2e.groupby(["protocol", "nTiles"])["receiver.pc.renderer"].describe()
+
+    map() evaluates the function in a pool of worker processes and never loads more than
+    one DataStore per worker at a time.
+    """
+
+    def __init__(self, patterns: Union[str, Iterable[str]], filename: str = "combined.json") -> None:
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.filename = filename
+        self.runs: Dict[str, str] = {}
+        self.errors: List[RunError] = []
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern)):
+                if os.path.isdir(path):
+                    path = os.path.join(path, filename)
+                    if not os.path.exists(path):
+                        continue
+                self._add(path)
+
+    def _add(self, path: str) -> None:
+        run = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        if run in self.runs and self.runs[run] != path:
+            run = os.path.relpath(path)
+        self.runs[run] = path
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.runs)
+
+    def __repr__(self) -> str:
+        return f"DataStoreCollection({len(self.runs)} runs)"
+
+    def load(self, run: str) -> DataStore:
+        """Load and return the DataStore of a single run."""
+        ds = DataStore(self.runs[run])
+        ds.load()
+        return ds
+
+    def map(
+            self,
+            func: RunFunction,
+            *,
+            member: Optional[str] = None,
+            annotations: Iterable[str] = ("latency",),
+            jobs: Optional[int] = None,
+            on_error: str = "skip",
+            progress: bool = False,
+            **kwargs: Any
+    ) -> pd.DataFrame:
+        """
+        Evaluate func for every run and return the concatenated results.
+
+        func is a View class or registered View type name (its extractor is called with
+        kwargs, and the DataFrame `member` of the View is used; it may be omitted if the
+        View has only one), or a function f(ds, **kwargs) returning a DataFrame, a dict
+        (one row) or a View. func must be picklable (a module-level function) when jobs != 1.
+
+        The annotations are ensured on every run first. Every row of the result is tagged
+        with `run` and the scalar metadata of the latency annotation (sender, receiver,
+        protocol, nTiles, nQualities, compressed, desync, ...); a non-default index of the
+        per-run frames becomes ordinary columns.
+
+        jobs is the number of worker processes (None: one per CPU, 1: evaluate in this process).
+        Runs that fail are recorded in self.errors and skipped, or raise DataStoreError
+        if on_error="raise".
+        """
+        import pandas as pd
+        if on_error not in ("skip", "raise"):
+            raise ValueError(f"on_error must be 'skip' or 'raise', not {on_error!r}")
+        if isinstance(func, str) and func not in View._registry:
+            raise DataStoreError(f"Unknown View type {func!r}")
+        annotations = tuple(annotations)
+        self.errors = []
+        frames: Dict[str, pd.DataFrame] = {}
+        total = len(self.runs)
+        jobs = min(jobs or os.cpu_count() or 1, max(total, 1))
+
+        def collect(run: str, frame: Optional[pd.DataFrame], message: str, elapsed: float) -> None:
+            if frame is None:
+                self.errors.append(RunError(run, self.runs[run], message))
+                if on_error == "raise":
+                    raise DataStoreError(f"{run}: {message}")
+            else:
+                frames[run] = frame
+            if progress:
+                print(f"[{len(frames) + len(self.errors)}/{total}] {run}: {message or 'ok'} ({elapsed:.1f}s)")
+
+        if jobs == 1:
+            for run, filename in self.runs.items():
+                collect(*_evaluate_run(run, filename, func, member, annotations, kwargs))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    pool.submit(_evaluate_run, run, filename, func, member, annotations, kwargs)
+                    for run, filename in self.runs.items()
+                ]
+                try:
+                    for future in as_completed(futures):
+                        collect(*future.result())
+                except DataStoreError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        ordered = [frames[run] for run in self.runs if run in frames]
+        if not ordered:
+            return pd.DataFrame()
+        return pd.concat(ordered, ignore_index=True)
+
+    def metadata(self, jobs: Optional[int] = None) -> pd.DataFrame:
+        """Return one row per run with its latency-experiment metadata."""
+        return self.map(_no_columns, jobs=jobs)
+
+
+def _no_columns(ds: DataStore) -> Dict[str, Any]:
+    return {}
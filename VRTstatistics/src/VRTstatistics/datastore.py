@@ -1,10 +1,19 @@
 from __future__ import annotations
 import sys
+import os
+import contextlib
+import hashlib
+import math
+import re
 import json
-from typing import Optional, List, Any, cast, Dict, Union
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Optional, List, Any, Callable, cast, Dict, Generator, Iterable, Iterator, Set, Tuple, Union
 from types import CodeType
 from .parser import StatsFileParser
-import pandas
+
+if TYPE_CHECKING:
+    # Imported when a DataFrame is asked for: tools that only read or write JSON start faster without it.
+    import pandas
 
 __all__ = ["DataStoreRecord", "DataStore", "DataStoreError"]
 
@@ -18,6 +27,13 @@ __all__ = ["DataStoreRecord", "DataStore", "DataStoreError"]
 FILEVERSION = 20260531
 OLDEST_COMPATIBLE_VERSION = 20260531
 
+# Delta segments: annotations saved incrementally next to a combined-JSON base file.
+# combined.json is accompanied by combined.delta-0001.json, combined.delta-0002.json, ...
+# each holding annotation metadata and optionally naming a column sidecar
+# (combined.delta-0001.columns.json) with per-record values of the fields written,
+# and per field the indices of the records that do not have it ("removed").
+_DELTA_RE = re.compile(r"\.delta-(\d+)\.json$")
+
 class DataStoreError(RuntimeError):
     pass
 
@@ -43,6 +59,12 @@ The form "out1.out2=in" will take the value of input field "out1" and "out2", co
 The form "out1.=in" will take the value of input field "out1", concatenate that with a "." and the name of the input field, and use that as the output record field name for the value of "in".
 
 """
+
+type Query = Tuple[Optional[Predicate], Optional[List[FieldSpecifier]]]
+"""
+A Query is a (predicate, fields) pair, the arguments of DataStore.get_dataframe().
+"""
+
 class DataStore:
     """
     All data obtained from a single run.
@@ -55,9 +77,9 @@ class DataStore:
     verbose = True
 
     filename: Optional[str]
-    data: list[DataStoreRecord]
     session_metadata: Dict[str, Any]
     applied_annotations: Dict[str, Any]
+    time_window: Optional[Tuple[float, float]]
 
     def __init__(self, filename: Optional[str] = None, filename2: Optional[str] = None) -> None:
         """
@@ -70,9 +92,31 @@ class DataStore:
         """
         self.filename = filename
         self.filename2 = filename2
-        self.data = []
+        self._data: list[DataStoreRecord] = []
+        self._pending_columns: List[str] = []
+        self._prefetched: Dict[Tuple[Any, Optional[Tuple[str, ...]]], List[DataStoreRecord]] = {}
+        self._sessiontimes: Optional[List[float]] = None
         self.session_metadata = {}
         self.applied_annotations = {}
+        self.time_window = None
+
+    @property
+    def data(self) -> list[DataStoreRecord]:
+        """
+        The records in this DataStore.
+
+        Column sidecars of delta segments found at load time are merged into the
+        records on first access.
+        """
+        if self._pending_columns:
+            self._merge_pending_columns()
+        return self._data
+
+    @data.setter
+    def data(self, value: list[DataStoreRecord]) -> None:
+        self._data = value
+        self._pending_columns = []
+        self._sessiontimes = None
 
     def load(self) -> None:
         """
@@ -83,6 +127,7 @@ class DataStore:
             pass
         elif self.filename.endswith(".json"):
             self._load_json()
+            self._load_deltas()
         elif self.filename.endswith(".log"):
             self._load_log()
         else:
@@ -153,6 +198,74 @@ class DataStore:
                 "desync_uncertainty": metadata.get("desync_uncertainty", 0),
             }
 
+    def _delta_filenames(self) -> List[Tuple[int, str]]:
+        """Return (sequence number, filename) of all delta segments of our base file, in order."""
+        assert self.filename
+        dirname = os.path.dirname(self.filename) or "."
+        stem = os.path.basename(self.filename)[:-len(".json")]
+        rv: List[Tuple[int, str]] = []
+        for fn in os.listdir(dirname):
+            if not fn.startswith(stem + ".delta-"):
+                continue
+            m = _DELTA_RE.search(fn)
+            if m and fn == f"{stem}.delta-{m.group(1)}.json":
+                rv.append((int(m.group(1)), os.path.join(dirname, fn)))
+        rv.sort()
+        return rv
+
+    def fingerprint(self) -> str:
+        """
+        Return a fingerprint of the content of the files this DataStore is loaded from:
+        the base JSON file plus its delta segments and their column sidecars.
+
+        Does not need the store to be loaded. Changes whenever one of these files changes
+        (also after save() or save_delta()), so it can be used as a cache key for data
+        derived from the store.
+        """
+        if not self.filename or not self.filename.endswith(".json"):
+            raise DataStoreError(f"Cannot fingerprint {self.filename}")
+        filenames = [self.filename]
+        for _, delta_filename in self._delta_filenames():
+            filenames.append(delta_filename)
+            columns_filename = delta_filename[:-len(".json")] + ".columns.json"
+            if os.path.exists(columns_filename):
+                filenames.append(columns_filename)
+        h = hashlib.blake2b(digest_size=16)
+        for filename in filenames:
+            h.update(os.path.basename(filename).encode())
+            with open(filename, "rb") as fp:
+                while chunk := fp.read(1 << 20):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def _load_deltas(self) -> None:
+        """Merge annotation metadata of delta segments now, and remember their column sidecars for later."""
+        for _, delta_filename in self._delta_filenames():
+            raw = json.load(open(delta_filename, "r"))
+            fv = raw.get("fileversion", 0)
+            if fv < OLDEST_COMPATIBLE_VERSION or fv > FILEVERSION:
+                raise DataStoreError(f"{delta_filename}: unsupported fileversion {fv}")
+            self.applied_annotations.update(raw.get("annotations", {}))
+            columns_filename = raw.get("columns")
+            if columns_filename:
+                self._pending_columns.append(os.path.join(os.path.dirname(delta_filename), columns_filename))
+
+    def _merge_pending_columns(self) -> None:
+        pending = self._pending_columns
+        self._pending_columns = []
+        for columns_filename in pending:
+            raw = json.load(open(columns_filename, "r"))
+            if raw.get("nrecords") != len(self._data):
+                raise DataStoreError(
+                    f"{columns_filename}: written for {raw.get('nrecords')} records but store has {len(self._data)}"
+                )
+            removed = raw.get("removed", {})
+            for field, values in raw["columns"].items():
+                for record, value in zip(self._data, values):
+                    record[field] = value
+                for index in removed.get(field, ()):
+                    self._data[index].pop(field, None)
+
     def _load_log(self, nocheck : bool=False) -> None:
         assert self.filename
         parser = StatsFileParser(self.filename, self.filename2)
@@ -167,7 +280,7 @@ class DataStore:
         :type data: List[DataStoreRecord] | pandas.DataFrame
         """
         if hasattr(data, 'to_dict'):
-            df : pandas.DataFrame = cast(pandas.DataFrame, data)
+            df : pandas.DataFrame = cast("pandas.DataFrame", data)
             data = df.to_dict('records') # type: ignore
         self.data = cast(List[DataStoreRecord],data)
 
@@ -184,9 +297,13 @@ class DataStore:
         :return: The resultant DataFrame
         :rtype: DataFrame
         """
+        import pandas
         if not self.data:
             raise DataStoreError("DataStore is empty")
-        if predicate or fields:
+        key = _query_key(predicate, fields)
+        if key in self._prefetched:
+            data = self._prefetched[key]
+        elif predicate or fields:
             data = self._filter_data(predicate, fields)
         else:
             data = self.data
@@ -200,48 +317,322 @@ class DataStore:
         fields is a list of fieldnames to include in the output,
         use namefield=field to obtain field name from namefield
         """
-        rv : List[DataStoreRecord] = []
-        for record in self.data:
+        return self._filter_data_many([(predicate, fields)])[0]
+
+    def _filter_data_many(self, queries: List[Query]) -> List[List[DataStoreRecord]]:
+        """
+        Like _filter_data, for a number of (predicate, fields) queries at once, in a single
+        scan over the records. Returns the list of output records for every query.
+        """
+        rvs = self._match(self.data, _compile_queries(queries))
+        _warn_empty(queries, [len(rv) for rv in rvs])
+        return rvs
+
+    @classmethod
+    def _match(cls, records: Iterable[DataStoreRecord], compiled: List[Tuple[Any, Optional[List[FieldSpecifier]]]]) -> List[List[DataStoreRecord]]:
+        """Return the (projected) records matching every compiled query."""
+        rvs : List[List[DataStoreRecord]] = [[] for _ in compiled]
+        for record in records:
             nsrecord = dict(record) # shallow copy
             nsrecord["record"] = nsrecord
-            if predicate == None or eval(predicate, nsrecord):
-                if fields:
-                    entry : Dict[Any, Any] = dict()
-                    for k in fields:
-                        if "=" in k:
-                            newk, oldk = k.split("=")
-                            if "." in newk:
-                                # Use field1.field2=field notation
-                                newk1, newk2 = newk.split(".")
-                                if not newk1 in record:
-                                    continue
-                                if not newk2:
-                                    newk = record[newk1] + "." + oldk
-                                else:
-                                    if not newk2 in record:
-                                        continue
-                                    newk = record[newk1] + "." + record[newk2]
-                            else:
-                                if not newk in record:
-                                    continue
-                                newk = record[newk]
-                            if not newk:
-                                print(f'Warning: "{k}" produced no value for {record}', file=sys.stderr)
-                        else:
-                            newk = oldk = k
+            for (predicate, fields), rv in zip(compiled, rvs):
+                if predicate == None or eval(predicate, nsrecord):
+                    rv.append(cls._project(record, fields) if fields else record)
+        return rvs
 
-                        if oldk in record:
-                            entry[newk] = record[oldk]
+    @staticmethod
+    def _project(record: DataStoreRecord, fields: List[FieldSpecifier]) -> DataStoreRecord:
+        entry : Dict[Any, Any] = dict()
+        for k in fields:
+            if "=" in k:
+                newk, oldk = k.split("=")
+                if "." in newk:
+                    # Use field1.field2=field notation
+                    newk1, newk2 = newk.split(".")
+                    if not newk1 in record:
+                        continue
+                    if not newk2:
+                        newk = record[newk1] + "." + oldk
+                    else:
+                        if not newk2 in record:
+                            continue
+                        newk = record[newk1] + "." + record[newk2]
                 else:
-                    entry = record
-                rv.append(entry)
-        if len(rv) == 0:
-            print(f"_filter_data: Warning: empty dataset for fields={fields}, predicate: {predicate}")
+                    if not newk in record:
+                        continue
+                    newk = record[newk]
+                if not newk:
+                    print(f'Warning: "{k}" produced no value for {record}', file=sys.stderr)
+            else:
+                newk = oldk = k
+
+            if oldk in record:
+                entry[newk] = record[oldk]
+        return entry
+
+    @contextlib.contextmanager
+    def prefetch(self, queries: Iterable[Query]) -> Iterator[None]:
+        """
+        Run a number of (predicate, fields) queries in a single scan over the records.
+
+        Inside the with block get_dataframe() calls with exactly the same predicate and
+        fields are answered from the prefetched results instead of scanning the store
+        again. Other calls (and the records themselves) are not affected.
+
+            with ds.prefetch([(pred1, fields1), (pred2, fields2)]):
+                df1 = ds.get_dataframe(pred1, fields1)
+        """
+        keys : Dict[Tuple[Any, Optional[Tuple[str, ...]]], Query] = {}
+        for predicate, fields in queries:
+            keys.setdefault(_query_key(predicate, fields), (predicate, fields))
+        results = self._filter_data_many(list(keys.values())) if keys and self.data else []
+        saved = self._prefetched
+        self._prefetched = {**saved, **dict(zip(keys, results))}
+        try:
+            yield
+        finally:
+            self._prefetched = saved
+
+    def time_slice(self, start: float, end: float) -> DataStore:
+        """
+        Return a DataStore with only the records of this one with start <= sessiontime < end.
+
+        The new store shares the records (they are not copied), session_metadata and
+        applied_annotations with this one, so annotations should be applied before slicing.
+        It has no filename, and its time_window is (start, end). Records are located with a
+        binary search on sessiontime if the store is sorted on it (as normalized stores are),
+        otherwise with a scan.
+
+        :param start: Start of the window, in seconds of session time.
+        :type start: float
+        :param end: End of the window (exclusive).
+        :type end: float
+        :return: The DataStore for the window
+        :rtype: DataStore
+        """
+        if end <= start:
+            raise ValueError(f"time_slice: empty window [{start}, {end})")
+        data = self.data
+        times = self._sorted_sessiontimes()
+        if times is not None:
+            records = data[bisect_left(times, start):bisect_left(times, end)]
+        else:
+            records = [r for r in data if "sessiontime" in r and start <= r["sessiontime"] < end]
+        rv = DataStore()
+        rv.data = records
+        rv.session_metadata = self.session_metadata
+        rv.applied_annotations = self.applied_annotations
+        rv.time_window = (start, end)
         return rv
 
+    def _sorted_sessiontimes(self) -> Optional[List[float]]:
+        """The sessiontime of every record if all records have one and they are in order, else None. Memoized."""
+        if self._sessiontimes is None:
+            try:
+                times = [record["sessiontime"] for record in self.data]
+            except KeyError:
+                return None
+            if any(t1 > t2 for t1, t2 in zip(times, times[1:])):
+                return None
+            self._sessiontimes = times
+        return self._sessiontimes
+
+    def iter_time_slices(self, duration: float, start: Optional[float] = None, end: Optional[float] = None) -> Generator[DataStore, None, None]:
+        """
+        Iterate over consecutive windows [t, t + duration) of session time, as DataStores like time_slice().
+
+        Windows run from start (default: the multiple of duration at or before the first
+        sessiontime) up to end (default: the last sessiontime). Windows without records are
+        skipped, as are records without a sessiontime.
+
+        If the DataStore has been loaded the windows are taken with time_slice(). If not, and
+        it is a JSON file, the records are streamed with iter_chunks() and only the records
+        of the current window are held in memory; they must then be in sessiontime order
+        (as in normalized stores), otherwise DataStoreError is raised. session_metadata and
+        applied_annotations are read from the file before the first window is returned.
+
+        :param duration: Length of the windows, in seconds of session time.
+        :type duration: float
+        :param start: Start of the first window.
+        :type start: Optional[float]
+        :param end: Windows starting after end are not returned.
+        :type end: Optional[float]
+        :return: Iterator over the DataStore of every window
+        :rtype: Generator[DataStore, None, None]
+        """
+        if duration <= 0:
+            raise ValueError(f"iter_time_slices: duration must be positive, not {duration}")
+        if self._data or not (self.filename and self.filename.endswith(".json")):
+            if not self._data and self.filename:
+                self.load()
+            times = [record["sessiontime"] for record in self.data if "sessiontime" in record]
+            if not times:
+                return
+            if start is None:
+                start = math.floor(min(times) / duration) * duration
+            if end is None:
+                end = max(times)
+            page = 0
+            while start + page * duration <= end:
+                t0 = start + page * duration
+                page += 1
+                slice_ds = self.time_slice(t0, t0 + duration)
+                if slice_ds.data:
+                    yield slice_ds
+            return
+        records: List[DataStoreRecord] = []
+        page = 0
+        last = -math.inf
+
+        def window() -> DataStore:
+            assert start is not None
+            t0 = start + page * duration
+            rv = DataStore()
+            rv.data = records
+            rv.session_metadata = self.session_metadata
+            rv.applied_annotations = self.applied_annotations
+            rv.time_window = (t0, t0 + duration)
+            return rv
+
+        for record in (record for chunk in self.iter_chunks() for record in chunk):
+            t = record.get("sessiontime")
+            if t is None:
+                continue
+            if t < last:
+                raise DataStoreError(f"{self.filename}: records are not in sessiontime order ({t} after {last}), load the store to page it")
+            last = t
+            if start is None:
+                start = math.floor(t / duration) * duration
+            if t < start:
+                continue
+            p = math.floor((t - start) / duration)
+            # Same window boundaries as time_slice(start + p * duration, ...), despite rounding
+            if t >= start + (p + 1) * duration:
+                p += 1
+            elif t < start + p * duration:
+                p -= 1
+            if end is not None and start + p * duration > end:
+                break
+            if p != page and records:
+                yield window()
+                records = []
+            page = p
+            records.append(record)
+        if records:
+            yield window()
+
+    def iter_chunks(self, chunk_size: int = 10000) -> Iterator[List[DataStoreRecord]]:
+        """
+        Iterate over the records in chunks of (at most) chunk_size records.
+
+        If the DataStore has been loaded this simply slices data. If not, and it is a JSON
+        file, the records are decoded incrementally from the file, with the column sidecars
+        of delta segments applied, and never all held in memory: data stays empty. Other
+        files are loaded first.
+        session_metadata and applied_annotations are set as soon as they have been read
+        (for files written by save(): before the first chunk).
+
+        :param chunk_size: Maximum number of records per chunk.
+        :type chunk_size: int
+        :return: Iterator over lists of records
+        :rtype: Iterator[List[DataStoreRecord]]
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"iter_chunks: chunk_size must be positive, not {chunk_size}")
+        if not self._data and self.filename and self.filename.endswith(".json"):
+            chunk: List[DataStoreRecord] = []
+            for record in self._stream_json():
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+            return
+        if not self._data and self.filename:
+            self.load()
+        data = self.data
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    def iter_filtered(self, queries: Iterable[Query], chunk_size: int = 10000) -> Iterator[List[List[DataStoreRecord]]]:
+        """
+        Run a number of (predicate, fields) queries in a single scan over the records, chunk by chunk.
+
+        Yields, for every chunk of iter_chunks(chunk_size), the list of matching records
+        (projected on the fields, as get_dataframe() does) of every query. Together the
+        chunks give the same records as get_dataframe(predicate, fields) for each query,
+        but the store does not have to be loaded or fit in memory.
+        """
+        queries = list(queries)
+        compiled = _compile_queries(queries)
+        counts = [0] * len(queries)
+        for chunk in self.iter_chunks(chunk_size):
+            rvs = self._match(chunk, compiled)
+            for i, rv in enumerate(rvs):
+                counts[i] += len(rv)
+            yield rvs
+        _warn_empty(queries, counts)
+
+    def _stream_json(self) -> Iterator[DataStoreRecord]:
+        """Decode the records of our JSON file one at a time, setting the metadata on the way, and apply delta segments."""
+        assert self.filename
+        delta_annotations: Dict[str, Any] = {}
+        delta_columns: List[Tuple[str, Dict[str, Any], Dict[str, Set[int]]]] = []
+        for _, delta_filename in self._delta_filenames():
+            raw = json.load(open(delta_filename, "r"))
+            fv = raw.get("fileversion", 0)
+            if fv < OLDEST_COMPATIBLE_VERSION or fv > FILEVERSION:
+                raise DataStoreError(f"{delta_filename}: unsupported fileversion {fv}")
+            delta_annotations.update(raw.get("annotations", {}))
+            if raw.get("columns"):
+                columns_filename = os.path.join(os.path.dirname(delta_filename), raw["columns"])
+                columns = json.load(open(columns_filename, "r"))
+                removed = {field: set(indices) for field, indices in columns.get("removed", {}).items()}
+                delta_columns.append((columns_filename, columns, removed))
+
+        def header(key: str, value: Any) -> None:
+            if key == "fileversion":
+                if value < OLDEST_COMPATIBLE_VERSION:
+                    raise DataStoreError(
+                        f"{self.filename}: fileversion {value} is older than oldest supported {OLDEST_COMPATIBLE_VERSION}"
+                    )
+                if value > FILEVERSION:
+                    raise DataStoreError(
+                        f"{self.filename}: fileversion {value} is newer than this code ({FILEVERSION}); upgrade VRTstatistics"
+                    )
+            elif key == "session":
+                self.session_metadata = value
+            elif key == "annotations":
+                self.applied_annotations = value
+            elif key == "metadata":
+                self._load_old_metadata(value)
+            self.applied_annotations.update(delta_annotations)
+
+        self.applied_annotations.update(delta_annotations)
+        nrecords = 0
+        with open(self.filename, "r") as fp:
+            for record in _JSONStream(fp, self.filename).records("data", header):
+                for columns_filename, raw, removed in delta_columns:
+                    if nrecords >= raw.get("nrecords", 0):
+                        raise DataStoreError(f"{columns_filename}: written for {raw.get('nrecords')} records but store has more")
+                    for field, values in raw["columns"].items():
+                        if field in removed and nrecords in removed[field]:
+                            record.pop(field, None)
+                        else:
+                            record[field] = values[nrecords]
+                nrecords += 1
+                yield record
+        for columns_filename, raw, _ in delta_columns:
+            if raw.get("nrecords") != nrecords:
+                raise DataStoreError(f"{columns_filename}: written for {raw.get('nrecords')} records but store has {nrecords}")
+
     def save(self) -> None:
         """
         Save the DataStore to its JSON filename.
+
+        The whole store is rewritten (atomically), and any delta segments next to it
+        are folded in and removed.
         """
         if not self.data:
             raise DataStoreError("DataStore is empty")
@@ -260,7 +651,58 @@ class DataStore:
             out["annotations"] = self.applied_annotations
         out["data"] = self.data
         assert self.filename
-        json.dump(out, open(self.filename, "w"), indent="\t")
+        deltas = self._delta_filenames()
+        _atomic_json_dump(out, self.filename, indent="\t")
+        for _, delta_filename in deltas:
+            columns_filename = delta_filename[:-len(".json")] + ".columns.json"
+            os.remove(delta_filename)
+            if os.path.exists(columns_filename):
+                os.remove(columns_filename)
+
+    def save_delta(self, annotations: Iterable[str], fields: Iterable[str] = ()) -> Optional[str]:
+        """
+        Save some annotations incrementally, as a delta segment next to the base JSON file.
+
+        Only the metadata of the named annotations is written, plus a column sidecar
+        with the per-record values of `fields` (if any), so the base file is not rewritten.
+        The segment is merged when the store is next loaded, and folded into the base
+        file by the next save().
+
+        :param annotations: Names of entries in applied_annotations to save.
+        :type annotations: Iterable[str]
+        :param fields: Record fields that were added or modified by these annotations.
+        :type fields: Iterable[str]
+        :return: The delta segment filename, or None if there was nothing to save.
+        :rtype: Optional[str]
+        """
+        assert self.filename
+        if not self.filename.endswith(".json") or not os.path.exists(self.filename):
+            raise DataStoreError(f"Cannot save delta for {self.filename}: no existing JSON base file")
+        annotations = list(annotations)
+        fields = list(fields)
+        if not annotations and not fields:
+            return None
+        deltas = self._delta_filenames()
+        seqno = deltas[-1][0] + 1 if deltas else 1
+        stem = self.filename[:-len(".json")]
+        delta_filename = f"{stem}.delta-{seqno:04d}.json"
+        out: Dict[str, Any] = {"fileversion": FILEVERSION}
+        out["annotations"] = {name: self.applied_annotations[name] for name in annotations}
+        if fields:
+            # Sidecar first: the delta file appearing is what commits the segment.
+            columns_filename = f"{stem}.delta-{seqno:04d}.columns.json"
+            data = self.data
+            columns = {f: [record.get(f) for record in data] for f in fields}
+            # Records without the field are listed separately, so a null value stays a null value
+            removed = {f: [i for i, record in enumerate(data) if f not in record] for f in fields}
+            removed = {f: indices for f, indices in removed.items() if indices}
+            _atomic_json_dump(
+                {"fileversion": FILEVERSION, "nrecords": len(data), "columns": columns, "removed": removed},
+                columns_filename
+            )
+            out["columns"] = os.path.basename(columns_filename)
+        _atomic_json_dump(out, delta_filename, indent="\t")
+        return delta_filename
 
     def find_first_record(self, predicate : Predicate, descr : str) -> DataStoreRecord:
         """
@@ -324,3 +766,128 @@ class DataStore:
         if not self.data:
             raise DataStoreError("DataStore is empty")
         self.data.sort(key=key)
+        self._sessiontimes = None
+
+
+def _compile_queries(queries: List[Query]) -> List[Tuple[Any, Optional[List[FieldSpecifier]]]]:
+    return [
+        (compile(predicate, "<predicate>", "eval") if isinstance(predicate, str) else predicate, fields)
+        for predicate, fields in queries
+    ]
+
+
+def _warn_empty(queries: List[Query], counts: List[int]) -> None:
+    for (predicate, fields), count in zip(queries, counts):
+        if count == 0:
+            print(f"_filter_data: Warning: empty dataset for fields={fields}, predicate: {predicate}")
+
+
+def _query_key(predicate: Optional[Predicate], fields: Optional[List[FieldSpecifier]]) -> Tuple[Any, Optional[Tuple[str, ...]]]:
+    return (predicate or None, tuple(fields) if fields else None)
+
+
+def _atomic_json_dump(obj: Any, filename: str, indent: Optional[str] = None) -> None:
+    """Write obj as JSON to a temporary file next to filename, then rename it over filename."""
+    tmpname = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmpname, "w") as ofp:
+            json.dump(obj, ofp, indent=indent)
+        os.replace(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+class _JSONStream:
+    """
+    Incremental reader of a JSON file: decodes one value at a time with JSONDecoder.raw_decode,
+    reading the file in blocks, so that the records of a large DataStore file can be processed
+    without holding the whole file (or all records) in memory.
+    """
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, fp: Any, filename: str, blocksize: int = 1 << 20) -> None:
+        self.fp = fp
+        self.filename = filename
+        self.blocksize = blocksize
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Read more of the file (at least as much as is buffered, so decoding a large value takes linear time). Returns False at end of file."""
+        if self.eof:
+            return False
+        block = self.fp.read(max(self.blocksize, len(self.buf) - self.pos))
+        if not block:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at end of file."""
+        while True:
+            m = self._WHITESPACE.match(self.buf, self.pos)
+            assert m
+            self.pos = m.end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if not c or c not in chars:
+            raise DataStoreError(f"{self.filename}: malformed JSON, expected one of {chars!r} but found {c or 'end of file'!r}")
+        self.pos += 1
+        return c
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise DataStoreError(f"{self.filename}: malformed JSON: {e}") from None
+            if end == len(self.buf) and self._fill():
+                continue  # A number at the end of the buffer may continue in the next block
+            self.pos = end
+            return value
+
+    def _items(self) -> Iterator[Any]:
+        """Decode the elements of an array, after its opening bracket."""
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def records(self, key: str, header: Callable[[str, Any], None]) -> Iterator[Any]:
+        """
+        Decode the elements of the array that is the top-level value (a bare list), or the
+        value of key in the top-level object, one at a time. The other members of the
+        top-level object are decoded whole and passed to header(name, value), in file order.
+        """
+        if self._expect("{[") == "[":
+            yield from self._items()
+            return
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name == key and self._peek() == "[":
+                self.pos += 1
+                yield from self._items()
+            else:
+                header(name, self._value())
+            if self._expect(",}") == "}":
+                return
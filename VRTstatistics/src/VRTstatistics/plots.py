@@ -10,10 +10,11 @@ import matplotlib.pyplot as pyplot
 from matplotlib.backends.backend_pdf import PdfPages
 
 from .datastore import DataStore, DataStoreError, Predicate
-from .analyze import DataFrameFilter, TileCombiner, SessionTimeFilter
+from .analyze import DataFrameFilter, TileCombiner, SessionTimeFilter, downsample_dataframe
 from .annotation import engine
 from .views import (
     LatencyView, LatencyPerTileView, ResourceView, FramerateView, PointcountView, ProgressView,
+    LatencyPercentileView, LatencyHeatmapView, View,
     extract_latencies, extract_latencies_per_tile, extract_resources,
     extract_framerates, extract_pointcounts, extract_progress,
 )
@@ -29,6 +30,8 @@ class PlotStyle:
     tick_kwargs: Dict[str, Any] = field(default_factory=dict)    # → xticks()/yticks()
     legend_kwargs: Dict[str, Any] = field(default_factory=dict)  # → ax.legend()
     legend_row_major: bool = False
+    downsample: Optional[str] = None                 # None, "lttb" or "minmax": thin out time series before plotting
+    downsample_points: Optional[int] = None          # horizontal resolution for downsample (None = figure width in pixels)
 
 
 __all__ = [
@@ -41,7 +44,8 @@ __all__ = [
     "render_latencies", "render_latencies_per_tile",
     "render_resources", "render_resource_cpu", "render_resource_mem", "render_resource_bandwidth",
     "render_framerates", "render_framerates_dropped", "render_framerates_and_dropped",
-    "render_pointcounts", "render_progress",
+    "render_pointcounts", "render_progress", "render_latency_percentiles",
+    "render_latency_heatmap", "render_time_window",
     "publish_plots", "extract_legend",
 ]
 
@@ -85,6 +89,18 @@ def _plot_dataframe(dataframe: pd.DataFrame, *, title: Optional[str]=None, nosho
     return plot
 
 
+def _downsample(dataframe: pd.DataFrame, style: PlotStyle, figsize: Any=None, *, x: str="sessiontime", fields: Optional[List[str]]=None) -> pd.DataFrame:
+    """Apply the downsampling of style (if any) to dataframe, for a figure of figsize inches (default: style.figsize or rcParams)."""
+    if not style.downsample:
+        return dataframe
+    n = style.downsample_points
+    if n is None:
+        if figsize is None:
+            figsize = style.figsize if style.figsize is not None else pyplot.rcParams["figure.figsize"]
+        n = int(figsize[0] * pyplot.rcParams["figure.dpi"])
+    return downsample_dataframe(dataframe, n, x=x, columns=fields, method=style.downsample)
+
+
 def _handle_color(handle) -> Optional[tuple]:
     """Extract normalised RGBA colour from a legend handle for comparison."""
     try:
@@ -229,7 +245,8 @@ def render_resource_cpu(view: ResourceView, *, title: str="CPU usage", style: Pl
     """Render CPU usage from a ResourceView."""
     cpu_cols = [c for c in view.resources.columns if c != 'sessiontime' and c.endswith('.cpu')]
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.resources, noshow=True, title=title, x="sessiontime", fields=cpu_cols, descr=view.description, plotargs=actual_plotargs)
+    resources = _downsample(view.resources, style, fields=cpu_cols)
+    ax = _plot_dataframe(resources, noshow=True, title=title, x="sessiontime", fields=cpu_cols, descr=view.description, plotargs=actual_plotargs)
     _, top = ax.get_ylim()
     ax.set_ylim(0, top * 1.5)
     _apply_style(ax, style)
@@ -240,7 +257,8 @@ def render_resource_mem(view: ResourceView, *, title: str="Memory usage", style:
     """Render memory usage from a ResourceView."""
     mem_cols = [c for c in view.resources.columns if c != 'sessiontime' and c.endswith('.mem')]
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.resources, noshow=True, title=title, x="sessiontime", fields=mem_cols, descr=view.description, plotargs=actual_plotargs)
+    resources = _downsample(view.resources, style, fields=mem_cols)
+    ax = _plot_dataframe(resources, noshow=True, title=title, x="sessiontime", fields=mem_cols, descr=view.description, plotargs=actual_plotargs)
     _, top = ax.get_ylim()
     ax.set_ylim(0, top * 1.5)
     _apply_style(ax, style)
@@ -251,7 +269,8 @@ def render_resource_bandwidth(view: ResourceView, *, title: str="Bandwidth usage
     """Render bandwidth usage from a ResourceView."""
     bw_cols = [c for c in view.resources.columns if c != 'sessiontime' and (c.endswith('.recv_bandwidth') or c.endswith('.sent_bandwidth'))]
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.resources, noshow=True, title=title, x="sessiontime", fields=bw_cols, descr=view.description, plotargs=actual_plotargs)
+    resources = _downsample(view.resources, style, fields=bw_cols)
+    ax = _plot_dataframe(resources, noshow=True, title=title, x="sessiontime", fields=bw_cols, descr=view.description, plotargs=actual_plotargs)
     _, top = ax.get_ylim()
     ax.set_ylim(0, top * 1.5)
     _apply_style(ax, style)
@@ -307,8 +326,9 @@ def render_latencies_per_tile(view: LatencyPerTileView, *, style: PlotStyle=Plot
     else:
         fig.set_figheight(fig.get_figheight() * (view.nTiles - 1))
         fig.set_figwidth(fig.get_figwidth() * 1.5)
+    per_tile = _downsample(view.per_tile, style, fig.get_size_inches())
     for i in range(view.nTiles):
-        _plot_latencies_for_tile(view.per_tile, i, axs[i], sender=view.sender, receiver=view.receiver, plotargs=style.plot_kwargs)
+        _plot_latencies_for_tile(per_tile, i, axs[i], sender=view.sender, receiver=view.receiver, plotargs=style.plot_kwargs)
     handles, labels = axs[0].get_legend_handles_labels()
     fig.legend(handles, labels, loc='center right')  # type: ignore
     pyplot.subplots_adjust(right=0.66)
@@ -323,7 +343,7 @@ def render_latencies(view: LatencyView, *, title: str="Latency contributions (ms
     line overlays. Optionally overlays disruption events (frame drops, tile switches).
     """
     figsize = style.figsize if style.figsize is not None else (6, 4)
-    ax = _plot_dataframe(view.area,
+    ax = _plot_dataframe(_downsample(view.area, style, figsize),
         noshow=True,
         title=title,
         x="sessiontime",
@@ -335,7 +355,7 @@ def render_latencies(view: LatencyView, *, title: str="Latency contributions (ms
     if "voice latency" in view.end2end.columns:
         latency_cols.append("voice latency")
         latency_colors.append("green")
-    view.end2end.interpolate().plot(x="sessiontime", y=latency_cols, ax=ax, color=latency_colors)
+    _downsample(view.end2end, style, figsize, fields=latency_cols).interpolate().plot(x="sessiontime", y=latency_cols, ax=ax, color=latency_colors)
     if view.framedrops is not None:
         view.framedrops.plot(x='sessiontime', y=['PC Drop event'], marker='|', linestyle='None', color='red', ax=ax, zorder=4)
     if view.tileswitches is not None:
@@ -359,7 +379,8 @@ def render_latencies(view: LatencyView, *, title: str="Latency contributions (ms
 def render_framerates(view: FramerateView, *, title: str="Frames per second", style: PlotStyle=PlotStyle()) -> List[Axes]:
     """Render frames-per-second from a FramerateView."""
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.fps, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
+    df = _downsample(view.fps, style)
+    ax = _plot_dataframe(df, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
     _apply_style(ax, style)
     return [ax]
 
@@ -367,7 +388,8 @@ def render_framerates(view: FramerateView, *, title: str="Frames per second", st
 def render_framerates_dropped(view: FramerateView, *, title: str="FPS dropped", style: PlotStyle=PlotStyle()) -> List[Axes]:
     """Render dropped-frames-per-second from a FramerateView."""
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.fps_dropped, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
+    df = _downsample(view.fps_dropped, style)
+    ax = _plot_dataframe(df, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
     _apply_style(ax, style)
     return [ax]
 
@@ -380,7 +402,8 @@ def render_framerates_and_dropped(view: FramerateView, *, style: PlotStyle=PlotS
 def render_pointcounts(view: PointcountView, *, title: str="Receiver point counts", style: PlotStyle=PlotStyle()) -> List[Axes]:
     """Render receiver point counts from a PointcountView."""
     actual_plotargs = ({} if style.figsize is None else {"figsize": style.figsize}) | style.plot_kwargs
-    ax = _plot_dataframe(view.pointcounts, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
+    df = _downsample(view.pointcounts, style)
+    ax = _plot_dataframe(df, noshow=True, title=title, x="sessiontime", descr=view.description, plotargs=actual_plotargs)
     _, top = ax.get_ylim()
     ax.set_ylim(0, top * 1.5)
     _apply_style(ax, style)
@@ -436,6 +459,88 @@ def render_progress(view: ProgressView, *, title: str="Pointcloud Progress", sty
     return [ax]
 
 
+def render_latency_percentiles(view: LatencyPercentileView, *, title: str="Latency percentiles (ms)", style: PlotStyle=PlotStyle()) -> List[Axes]:
+    """Render windowed latency quantiles from a LatencyPercentileView: one subplot per pipeline stage, one line per quantile."""
+    labels = [f"p{q * 100:g}" for q in view.quantiles]
+    nstages = len(view.stages)
+    fig: Figure
+    fig, axs = pyplot.subplots(nstages, 1, sharex=True, squeeze=False)  # type: ignore
+    if style.figsize is not None:
+        fig.set_size_inches(style.figsize)
+    else:
+        fig.set_figheight(max(fig.get_figheight(), 1.5 * nstages))
+    axes: List[Axes] = []
+    for ax, stage in zip(axs[:, 0], view.stages):
+        columns = [f"{stage}.{label}" for label in labels]
+        df = view.statistics[["sessiontime"] + columns].rename(columns=dict(zip(columns, labels)))
+        df = _downsample(df, style, fig.get_size_inches(), fields=labels)
+        df.plot(x="sessiontime", y=labels, ax=ax, legend=False, **style.plot_kwargs)
+        ax.set_title(stage, fontsize='small')  # type: ignore
+        ax.set_xlabel("")
+        axes.append(ax)
+    axes[-1].set_xlabel("Session time (s)")
+    handles, legend_labels = axes[0].get_legend_handles_labels()
+    fig.legend(handles, legend_labels, loc='upper right', fontsize='small')  # type: ignore
+    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
+    axes[0].text(0.98, 0.98, view.description, transform=axes[0].transAxes, verticalalignment='top', horizontalalignment='right', fontsize='x-small', bbox=props)  # type: ignore
+    fig.suptitle(f"{title}, {view.window:g}s windows")
+    return axes
+
+
+def render_latency_heatmap(view: LatencyHeatmapView, *, title: str="Latency distribution (ms)", style: PlotStyle=PlotStyle()) -> List[Axes]:
+    """
+    Render a LatencyHeatmapView: one image per pipeline stage, session time horizontally,
+    latency vertically, record count per bucket as (logarithmic) colour.
+    """
+    stages = list(view.heatmaps)
+    if not stages:
+        raise DataStoreError("no latency data, nothing to plot")
+    fig: Figure
+    fig, axs = pyplot.subplots(len(stages), 1, sharex=True, squeeze=False)  # type: ignore
+    if style.figsize is not None:
+        fig.set_size_inches(style.figsize)
+    else:
+        fig.set_figheight(max(fig.get_figheight(), 1.5 * len(stages)))
+    vmax = max(int(h.to_numpy().max()) for h in view.heatmaps.values())
+    norm = mcolors.LogNorm(vmin=1, vmax=max(vmax, 2))
+    axes: List[Axes] = []
+    image = None
+    for ax, stage in zip(axs[:, 0], stages):
+        counts = view.heatmaps[stage]
+        t = counts.index.to_numpy()
+        v = counts.columns.to_numpy(dtype=float)
+        dt = (t[1] - t[0]) / 2 if len(t) > 1 else 0.5
+        dv = (v[1] - v[0]) / 2 if len(v) > 1 else 0.5
+        image = ax.imshow(
+            counts.to_numpy().T, origin='lower', aspect='auto', interpolation='nearest',
+            extent=(t[0] - dt, t[-1] + dt, v[0] - dv, v[-1] + dv), norm=norm, cmap='viridis',
+        )
+        if style.ylim_top:
+            ax.set_ylim(top=style.ylim_top)
+        ax.set_title(stage, fontsize='small')  # type: ignore
+        axes.append(ax)
+    axes[-1].set_xlabel("Session time (s)")
+    assert image is not None
+    fig.colorbar(image, ax=axs[:, 0].tolist(), label="records")
+    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
+    axes[0].text(0.98, 0.98, view.description, transform=axes[0].transAxes, verticalalignment='top', horizontalalignment='right', fontsize='x-small', bbox=props)  # type: ignore
+    fig.suptitle(title)
+    return axes
+
+
+def render_time_window(view: View, start: float, end: float, **kwargs: Any) -> List[Axes]:
+    """
+    Render a View extracted from one session time window (see views.extract_pages) with
+    the x axis of every plot set to exactly [start, end], so that consecutive pages line up.
+    kwargs are passed to the renderer.
+    """
+    axes = view.render(**kwargs)
+    for ax in axes:
+        if ax.get_label() != '<colorbar>':
+            ax.set_xlim(start, end)
+    return axes
+
+
 # ── plot_* convenience wrappers: DataStore → List[Axes] ───────────────────────
 # Each calls extract_*() + render_*() + publish_plots().
 # Signatures are kept backward-compatible; styling params are bridged to PlotStyle.
@@ -506,3 +611,5 @@ ResourceView.register_renderer(render_resources)
 FramerateView.register_renderer(render_framerates_and_dropped)
 PointcountView.register_renderer(render_pointcounts)
 ProgressView.register_renderer(render_progress)
+LatencyPercentileView.register_renderer(render_latency_percentiles)
+LatencyHeatmapView.register_renderer(render_latency_heatmap)
@@ -0,0 +1,20 @@
+import argparse
+from typing import Any, Optional, Sequence
+
+
+class VersionAction(argparse.Action):
+    """
+    Like argparse's "version" action, but only looks up the installed package version when
+    --version is actually given: importing importlib.metadata costs more start-up time than
+    the rest of a --help run.
+    """
+
+    def __init__(self, option_strings: Sequence[str], dest: str = argparse.SUPPRESS, default: Any = argparse.SUPPRESS,
+                 help: str = "show program's version number and exit", distribution: str = "VRTstatistics") -> None:
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+        self.distribution = distribution
+
+    def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace, values: Any, option_string: Optional[str] = None) -> None:
+        from importlib.metadata import version
+        print(f"{parser.prog} {version(self.distribution)}")
+        parser.exit()
@@ -3,11 +3,14 @@ import os
 import argparse
 import importlib
 import re
-from importlib.metadata import version as _pkg_version
+import time
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Dict, List, Tuple, Any
 
 from ..datastore import DataStore
-from ..annotation import engine
+from . import VersionAction
+from ..annotation import engine, ProfilingHook, format_profiles
 
 
 def _parse_annotation_arg(arg: str) -> Tuple[str, Dict[str, Any]]:
@@ -31,11 +34,102 @@ def _parse_annotation_arg(arg: str) -> Tuple[str, Dict[str, Any]]:
     return name, params
 
 
+type AnnotationSpec = List[Tuple[str, Dict[str, Any]]]
+
+
+def _import_modules(modules: List[str]) -> None:
+    """Import external annotation modules (also used as worker initializer, so steps register in every process)."""
+    for mod_name in modules:
+        importlib.import_module(mod_name)
+
+
+@dataclass
+class _FileResult:
+    """Outcome of annotating one file, returned from (possibly worker-process) _annotate_file."""
+    filepath: str
+    ok: bool
+    message: str
+    elapsed: float
+    profile: str = ""
+
+
+def _annotate_file(filepath: str, parsed: AnnotationSpec, profile: bool = False, compact: bool = False) -> _FileResult:
+    """
+    Load, annotate and save a single DataStore file.
+
+    Newly applied annotations are saved as a delta segment next to the file, unless
+    compact is set or a step has undeclared writes: then the whole file is rewritten.
+
+    Never raises, so it can be run in a worker process and have its outcome
+    reported by the parent. If profile is set the steps applied are measured
+    with a ProfilingHook and a formatted table is returned.
+    """
+    t0 = time.perf_counter()
+    try:
+        ds = DataStore(filepath)
+        ds.load()
+    except Exception as e:
+        return _FileResult(filepath, False, f"error loading: {e}", time.perf_counter() - t0)
+    already_applied = set(ds.applied_annotations)
+    hook = ProfilingHook() if profile else None
+    if hook:
+        engine.add_hook(hook)
+    try:
+        engine.ensure_many(ds, [name for name, _ in parsed], params={name: params for name, params in parsed})
+    except Exception as e:
+        return _FileResult(filepath, False, f"error applying annotations: {e}", time.perf_counter() - t0)
+    finally:
+        if hook:
+            engine.remove_hook(hook)
+    try:
+        new_annotations = [name for name in ds.applied_annotations if name not in already_applied]
+        fields = engine.written_fields(new_annotations)
+        if compact or fields is None:
+            ds.save()
+        else:
+            ds.save_delta(new_annotations, fields)
+    except Exception as e:
+        return _FileResult(filepath, False, f"error saving: {e}", time.perf_counter() - t0)
+    return _FileResult(filepath, True, "", time.perf_counter() - t0, format_profiles(hook.profiles) if hook else "")
+
+
+def _report(result: _FileResult, prefix: str = "") -> None:
+    if not result.ok:
+        print(f"{prefix}{result.filepath}: {result.message}", file=sys.stderr)
+        return
+    if prefix:
+        print(f"{prefix}{result.filepath}: ok ({result.elapsed:.1f}s)")
+    if result.profile:
+        print(f"{result.filepath}:")
+        print(result.profile)
+
+
+def _annotate_parallel(files: List[str], parsed: AnnotationSpec, modules: List[str], jobs: int, profile: bool, compact: bool) -> bool:
+    """Annotate files concurrently in a pool of worker processes, reporting progress and timing."""
+    total = len(files)
+    done = 0
+    failed = 0
+    busy = 0.0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_import_modules, initargs=(modules,)) as pool:
+        futures = [pool.submit(_annotate_file, filepath, parsed, profile, compact) for filepath in files]
+        for future in as_completed(futures):
+            result = future.result()
+            done += 1
+            busy += result.elapsed
+            _report(result, f"[{done}/{total}] ")
+            if not result.ok:
+                failed += 1
+    wall = time.perf_counter() - t0
+    print(f"Annotated {total - failed}/{total} files with {jobs} workers in {wall:.1f}s ({busy:.1f}s total work)")
+    return failed == 0
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Apply annotations to a combined.json DataStore produced by VRTstatistics-ingest"
     )
-    parser.add_argument("--version", action="version", version=f"%(prog)s {_pkg_version('VRTstatistics')}")
+    parser.add_argument("--version", action=VersionAction)
     parser.add_argument(
         "--list",
         action="store_true",
@@ -57,6 +151,23 @@ def main() -> None:
         default=[],
         help="Import MODULE before running (allows external steps to register themselves).",
     )
+    parser.add_argument(
+        "-j", "--jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Annotate up to N files concurrently in separate processes (0: one per CPU, default: 1)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Rewrite the whole file, folding in earlier delta segments (default: save new annotations as a delta segment next to the file).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Measure wall time, CPU time, peak memory and records touched of each step applied, and print them.",
+    )
     parser.add_argument(
         "--pausefordebug",
         action="store_true",
@@ -86,14 +197,13 @@ def main() -> None:
         sys.stderr.flush()
         sys.stdin.readline()
 
-    for mod_name in args.modules:
-        importlib.import_module(mod_name)
+    _import_modules(args.modules)
 
     if args.list:
         print(engine.list_steps())
         sys.exit(0)
 
-    if not args.annotations:
+    if not args.annotations and not args.compact:
         parser.error("At least one -a/--annotate argument is required")
     if not args.files:
         parser.error("At least one combined.json file is required")
@@ -106,19 +216,16 @@ def main() -> None:
             parser.error(str(e))
         parsed.append((name, params))
 
-    ok = True
-    for filepath in args.files:
-        ds = DataStore(filepath)
-        ds.load()
-        for name, params in parsed:
-            try:
-                engine.ensure(ds, name, **params)
-            except Exception as e:
-                print(f"{filepath}: error applying annotation '{name}': {e}", file=sys.stderr)
-                ok = False
-                break
-        else:
-            ds.save()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    jobs = min(jobs, len(args.files))
+    if jobs > 1:
+        ok = _annotate_parallel(args.files, parsed, args.modules, jobs, args.profile, args.compact)
+    else:
+        ok = True
+        for filepath in args.files:
+            result = _annotate_file(filepath, parsed, args.profile, args.compact)
+            _report(result)
+            ok = ok and result.ok
 
     sys.exit(0 if ok else 1)
 
@@ -1,18 +1,255 @@
 import argparse
+import csv
+import json
 import sys
 import os
-from importlib.metadata import version as _pkg_version
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Any, Dict, List, Optional
 
-from ..datastore import DataStore
+from ..datastore import DataStore, DataStoreError, DataStoreRecord
+from . import VersionAction
+
+# Output formats by file name extension. Files with other extensions are written as CSV.
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+
+class _CSVWriter:
+    """
+    Append records to a CSV file, one chunk at a time.
+
+    Columns are in order of first appearance, as in a DataFrame built from all records. If
+    columns appear after the header has been written, the file is rewritten (streaming, line
+    by line) with the full header when it is closed.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.fp = open(path, "w", newline="")
+        self.writer = csv.writer(self.fp, lineterminator="\n")
+        self.columns: Dict[str, None] = {}
+        self.header: Optional[List[str]] = None
+
+    def write(self, records: List[DataStoreRecord]) -> None:
+        for record in records:
+            for k in record:
+                self.columns.setdefault(k)
+        if not self.columns:
+            return
+        if self.header is None:
+            self.header = list(self.columns)
+            self.writer.writerow(self.header)
+        columns = list(self.columns)
+        self.writer.writerows([record.get(k) for k in columns] for record in records)
+        self.fp.flush()
+
+    def close(self) -> None:
+        self.fp.close()
+        if self.header is None or len(self.columns) == len(self.header):
+            return
+        columns = list(self.columns)
+        tmpname = f"{self.path}.{os.getpid()}.tmp"
+        with open(self.path, newline="") as src, open(tmpname, "w", newline="") as dst:
+            reader = csv.reader(src)
+            writer = csv.writer(dst, lineterminator="\n")
+            next(reader)
+            writer.writerow(columns)
+            for row in reader:
+                writer.writerow(row + [""] * (len(columns) - len(row)))
+        os.replace(tmpname, self.path)
+
+
+class _JSONLinesWriter:
+    """Append records to a JSON Lines file, one JSON object per line."""
+    def __init__(self, path: str) -> None:
+        self.fp = open(path, "w")
+
+    def write(self, records: List[DataStoreRecord]) -> None:
+        self.fp.writelines(json.dumps(record) + "\n" for record in records)
+        self.fp.flush()
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+class _ParquetWriter:
+    """
+    Append records to a Parquet file, one row group per chunk. Needs pyarrow.
+
+    The schema is inferred from the first chunk. A chunk with new columns, or values that do
+    not fit the column types, starts a new part file; when closed, the parts are merged into
+    the output file with the unified schema, one record batch at a time.
+    """
+    def __init__(self, path: str) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise DataStoreError("Parquet output needs pyarrow (pip install pyarrow)") from None
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.parts: List[str] = []
+        self.writer: Any = None
+
+    def _conform(self, table: Any, schema: Any) -> Any:
+        """Return table with exactly the columns of schema, missing ones null. Raises if a column does not fit."""
+        if any(name not in schema.names for name in table.column_names):
+            raise ValueError("new columns")
+        columns = [
+            table[f.name].cast(f.type) if f.name in table.column_names else self.pa.nulls(len(table), f.type)
+            for f in schema
+        ]
+        return self.pa.Table.from_arrays(columns, schema=schema)
+
+    def write(self, records: List[DataStoreRecord]) -> None:
+        if not records:
+            return
+        columns: Dict[str, None] = {}
+        for record in records:
+            for k in record:
+                columns.setdefault(k)
+        table = self.pa.Table.from_pydict({k: [record.get(k) for record in records] for k in columns})
+        schema = table.schema
+        if self.writer is not None:
+            try:
+                self.writer.write_table(self._conform(table, self.writer.schema))
+                return
+            except (ValueError, self.pa.ArrowException):
+                pass
+            self.writer.close()
+            # The next part gets the columns of both, so later chunks are likely to fit it
+            try:
+                schema = self.pa.unify_schemas([self.writer.schema, schema], promote_options="permissive")
+                table = self._conform(table, schema)
+            except (ValueError, self.pa.ArrowException):
+                schema = table.schema
+        self.parts.append(f"{self.path}.part{len(self.parts)}.{os.getpid()}.tmp")
+        self.writer = self.pq.ParquetWriter(self.parts[-1], schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is None:
+            self.pq.write_table(self.pa.table({}), self.path)
+            return
+        self.writer.close()
+        if len(self.parts) == 1:
+            os.replace(self.parts[0], self.path)
+            return
+        try:
+            schema = self.pa.unify_schemas([self.pq.read_schema(part) for part in self.parts], promote_options="permissive")
+            with self.pq.ParquetWriter(self.path, schema) as writer:
+                for part in self.parts:
+                    for batch in self.pq.ParquetFile(part).iter_batches():
+                        writer.write_table(self._conform(self.pa.Table.from_batches([batch]), schema))
+        except (ValueError, self.pa.ArrowException) as e:
+            raise DataStoreError(f"{self.path}: cannot combine columns with different types: {e}") from None
+        finally:
+            for part in self.parts:
+                os.remove(part)
+
+
+def _open_writer(path: str, fmt: Optional[str] = None) -> Any:
+    """Return a writer for path, in format fmt (default: from the file name extension)."""
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+    if fmt == "jsonl":
+        return _JSONLinesWriter(path)
+    if fmt == "parquet":
+        return _ParquetWriter(path)
+    return _CSVWriter(path)
+
+
+@dataclass
+class _Export:
+    """One output of an export: the records matching predicate, projected on fields, written to output."""
+    output: str
+    predicate: Optional[str] = None
+    fields: Optional[List[str]] = None
+    format: Optional[str] = None
+
+
+def _read_spec(path: str, output_dir: Optional[str]) -> List[_Export]:
+    """
+    Read an export spec file: JSON (a list of entries, or an object with an "exports" list)
+    or TOML (an [[exports]] array of tables). Every entry has an output file name and an
+    optional predicate, list of fields and format. Relative output names are relative to
+    output_dir, if given. Raises ValueError for a malformed spec.
+    """
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as fp:
+            raw: Any = tomllib.load(fp)
+    else:
+        with open(path) as fp:
+            raw = json.load(fp)
+    entries = raw.get("exports") if isinstance(raw, dict) else raw
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of exports")
+    rv: List[_Export] = []
+    for i, entry in enumerate(entries):
+        where = f"{path}: export {i + 1}"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected an object with output, predicate and fields")
+        unknown = set(entry) - {f.name for f in dataclass_fields(_Export)}
+        if unknown:
+            raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(unknown))}")
+        if not isinstance(entry.get("output"), str) or not entry["output"]:
+            raise ValueError(f"{where}: output must be a file name")
+        if not isinstance(entry.get("predicate") or "", str):
+            raise ValueError(f"{where}: predicate must be a string")
+        fields = entry.get("fields")
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+            raise ValueError(f"{where}: fields must be a list of field mappings")
+        if entry.get("format") not in (None, *FORMATS.values()):
+            raise ValueError(f"{where}: format must be one of {', '.join(sorted(set(FORMATS.values())))}")
+        export = _Export(**entry)
+        export.fields = export.fields or None
+        if output_dir:
+            export.output = os.path.join(output_dir, export.output)
+        rv.append(export)
+    outputs = [export.output for export in rv]
+    duplicates = sorted({output for output in outputs if outputs.count(output) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: more than one export writes {', '.join(duplicates)}")
+    return rv
+
+
+def _export(datastore: DataStore, exports: List[_Export], chunk_size: int) -> List[int]:
+    """
+    Write all exports in a single scan over the store, a chunk of records at a time.
+    Returns the number of records written to every output.
+    """
+    writers = []
+    try:
+        for export in exports:
+            writers.append(_open_writer(export.output, export.format))
+        counts = [0] * len(exports)
+        nchunks = 0
+        for results in datastore.iter_filtered([(export.predicate, export.fields) for export in exports], chunk_size):
+            nchunks += 1
+            for i, (writer, records) in enumerate(zip(writers, results)):
+                writer.write(records)
+                counts[i] += len(records)
+    finally:
+        for writer in writers:
+            writer.close()
+    if nchunks == 0:
+        raise DataStoreError("DataStore is empty")
+    return counts
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Export selected fields from a datastore to CSV")
-    parser.add_argument("--version", action="version", version=f"%(prog)s {_pkg_version('VRTstatistics')}")
+    parser = argparse.ArgumentParser(description="Export selected fields from a datastore to CSV, JSON Lines or Parquet")
+    parser.add_argument("--version", action=VersionAction)
     parser.add_argument("-d", "--datastore", required=True, help="datastore file to export from")
     parser.add_argument(
-        "-o", "--output", metavar="FILE", required=True, help="Output CSV file"
+        "-o", "--output", metavar="FILE",
+        help="Output file: .csv, .jsonl (or .ndjson) or .parquet (needs pyarrow). Other extensions are written as CSV. With --spec: directory for the outputs (default: current directory)"
     )
+    parser.add_argument("--spec", metavar="FILE",
+                        help="Write all exports listed in FILE (JSON or TOML, entries with output, predicate, fields and format) in a single scan over the datastore")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], default=None,
+                        help="Output format (default: from the output file extension)")
+    parser.add_argument("--chunk-size", metavar="N", type=int, default=10000,
+                        help="Read, filter and write N records at a time (default: 10000)")
     parser.add_argument(
         "-p",
         "--predicate",
@@ -29,13 +266,34 @@ def main():
         sys.stderr.write(f"Attach debugger to pid={os.getpid()}. Press return to continue - ")
         sys.stderr.flush()
         sys.stdin.readline()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
 
-    datastore = DataStore(args.datastore)
-    datastore.load()
+    if args.spec:
+        if args.predicate or args.fields or args.format:
+            parser.error("--spec cannot be combined with --predicate, --format or fields")
+        try:
+            exports = _read_spec(args.spec, args.output)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+    elif args.output:
+        exports = [_Export(args.output, args.predicate, args.fields or None, args.format)]
+    else:
+        parser.error("--output or --spec is required")
 
-    fields = args.fields if args.fields else None
-    df = datastore.get_dataframe(args.predicate, fields)
-    df.to_csv(args.output, index=False)
+    # The store is not loaded: records are streamed from the file, filtered and written a chunk
+    # at a time, so memory use does not depend on the size of the store.
+    datastore = DataStore(args.datastore)
+    try:
+        counts = _export(datastore, exports, args.chunk_size)
+    except DataStoreError as e:
+        print(f"{parser.prog}: Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.spec:
+        for export, count in zip(exports, counts):
+            print(f"{export.output}: {count} records")
 
     sys.exit(0)
 
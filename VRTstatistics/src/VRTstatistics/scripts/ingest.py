@@ -1,24 +1,227 @@
 import sys
 import os
 import argparse
-from importlib.metadata import version as _pkg_version
-from typing import List, Tuple
+import contextlib
+import csv
+import functools
+import glob
+import time
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple, Union
 
-from ..datastore import DataStore
+from ..datastore import DataStore, DataStoreError
+from . import VersionAction
 from ..normalizer import SessionNormalizer
 from ..scripts.annotate import _parse_annotation_arg
 from ..annotation import engine
-from VRTrun import Session, SessionConfig
+from VRTrun import SessionConfig
 
 verbose = True
 
+# Name of the file in each run directory that gets the output of ingesting it in batch mode.
+BATCH_LOG_FILENAME = "ingest.log"
+
+def _machine_logs(workdir: str, roles: List[str], prog: str) -> List[Tuple[str, str, Optional[str]]]:
+    """Return (machine role, stats log, rusage or visual quality log or None) for every machine of a run."""
+    machines : List[Tuple[str, str, Optional[str]]] = []
+    for machine_role in roles:
+        machine_stats_filename = os.path.join(workdir, machine_role, "stats.log")
+        machine_rusage_filename = os.path.join(workdir, machine_role, "rusage.log")
+        machine_vq_filename = os.path.join(workdir, machine_role, "vq-brisque.log" )
+        if os.path.exists(machine_vq_filename):
+            print(f"{prog}: Using visual quality data from {machine_vq_filename}")
+            extra_filename = machine_vq_filename
+        elif os.path.exists(machine_rusage_filename):
+            extra_filename = machine_rusage_filename
+        else:
+            print(f"{prog}: Warning: no rusage data found at {machine_rusage_filename}")
+            extra_filename = None
+        machines.append((machine_role, machine_stats_filename, extra_filename))
+    return machines
+
+
+def _load_machine(machine_role: str, stats_filename: str, extra_filename: Optional[str]) -> Tuple[DataStore, float]:
+    """Worker: parse and check the stats log (plus rusage or visual quality log) of one machine. Returns (DataStore, elapsed)."""
+    t0 = time.perf_counter()
+    machine_data = DataStore(stats_filename, extra_filename)
+    machine_data.load()
+    return machine_data, time.perf_counter() - t0
+
+
+def _load_machines(machines: List[Tuple[str, str, Optional[str]]], jobs: int, prog: str) -> List[Tuple[str, DataStore]]:
+    """
+    Load the logs of all machines, concurrently in a pool of jobs worker processes.
+
+    Returns (machine role, DataStore) in the order of machines. Raises DataStoreError
+    (after reporting every machine that failed) if a log could not be loaded.
+    """
+    t0 = time.perf_counter()
+    jobs = min(jobs, len(machines))
+    results: List[Tuple[str, DataStore]] = []
+    failed: List[str] = []
+    outcomes: List[Union[Tuple[DataStore, float], Exception]] = []
+    with contextlib.ExitStack() as stack:
+        if jobs > 1:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            pending = [pool.submit(_load_machine, *machine) for machine in machines]
+            calls = [future.result for future in pending]
+        else:
+            calls = [functools.partial(_load_machine, *machine) for machine in machines]
+        for call in calls:
+            try:
+                outcomes.append(call())
+            except Exception as e:
+                outcomes.append(e)
+    for (machine_role, stats_filename, _), outcome in zip(machines, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"{prog}: Error loading {stats_filename}: {type(outcome).__name__}: {outcome}", file=sys.stderr)
+            failed.append(machine_role)
+            continue
+        machine_data, elapsed = outcome
+        if verbose:
+            print(f"{prog}: {machine_role}: {len(machine_data.data)} records ({elapsed:.1f}s)")
+        results.append((machine_role, machine_data))
+    if verbose:
+        print(f"{prog}: loaded {len(machines)} machines with {max(jobs, 1)} workers in {time.perf_counter() - t0:.1f}s")
+    if failed:
+        raise DataStoreError(f"cannot load the logs of {', '.join(failed)}")
+    return results
+
+
+def _ingest(workdir: str, roles: List[str], annotations: List[str], jobs: int, prog: str) -> Tuple[bool, int]:
+    """
+    Ingest one run: load the logs of its machines, normalize them into combined.json,
+    apply annotations and save. Returns (ok, number of records saved). ok is False if
+    validation or an annotation failed (the run is saved anyway).
+    """
+    datastores = _load_machines(_machine_logs(workdir, roles, prog), jobs, prog)
+
+    combined_filename = os.path.join(workdir, "combined.json")
+
+    outputdata = DataStore(combined_filename)
+    normalizer = SessionNormalizer(datastores, outputdata)
+    ok = normalizer.normalize()
+
+    for ann_arg in annotations:
+        try:
+            name, params = _parse_annotation_arg(ann_arg)
+            engine.ensure(outputdata, name, **params)
+        except Exception as e:
+            print(f"{prog}: Error applying annotation '{ann_arg}': {e}", file=sys.stderr)
+            ok = False
+
+    outputdata.save()
+    return ok, len(outputdata.data)
+
+
+@dataclass
+class _RunResult:
+    """Outcome of ingesting one run in batch mode, returned from (possibly worker-process) _ingest_run."""
+    workdir: str
+    status: str  # "ok", "warnings" (saved, but validation or an annotation failed) or "failed"
+    message: str
+    elapsed: float
+    records: int = 0
+
+
+def _init_batch_worker(max_memory: int) -> None:
+    """Worker initializer: limit the address space of the worker to max_memory MB (0: no limit)."""
+    if not max_memory:
+        return
+    import resource  # Unix only, checked by main()
+    limit = max_memory * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _ingest_run(workdir: str, roles: List[str], annotations: List[str], prog: str) -> _RunResult:
+    """
+    Ingest one run of a batch, with all output going to the BATCH_LOG_FILENAME file in its directory.
+
+    Never raises, so it can be run in a worker process and have its outcome reported by the parent.
+    Running out of memory (see _init_batch_worker) fails only this run.
+    """
+    t0 = time.perf_counter()
+    try:
+        with open(os.path.join(workdir, BATCH_LOG_FILENAME), "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            ok, records = _ingest(workdir, roles, annotations, 1, prog)
+    except MemoryError:
+        return _RunResult(workdir, "failed", "out of memory", time.perf_counter() - t0)
+    except Exception as e:
+        return _RunResult(workdir, "failed", f"{type(e).__name__}: {e}", time.perf_counter() - t0)
+    if not ok:
+        return _RunResult(workdir, "warnings", f"see {BATCH_LOG_FILENAME}", time.perf_counter() - t0, records)
+    return _RunResult(workdir, "ok", "", time.perf_counter() - t0, records)
+
+
+def _ingest_batch(workdirs: List[str], roles: List[str], args: argparse.Namespace, prog: str) -> bool:
+    """
+    Ingest many runs in a pool of worker processes, continuing past failures, and print (and
+    optionally write as CSV) a summary of every run. Returns False if any run failed.
+    """
+    total = len(workdirs)
+    jobs = min(args.jobs or os.cpu_count() or 1, total)
+    t0 = time.perf_counter()
+    results: List[_RunResult] = []
+
+    def report(result: _RunResult) -> None:
+        results.append(result)
+        line = f"[{len(results)}/{total}] {result.workdir}: {result.status} ({result.elapsed:.1f}s)"
+        if result.message:
+            line += f": {result.message}"
+        print(line, file=sys.stderr if result.status == "failed" else sys.stdout, flush=True)
+
+    pool = ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_batch_worker, initargs=(args.max_memory,),
+        max_tasks_per_child=args.max_tasks_per_child or None,
+    )
+    with pool:
+        futures = {pool.submit(_ingest_run, workdir, roles, args.annotations, prog): workdir for workdir in workdirs}
+        for future in as_completed(futures):
+            try:
+                report(future.result())
+            except Exception as e:  # The worker process died, for example killed by the OOM killer
+                report(_RunResult(futures[future], "failed", f"{type(e).__name__}: {e}", 0.0))
+    wall = time.perf_counter() - t0
+
+    order = {workdir: i for i, workdir in enumerate(workdirs)}
+    results.sort(key=lambda r: order[r.workdir])
+    width = max(len(r.workdir) for r in results)
+    print()
+    print(f"{'run':{width}s}  {'status':8s} {'records':>9s} {'seconds':>8s}  message")
+    for r in results:
+        print(f"{r.workdir:{width}s}  {r.status:8s} {r.records:9d} {r.elapsed:8.1f}  {r.message}")
+    counts = {status: sum(1 for r in results if r.status == status) for status in ("ok", "warnings", "failed")}
+    print(f"{total} runs: {counts['ok']} ok, {counts['warnings']} with warnings, {counts['failed']} failed, with {jobs} workers in {wall:.1f}s ({sum(r.elapsed for r in results):.1f}s total work)")
+    if args.summary:
+        with open(args.summary, "w", newline="") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["run", "status", "records", "seconds", "message"])
+            for r in results:
+                writer.writerow([r.workdir, r.status, r.records, f"{r.elapsed:.3f}", r.message])
+    return counts["failed"] == 0
+
+
+def _expand_workdirs(patterns: List[str]) -> List[str]:
+    """Expand glob patterns to run directories, keeping the order given and dropping duplicates."""
+    workdirs: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        workdirs += [m for m in matches if os.path.isdir(m)]
+    return list(dict.fromkeys(workdirs))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run a test, or ingest results")
 
-    parser.add_argument("--version", action="version", version=f"%(prog)s {_pkg_version('VRTstatistics')}")
+    parser.add_argument("--version", action=VersionAction)
     parser.add_argument("-a", "--annotate", metavar="NAME[(...)]", action="append", dest="annotations", default=[], help="Annotation to apply after ingesting (same syntax as VRTstatistics-annotate). Repeat for multiple.")
-    parser.add_argument("--norun", metavar="DIR", help="Don't run the test, only ingest data from an earlier run)")
+    parser.add_argument("--norun", metavar="DIR", nargs="+", help="Don't run the test, only ingest data from an earlier run. With several directories (or glob patterns matching them) ingest all of them in batch mode")
     parser.add_argument("--config", metavar="DIR", default="./config", help="Config directory to use (default: ./config)")
+    parser.add_argument("-j", "--jobs", metavar="N", type=int, default=0, help="Load the logs of up to N machines concurrently in separate processes, or in batch mode ingest up to N runs concurrently (default: one per CPU)")
+    parser.add_argument("--max-memory", metavar="MB", type=int, default=0, help="Batch mode: limit the memory of every worker process to MB megabytes, a run that needs more fails (default: no limit)")
+    parser.add_argument("--max-tasks-per-child", metavar="N", type=int, default=16, help="Batch mode: replace every worker process after it has ingested N runs, 0 for never (default: 16)")
+    parser.add_argument("--summary", metavar="FILE", help="Batch mode: also write the per-run status and timings as CSV to FILE")
     parser.add_argument("--pausefordebug", action="store_true", help="Wait for a newline after start (so you can attach a debugger)")
     parser.add_argument("--debugpy", action="store_true", help="Pause at begin of run to allow debugpuy to attach")
     args = parser.parse_args()
@@ -40,13 +243,23 @@ def main():
         sys.exit(1)
 
     sessionconfig = SessionConfig.from_configdir(configdir)
+    roles = [machine_role for machine_role, _ in sessionconfig.get_machines()]
 
     #
     # First we run the session (if needed)
     #
     if args.norun:
-        workdir = args.norun
+        workdirs = _expand_workdirs(args.norun)
+        if not workdirs:
+            print(f"{parser.prog}: Error: no run directories match {' '.join(args.norun)}", file=sys.stderr)
+            sys.exit(1)
+        if len(workdirs) > 1 or args.summary:
+            if args.max_memory and sys.platform == "win32":
+                parser.error("--max-memory is not supported on Windows")
+            sys.exit(0 if _ingest_batch(workdirs, roles, args, parser.prog) else 1)
+        workdir = workdirs[0]
     else:
+        from VRTrun import Session  # Imports socketio and requests, only needed to run a session
 
         workdir = Session.invent_workdir()
 
@@ -64,38 +277,11 @@ def main():
             print(f"{parser.prog}: Error: session failed with status {sts}", file=sys.stderr)
             return sts
 
-    datastores : List[Tuple[str, DataStore]] = []
-    for machine_role, _ in sessionconfig.get_machines():
-        machine_stats_filename = os.path.join(workdir, machine_role, "stats.log")
-        machine_rusage_filename = os.path.join(workdir, machine_role, "rusage.log")
-        machine_vq_filename = os.path.join(workdir, machine_role, "vq-brisque.log" )
-        if os.path.exists(machine_vq_filename):
-            print(f"{parser.prog}: Using visual quality data from {machine_vq_filename}")
-            extra_filename = machine_vq_filename
-        elif os.path.exists(machine_rusage_filename):
-            extra_filename = machine_rusage_filename
-        else:
-            print(f"{parser.prog}: Warning: no rusage data found at {machine_rusage_filename}")
-            extra_filename = None
-        machine_data = DataStore(machine_stats_filename,extra_filename )
-        machine_data.load()
-        datastores.append((machine_role, machine_data))
-   
-    combined_filename = os.path.join(workdir, "combined.json")
-
-    outputdata = DataStore(combined_filename)
-    normalizer = SessionNormalizer(datastores, outputdata)
-    ok = normalizer.normalize()
-
-    for ann_arg in args.annotations:
-        try:
-            name, params = _parse_annotation_arg(ann_arg)
-            engine.ensure(outputdata, name, **params)
-        except Exception as e:
-            print(f"{parser.prog}: Error applying annotation '{ann_arg}': {e}", file=sys.stderr)
-            ok = False
-
-    outputdata.save()
+    try:
+        ok, _ = _ingest(workdir, roles, args.annotations, args.jobs or os.cpu_count() or 1, parser.prog)
+    except DataStoreError as e:
+        print(f"{parser.prog}: Error: {e}", file=sys.stderr)
+        sys.exit(1)
     sys.exit(0 if ok else 1)
 
 
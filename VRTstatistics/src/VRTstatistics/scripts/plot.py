@@ -2,26 +2,221 @@ import argparse
 import importlib
 import sys
 import os
-import matplotlib.pyplot as pyplot
-from importlib.metadata import version as _pkg_version
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from ..datastore import DataStore
-from ..views import View
-from ..plots import plot_simple, PlotStyle, publish_plots
+from . import VersionAction
+from ..views import View, extract_pages, extract_views
+
+# matplotlib and the render code (..plots) are imported where plots are made, so that
+# --version, --help and --list-types start quickly.
+
+def _render_options(title: Optional[str], downsample: Optional[str]=None) -> Dict[str, Any]:
+    from ..plots import PlotStyle
+    kwargs: Dict[str, Any] = {'style': PlotStyle(downsample=downsample)}
+    if title:
+        kwargs['title'] = title
+    return kwargs
+
+
+def _figures(axes: List[Any]) -> List[Any]:
+    return list(dict.fromkeys(ax.get_figure() for ax in axes))
+
+
+def _init_worker(modules: List[str]) -> None:
+    import matplotlib.pyplot as pyplot
+    pyplot.switch_backend("Agg")
+    for mod in modules:
+        importlib.import_module(mod)
+
+
+def _render_view(view: View, title: Optional[str], downsample: Optional[str], path: Optional[str], window: Optional[Tuple[float, float]]=None) -> Tuple[str, Optional[List[Any]], str, float]:
+    """
+    Render one View (in this process or a worker), and save it to path or (if path is None)
+    return its figures. With a (start, end) session time window the x axis is limited to
+    that window. The figures are closed in pyplot, so a worker does not keep them; they can
+    still be saved.
+
+    Returns (view type name, figures or None, error message, elapsed).
+    """
+    import matplotlib.pyplot as pyplot
+    from ..plots import publish_plots, render_time_window
+    t0 = time.perf_counter()
+    existing = set(pyplot.get_fignums())
+    try:
+        if window:
+            axes = render_time_window(view, *window, **_render_options(title, downsample))
+        else:
+            axes = view.render(**_render_options(title, downsample))
+        figures = None
+        if path:
+            publish_plots(axes, showplot=False, saveplot=True, dirname=os.path.dirname(path), file_name=os.path.basename(path))
+        else:
+            figures = _figures(axes)
+    except Exception as e:
+        return view.name, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+    finally:
+        for num in set(pyplot.get_fignums()) - existing:
+            pyplot.close(num)
+    return view.name, figures, "", time.perf_counter() - t0
+
+
+def _render_result(future: Any, name: str) -> Tuple[str, Optional[List[Any]], str, float]:
+    """The result of _render_view in a worker, or an error result if it could not be returned."""
+    try:
+        return future.result()
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}", 0.0
+
+
+def _publish_views(views: List[View], args: argparse.Namespace, single: bool) -> bool:
+    """
+    Render and publish extracted Views: interactively if there is no output, else to the output
+    file (one requested type, or a .pdf output for several: one multi-page PDF) or to one file
+    per View in the output directory. Rendering to files happens in a pool of worker processes,
+    one View (and figure) at a time per worker. Returns False if a View could not be rendered.
+    """
+    import matplotlib.pyplot as pyplot
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from ..plots import publish_plots
+    if not args.output:
+        axes = []
+        for view in views:
+            axes += view.render(**_render_options(args.title, args.downsample))
+        publish_plots(axes, showplot=True, saveplot=False)
+        return True
+    merged = single or (args.output.endswith(".pdf") and not os.path.isdir(args.output))
+    if merged:
+        paths: List[Optional[str]] = [None] * len(views)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        paths = [os.path.join(args.output, view.default_filename) for view in views]
+    jobs = min(args.jobs or os.cpu_count() or 1, max(len(views), 1))
+    t0 = time.perf_counter()
+    results: Dict[str, Tuple[Optional[List[Any]], str]] = {}
+    if jobs == 1 or len(views) <= 1:
+        for view, path in zip(views, paths):
+            name, figures, message, _ = _render_view(view, args.title, args.downsample, path)
+            results[name] = (figures, message)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(args.imports,)) as pool:
+            futures = {
+                pool.submit(_render_view, view.materialize(), args.title, args.downsample, path): view.name
+                for view, path in zip(views, paths)
+            }
+            for future in as_completed(futures):
+                name, figures, message, _ = _render_result(future, futures[future])
+                results[name] = (figures, message)
+    ok = True
+    axes = []
+    for view, path in zip(views, paths):
+        figures, message = results[view.name]
+        if message:
+            print(f"{view.name}: {message}", file=sys.stderr)
+            ok = False
+        elif path:
+            print(f"{view.name}: {path}")
+        else:
+            axes += [ax for fig in figures for ax in fig.axes]  # type: ignore
+    if merged and axes:
+        dirname = os.path.dirname(os.path.abspath(args.output))
+        publish_plots(axes, showplot=False, saveplot=True, dirname=dirname, file_name=os.path.basename(args.output))
+        pyplot.close('all')
+    if len(views) > 1:
+        print(f"Rendered {sum(1 for f, m in results.values() if not m)}/{len(views)} plots with {jobs} workers in {time.perf_counter() - t0:.1f}s")
+    return ok
+
+
+def _publish_pages(ds: DataStore, names: List[str], args: argparse.Namespace, all_types: bool) -> bool:
+    """
+    Paged report: extract the View types one --page-duration window of session time at a
+    time (see extract_pages: ds is streamed if it need not be annotated) and write every
+    (window, View) as a page of the output PDF, in window order.
+
+    Pages are rendered in a pool of worker processes while later windows are extracted.
+    At most a few pages per worker are in flight: finished pages are written to the PDF
+    and closed as soon as all earlier pages are written, so memory use does not grow
+    with session length. Returns False if a page could not be extracted or rendered.
+    """
+    import matplotlib.pyplot as pyplot
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from matplotlib.backends.backend_pdf import PdfPages
+    jobs = args.jobs or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    ok = True
+    npages = 0
+    found: Dict[str, int] = {name: 0 for name in names}
+    errors: Dict[str, Exception] = {}
+    pending: deque = deque()  # (label, view type name, Future) in page order
+
+    def write(label: str, result: Tuple[str, Optional[List[Any]], str, float]) -> None:
+        nonlocal ok, npages
+        _, figures, message, _ = result
+        if message:
+            print(f"{label}: {message}", file=sys.stderr)
+            ok = False
+            return
+        for fig in figures:  # type: ignore
+            fig.savefig(pp, bbox_inches='tight', format="pdf", pad_inches=0.05)
+            pyplot.close(fig)
+            npages += 1
+
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(args.imports,)) if jobs > 1 else None
+    try:
+        with PdfPages(args.output) as pp:
+            for start, end, views in extract_pages(ds, names, args.page_duration, errors=errors):
+                for name, view in views.items():
+                    found[name] += 1
+                    label = f"{name}@{start:g}s"
+                    task = (args.title, args.downsample, None, (start, end))
+                    if pool is None:
+                        write(label, _render_view(view, *task))
+                        continue
+                    pending.append((label, name, pool.submit(_render_view, view.materialize(), *task)))
+                    while len(pending) > 2 * jobs:
+                        label, name, future = pending.popleft()
+                        write(label, _render_result(future, name))
+            while pending:
+                label, name, future = pending.popleft()
+                write(label, _render_result(future, name))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    for key, e in errors.items():
+        print(f"{key}s: {type(e).__name__}: {e}", file=sys.stderr)
+        ok = False
+    for name, count in found.items():
+        if count == 0 and not all_types:
+            print(f"{name}: not applicable to {args.datastore}", file=sys.stderr)
+            ok = False
+    print(f"{args.output}: {npages} pages of {args.page_duration:g}s windows, with {jobs} workers in {time.perf_counter() - t0:.1f}s")
+    return ok
+
 
 def main():
     parser = argparse.ArgumentParser(description="Plot datastore file")
-    parser.add_argument("--version", action="version", version=f"%(prog)s {_pkg_version('VRTstatistics')}")
+    parser.add_argument("--version", action=VersionAction)
     parser.add_argument("--import", dest="imports", metavar="MODULE", action="append", default=[],
                         help="Import MODULE before running (use to register external plot types)")
     parser.add_argument("--list-types", action="store_true",
                         help="List available standard plot types and exit")
-    parser.add_argument("--type", metavar="TYPE",
-                        help="Produce a standard plot of the given type (see --list-types)")
+    parser.add_argument("--type", metavar="TYPE", action="append",
+                        help="Produce a standard plot of the given type (see --list-types), or 'all' for every type that applies to the datastore. Repeat for multiple types")
+    parser.add_argument("-j", "--jobs", metavar="N", type=int, default=0,
+                        help="Render multiple plot types in N worker processes (default: one per CPU)")
     parser.add_argument("-d", "--datastore", metavar="FILE",
                         help="DataStore file to plot")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache extracted plot data next to the datastore, so re-plotting an unchanged datastore skips loading and extraction (with --type). The cache is read with pickle: only use it for datastore directories you trust")
     parser.add_argument(
-        "-o", "--output", metavar="FILE", help="Output plot image file (default: show interactively)"
+        "-o", "--output", metavar="FILE",
+        help="Output plot image file (default: show interactively). With several plot types: a directory for one file per type, or a .pdf file for a single multi-page PDF"
     )
+    parser.add_argument("--page-duration", metavar="SECONDS", type=float, default=None,
+                        help="Paged report (with --type and a .pdf output): one page per plot type per SECONDS of session time, each extracted and rendered separately. An annotated JSON datastore is read one window at a time, otherwise it is loaded whole")
+    parser.add_argument("--downsample", choices=["lttb", "minmax"], default=None,
+                        help="Thin out time series to about one point per pixel of figure width before rendering (with --type): lttb keeps the shape, minmax keeps every peak")
     parser.add_argument(
         "-p", "--predicate", metavar="EXPR", default=None,
         help="Plot only data matching EXPR predicate (ad-hoc mode)"
@@ -55,30 +250,50 @@ def main():
         for name, cls in sorted(View._registry.items()):
             doc = (cls.__doc__ or "").strip().splitlines()[0]
             print(f"  {name:20s}  {doc}")
+        print(f"  {'all':20s}  All of the above that apply to the datastore, extracted in a single pass.")
         return
 
     if args.type:
         if not args.datastore:
             parser.error("--type requires --datastore")
-        view_cls = View._registry.get(args.type)
-        if view_cls is None:
-            parser.error(f"Unknown type {args.type!r}. Use --list-types to see available types.")
+        all_types = "all" in args.type
+        names = sorted(View._registry) if all_types else list(dict.fromkeys(args.type))
+        for name in names:
+            if name not in View._registry:
+                parser.error(f"Unknown type {name!r}. Use --list-types to see available types.")
+        if args.page_duration is not None:
+            if args.page_duration <= 0:
+                parser.error("--page-duration must be positive")
+            if not args.output or not args.output.endswith(".pdf"):
+                parser.error("--page-duration requires a .pdf --output file")
+            if args.cache:
+                parser.error("--page-duration cannot be combined with --cache")
+            ds = DataStore(args.datastore)
+            if not _publish_pages(ds, names, args, all_types):
+                sys.exit(1)
+            return
         ds = DataStore(args.datastore)
-        ds.load()
-        view = view_cls.extract(ds)
-        kwargs: dict = {'style': PlotStyle()}
-        if args.title:
-            kwargs['title'] = args.title
-        axes = view.render(**kwargs)
-        if args.output:
-            dirname = os.path.dirname(os.path.abspath(args.output))
-            file_name = os.path.basename(args.output)
-            publish_plots(axes, showplot=False, saveplot=True, dirname=dirname, file_name=file_name)
-        else:
-            publish_plots(axes, showplot=True, saveplot=False)
+        if not args.cache:
+            ds.load()
+        errors: Dict[str, Exception] = {}
+        views = extract_views(ds, names, errors=errors, cache=args.cache)
+        failed = False
+        for name in names:
+            if name in errors:
+                print(f"{name}: {type(errors[name]).__name__}: {errors[name]}", file=sys.stderr)
+                failed = True
+            elif name not in views and not all_types:
+                print(f"{name}: not applicable to {args.datastore}", file=sys.stderr)
+                failed = True
+        if not _publish_views(list(views.values()), args, single=len(names) == 1 and not all_types):
+            failed = True
+        if failed:
+            sys.exit(1)
         return
 
     # Ad-hoc mode: plot_simple with predicate and field selection
+    import matplotlib.pyplot as pyplot
+    from ..plots import plot_simple
     if not args.datastore:
         parser.error("--datastore is required")
     datastore = DataStore(args.datastore)
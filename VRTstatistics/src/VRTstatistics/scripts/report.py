@@ -0,0 +1,272 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field, fields as dataclass_fields
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from ..datastore import DataStore
+from ..cache import extractor_identity, package_version, store_files
+from . import VersionAction
+from ..collection import DataStoreCollection
+from ..views import View, extract_views
+
+# pandas, matplotlib and the render code are imported in the workers, only when a run has
+# outputs to rebuild: checking that everything is up to date does not need them.
+
+# Name of the file in the output directory recording what every output was made from.
+MANIFEST_FILENAME = "manifest.json"
+
+
+@dataclass
+class _RunResult:
+    """Outcome of building the report of one run, returned from (possibly worker-process) _build_run."""
+    run: str
+    ok: bool
+    message: str
+    elapsed: float
+    built: List[str] = field(default_factory=list)
+    uptodate: List[str] = field(default_factory=list)
+
+
+def _init_worker(modules: List[str]) -> None:
+    """Worker initializer: non-interactive backend, and import external modules so their View types register."""
+    os.environ["MPLBACKEND"] = "Agg"  # Applies when matplotlib is imported, which may not be needed at all
+    for mod in modules:
+        importlib.import_module(mod)
+
+
+def _recipe(view_cls: type, fingerprint: str, downsample: Optional[str]) -> Dict[str, Any]:
+    """Everything an output depends on: the datastore content, the tool and extractor versions and the options."""
+    extractor = getattr(view_cls, "_extractor", None)
+    return {
+        "fingerprint": fingerprint,
+        "version": package_version(),
+        "extractor": extractor_identity(extractor, getattr(view_cls, "_extractor_version", None)) if extractor else "",
+        "downsample": downsample,
+    }
+
+
+def _read_manifest(outdir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(outdir, MANIFEST_FILENAME)) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(outdir: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(outdir, MANIFEST_FILENAME)
+    tmpname = f"{path}.{os.getpid()}.tmp"
+    with open(tmpname, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.replace(tmpname, path)
+
+
+def _is_uptodate(entry: Optional[Dict[str, Any]], recipe: Dict[str, Any], outdir: str) -> bool:
+    if not entry or entry.get("recipe") != recipe:
+        return False
+    return all(os.path.exists(os.path.join(outdir, fn)) for fn in entry.get("outputs", []))
+
+
+def _content_hash(view: Optional[View]) -> str:
+    """Hash of the data in an extracted View ("" for a View type that does not apply)."""
+    if view is None:
+        return ""
+    import pandas as pd
+    h = hashlib.blake2b(digest_size=16)
+    view.materialize()
+    for f in dataclass_fields(view):
+        value = getattr(view, f.name)
+        h.update(f.name.encode() + b"\0")
+        if isinstance(value, pd.DataFrame):
+            h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+            h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        else:
+            h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+def _is_unchanged(entry: Optional[Dict[str, Any]], recipe: Dict[str, Any], content: str, outdir: str) -> bool:
+    """True if only the datastore changed since entry was built, and not in a way that affects its View."""
+    if not entry or entry.get("content") != content:
+        return False
+    old_recipe = dict(entry.get("recipe", {}), fingerprint=recipe["fingerprint"])
+    return _is_uptodate(dict(entry, recipe=old_recipe), recipe, outdir)
+
+
+def _export_csv(view: View, outdir: str) -> List[str]:
+    """Write every DataFrame member of view to <plot name>.<member>.csv. Returns the file names."""
+    import pandas as pd
+    stem = os.path.splitext(view.default_filename)[0] or view.name
+    rv = []
+    for f in dataclass_fields(view):
+        frame = getattr(view, f.name)
+        if not isinstance(frame, pd.DataFrame):
+            continue
+        filename = f"{stem}.{f.name}.csv"
+        frame.to_csv(os.path.join(outdir, filename), index=not isinstance(frame.index, pd.RangeIndex))
+        rv.append(filename)
+    return rv
+
+
+def _build_run(run: str, filename: str, names: List[str], output: str, force: bool, dry_run: bool, downsample: Optional[str]) -> _RunResult:
+    """
+    Bring the report of one run up to date: the plot and CSV exports of every View type in names,
+    in the output directory (relative to the run directory).
+
+    An output is a candidate for rebuilding when the datastore content, the tool version, the
+    extractor or the options changed since the manifest recorded it, when one of its files is
+    missing, or if force is set (a dry run lists the candidates). The datastore is only loaded
+    if there are candidates, and then they are extracted in a single pass. If only the datastore
+    changed, and the extracted View holds the same data as the one the outputs were made from
+    (the manifest records a hash of it), the outputs are kept: annotating a run only rebuilds
+    the Views that use what the annotation changed. View types that do not apply to the run
+    are recorded as such, so they are not retried until the datastore changes.
+
+    The manifest also records the sizes and modification times of the datastore files: the
+    datastore is only hashed again when they changed, so a run that is up to date costs a
+    few stat() calls.
+
+    Never raises, so it can be run in a worker process and have its outcome reported by the parent.
+    """
+    t0 = time.perf_counter()
+    outdir = os.path.join(os.path.dirname(filename), output)
+    result = _RunResult(run, True, "", 0.0)
+    try:
+        ds = DataStore(filename)
+        manifest = _read_manifest(outdir)
+        files = [list(st) for st in store_files(ds)]
+        files_changed = manifest.get("files") != files or not manifest.get("fingerprint")
+        if files_changed:
+            manifest["files"] = files
+            manifest["fingerprint"] = ds.fingerprint()
+        fingerprint = manifest["fingerprint"]
+        entries: Dict[str, Any] = manifest.get("outputs", {})
+        recipes = {name: _recipe(View._registry[name], fingerprint, downsample) for name in names}
+        stale = [name for name in names if force or not _is_uptodate(entries.get(name), recipes[name], outdir)]
+        result.uptodate = [name for name in names if name not in stale]
+        if dry_run or not stale:
+            if files_changed and entries and not dry_run:
+                _write_manifest(outdir, manifest)
+            result.built = stale
+            result.elapsed = time.perf_counter() - t0
+            return result
+        import matplotlib.pyplot as pyplot
+        from ..plots import PlotStyle, publish_plots
+        ds.load()
+        os.makedirs(outdir, exist_ok=True)
+        errors: Dict[str, Exception] = {}
+        views = extract_views(ds, stale, errors=errors)
+        failed = []
+        for name in stale:
+            if name in errors:
+                failed.append(f"{name}: {type(errors[name]).__name__}: {errors[name]}")
+                entries.pop(name, None)
+                continue
+            outputs: List[str] = []
+            view = views.get(name)
+            content = _content_hash(view)
+            if not force and _is_unchanged(entries.get(name), recipes[name], content, outdir):
+                entries[name]["recipe"] = recipes[name]
+                result.uptodate.append(name)
+                continue
+            if view is not None:
+                try:
+                    axes = view.render(style=PlotStyle(downsample=downsample))
+                    publish_plots(axes, showplot=False, saveplot=True, dirname=outdir, file_name=view.default_filename)
+                    outputs = [view.default_filename] + _export_csv(view, outdir)
+                except Exception as e:
+                    failed.append(f"{name}: {type(e).__name__}: {e}")
+                    entries.pop(name, None)
+                    continue
+                finally:
+                    pyplot.close('all')
+            entries[name] = {"recipe": recipes[name], "content": content, "outputs": outputs}
+            result.built.append(name)
+        manifest["outputs"] = entries
+        _write_manifest(outdir, manifest)
+        if failed:
+            result.ok = False
+            result.message = "; ".join(failed)
+    except Exception as e:
+        result.ok = False
+        result.message = f"{type(e).__name__}: {e}"
+    result.elapsed = time.perf_counter() - t0
+    return result
+
+
+def _report(result: _RunResult, dry_run: bool, prefix: str = "") -> None:
+    if result.built:
+        verb = "would build" if dry_run else "built"
+        status = f"{verb} {', '.join(result.built)}; {len(result.uptodate)} up to date"
+    else:
+        status = "up to date" if result.ok else "failed"
+    print(f"{prefix}{result.run}: {status} ({result.elapsed:.1f}s)")
+    if not result.ok:
+        print(f"{prefix}{result.run}: {result.message}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Bring the standard plots and CSV exports of many runs up to date, rebuilding only what changed"
+    )
+    parser.add_argument("--version", action=VersionAction)
+    parser.add_argument("--import", dest="imports", metavar="MODULE", action="append", default=[],
+                        help="Import MODULE before running (use to register external plot types)")
+    parser.add_argument("--type", metavar="TYPE", action="append",
+                        help="Plot type to produce (see VRTstatistics-plot --list-types). Repeat for multiple (default: all types that apply to each run)")
+    parser.add_argument("-o", "--output", metavar="DIR", default="report",
+                        help="Output directory, relative to each run directory (default: report)")
+    parser.add_argument("-f", "--filename", metavar="NAME", default="combined.json",
+                        help="DataStore file name inside run directories (default: combined.json)")
+    parser.add_argument("-j", "--jobs", metavar="N", type=int, default=0,
+                        help="Process up to N runs concurrently in separate processes (default: one per CPU)")
+    parser.add_argument("-B", "--always-make", dest="force", action="store_true",
+                        help="Rebuild all outputs, also those that are up to date")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="Only print what would be rebuilt")
+    parser.add_argument("--downsample", choices=["lttb", "minmax"], default=None,
+                        help="Thin out time series before rendering (see VRTstatistics-plot --downsample)")
+    parser.add_argument("runs", nargs="+", metavar="RUN",
+                        help="Run directories (or DataStore files, or glob patterns matching them)")
+    args = parser.parse_args()
+
+    _init_worker(args.imports)
+    names = list(dict.fromkeys(args.type)) if args.type and "all" not in args.type else sorted(View._registry)
+    for name in names:
+        if name not in View._registry:
+            parser.error(f"Unknown type {name!r}. Use VRTstatistics-plot --list-types to see available types.")
+    runs = DataStoreCollection(args.runs, filename=args.filename).runs
+    if not runs:
+        parser.error(f"No {args.filename} found in {' '.join(args.runs)}")
+
+    total = len(runs)
+    jobs = min(args.jobs or os.cpu_count() or 1, total)
+    t0 = time.perf_counter()
+    results: List[_RunResult] = []
+    job_args = [(run, filename, names, args.output, args.force, args.dry_run, args.downsample) for run, filename in runs.items()]
+    if jobs == 1:
+        for a in job_args:
+            results.append(_build_run(*a))
+            _report(results[-1], args.dry_run, f"[{len(results)}/{total}] ")
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(args.imports,)) as pool:
+            futures = [pool.submit(_build_run, *a) for a in job_args]
+            for future in as_completed(futures):
+                results.append(future.result())
+                _report(results[-1], args.dry_run, f"[{len(results)}/{total}] ")
+    failed = sum(1 for r in results if not r.ok)
+    rebuilt = sum(1 for r in results if r.ok and r.built)
+    uptodate = sum(1 for r in results if r.ok and not r.built)
+    verb = "need rebuilding" if args.dry_run else "rebuilt"
+    print(f"{total} runs: {rebuilt} {verb}, {uptodate} up to date, {failed} failed, with {jobs} workers in {time.perf_counter() - t0:.1f}s")
+    sys.exit(0 if failed == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
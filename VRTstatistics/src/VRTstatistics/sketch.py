@@ -0,0 +1,246 @@
+"""
+Mergeable quantile sketches for latency distributions.
+
+QuantileSketch is a DDSketch-style sketch: values are counted in logarithmically
+sized buckets, so every quantile it returns is within a fixed *relative* error
+of the exact quantile of the values added. Sketches with the same accuracy can be
+merged exactly (bucket counts add up), which makes it possible to pool latency
+distributions over many runs without keeping the raw data around.
+
+A sketch of a typical stage latency (1 ms .. 10 s at 1% accuracy) has a few
+hundred buckets and serializes (to_dict) to a few kilobytes of JSON.
+"""
+from __future__ import annotations
+import math
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+__all__ = ["QuantileSketch", "merge_sketches", "sketch_quantiles"]
+
+
+class _BucketStore:
+    """Dense counts for a contiguous range of integer bucket keys, starting at offset."""
+
+    def __init__(self, offset: int = 0, counts: Optional[np.ndarray] = None) -> None:
+        self.offset = offset
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+
+    def add_keys(self, keys: np.ndarray) -> None:
+        if len(keys) == 0:
+            return
+        self.add_counts(int(keys.min()), np.bincount(keys - keys.min()).astype(np.int64))
+
+    def add_counts(self, offset: int, counts: np.ndarray) -> None:
+        if len(counts) == 0:
+            return
+        if len(self.counts) == 0:
+            self.offset, self.counts = offset, counts.copy()
+            return
+        lo = min(self.offset, offset)
+        hi = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(hi - lo, dtype=np.int64)
+        merged[self.offset - lo:self.offset - lo + len(self.counts)] += self.counts
+        merged[offset - lo:offset - lo + len(counts)] += counts
+        self.offset, self.counts = lo, merged
+
+    def collapse_lowest(self, max_buckets: int) -> None:
+        """Fold the lowest buckets into one so at most max_buckets remain."""
+        excess = len(self.counts) - max_buckets
+        if excess <= 0:
+            return
+        folded = self.counts[:excess + 1].sum()
+        self.counts = self.counts[excess:].copy()
+        self.counts[0] = folded
+        self.offset += excess
+
+    def to_dict(self) -> Dict[str, Any]:
+        nonzero = np.flatnonzero(self.counts)
+        if len(nonzero) == 0:
+            return {"offset": 0, "counts": []}
+        first, last = nonzero[0], nonzero[-1]
+        return {"offset": self.offset + int(first), "counts": self.counts[first:last + 1].tolist()}
+
+    @classmethod
+    def from_dict(cls, d: Mapping[str, Any]) -> _BucketStore:
+        return cls(int(d["offset"]), np.asarray(d["counts"], dtype=np.int64))
+
+
+class QuantileSketch:
+    """
+    DDSketch-style quantile sketch with relative accuracy `relative_accuracy`.
+
+    add() takes a scalar or array of values (NaN is ignored), merge() combines
+    another sketch with the same accuracy in place, quantile() answers one or more
+    quantiles. Count, sum, min and max are tracked exactly. Negative values (e.g.
+    latencies skewed by clock desync) are supported through a mirrored bucket store.
+
+    Sketches are serialized with to_dict() / from_dict() to plain JSON-compatible
+    dicts, which is how the latency_sketch annotation stores them.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1, not {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # Values smaller than this (in absolute value) are counted as zero.
+        self._min_indexable = np.finfo(np.float64).tiny * self._gamma
+        self._positive = _BucketStore()
+        self._negative = _BucketStore()
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __repr__(self) -> str:
+        return f"QuantileSketch(relative_accuracy={self.relative_accuracy}, count={self.count})"
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    def _keys(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def add(self, values: Union[float, Iterable[float], np.ndarray]) -> QuantileSketch:
+        """Add a value or an array of values. NaN values are skipped. Returns self."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        positive = values[values >= self._min_indexable]
+        negative = -values[values <= -self._min_indexable]
+        self._positive.add_keys(self._keys(positive))
+        self._negative.add_keys(self._keys(negative))
+        self.zero_count += len(values) - len(positive) - len(negative)
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._collapse()
+        return self
+
+    def merge(self, other: QuantileSketch) -> QuantileSketch:
+        """Merge other into this sketch. Both must have the same relative accuracy. Returns self."""
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError(
+                f"cannot merge sketches with relative accuracy {other.relative_accuracy} and {self.relative_accuracy}"
+            )
+        self._positive.add_counts(other._positive.offset, other._positive.counts)
+        self._negative.add_counts(other._negative.offset, other._negative.counts)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._collapse()
+        return self
+
+    def _collapse(self) -> None:
+        # Losing accuracy on the smallest magnitudes keeps the size bounded; latency tails are kept exact(ish).
+        self._positive.collapse_lowest(self.max_buckets)
+        self._negative.collapse_lowest(self.max_buckets)
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """
+        Return the q-quantile (0 <= q <= 1), or an array of quantiles if q is a sequence.
+
+        The result is within relative_accuracy of the exact quantile (clamped to the
+        exact min/max). An empty sketch returns NaN.
+        """
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if np.any((qs < 0) | (qs > 1)):
+            raise ValueError(f"quantiles must be between 0 and 1, not {q}")
+        if self.count == 0:
+            rv = np.full(len(qs), np.nan)
+            return rv if np.ndim(q) else float(rv[0])
+        # Buckets in increasing value order: negative (largest magnitude first), zero, positive.
+        neg_keys = self._negative.offset + np.arange(len(self._negative.counts))
+        pos_keys = self._positive.offset + np.arange(len(self._positive.counts))
+        bucket_values = np.concatenate([
+            -self._value_array(neg_keys[::-1]),
+            [0.0],
+            self._value_array(pos_keys),
+        ])
+        bucket_counts = np.concatenate([
+            self._negative.counts[::-1],
+            [self.zero_count],
+            self._positive.counts,
+        ])
+        cumulative = np.cumsum(bucket_counts)
+        ranks = qs * (self.count - 1)
+        idx = np.searchsorted(cumulative, ranks, side="right")
+        rv = np.clip(bucket_values[np.minimum(idx, len(bucket_values) - 1)], self.min, self.max)
+        return rv if np.ndim(q) else float(rv[0])
+
+    def _value_array(self, keys: np.ndarray) -> np.ndarray:
+        # Midpoint (in the relative-error sense) of each bucket (gamma**(key-1), gamma**key].
+        return 2 * np.power(self._gamma, keys.astype(np.float64)) / (self._gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON-compatible representation (see from_dict)."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero_count": self.zero_count,
+            "positive": self._positive.to_dict(),
+            "negative": self._negative.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Mapping[str, Any]) -> QuantileSketch:
+        """Recreate a sketch from the output of to_dict()."""
+        sketch = cls(relative_accuracy=float(d["relative_accuracy"]), max_buckets=int(d.get("max_buckets", 2048)))
+        sketch._positive = _BucketStore.from_dict(d["positive"])
+        sketch._negative = _BucketStore.from_dict(d["negative"])
+        sketch.zero_count = int(d["zero_count"])
+        sketch.count = int(d["count"])
+        sketch.sum = float(d["sum"])
+        sketch.min = math.inf if d["min"] is None else float(d["min"])
+        sketch.max = -math.inf if d["max"] is None else float(d["max"])
+        return sketch
+
+
+def merge_sketches(sketches: Iterable[Union[QuantileSketch, Mapping[str, Any]]]) -> QuantileSketch:
+    """
+    Merge sketches (QuantileSketch objects or their to_dict() form) into a new sketch.
+
+    The inputs are not modified. Raises ValueError if there are no sketches or
+    their accuracies differ.
+    """
+    rv: Optional[QuantileSketch] = None
+    for sketch in sketches:
+        if not isinstance(sketch, QuantileSketch):
+            sketch = QuantileSketch.from_dict(sketch)
+        if rv is None:
+            rv = QuantileSketch(relative_accuracy=sketch.relative_accuracy, max_buckets=sketch.max_buckets)
+        rv.merge(sketch)
+    if rv is None:
+        raise ValueError("merge_sketches: no sketches to merge")
+    return rv
+
+
+def sketch_quantiles(sketches: Mapping[str, QuantileSketch], quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Any:
+    """
+    Return a pandas DataFrame with one row per named sketch and columns
+    count, mean, min, max and p50/p95/... for the given quantiles.
+    """
+    import pandas as pd
+    rows = []
+    for name, sketch in sketches.items():
+        row: Dict[str, Any] = {"name": name, "count": sketch.count, "mean": sketch.mean, "min": sketch.min, "max": sketch.max}
+        for q, v in zip(quantiles, np.atleast_1d(sketch.quantile(list(quantiles)))):
+            row[f"p{q * 100:g}"] = v
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("name") if rows else pd.DataFrame()
@@ -1,28 +1,83 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Callable, ClassVar, Dict, Optional, Type
-import pandas as pd
+import itertools
+from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
 
-from .datastore import DataStore
+from .datastore import DataStore, Query
+from .cache import ViewCache
 from .annotation import engine
-from .analyze import TileCombiner, SessionTimeFilter
+
+if TYPE_CHECKING:
+    # pandas and the analyze module are imported by the extractors when they run:
+    # listing the View types (VRTstatistics-plot --list-types) does not need them.
+    import pandas as pd
 
 __all__ = [
     "View",
+    "lazy_member",
+    "extract_views",
+    "extract_pages",
     "LatencyView",
     "LatencyPerTileView",
     "ResourceView",
     "FramerateView",
     "PointcountView",
     "ProgressView",
+    "LatencyPercentileView",
+    "LatencyHeatmapView",
     "extract_latencies",
     "extract_latencies_per_tile",
     "extract_resources",
     "extract_framerates",
     "extract_pointcounts",
     "extract_progress",
+    "extract_latency_percentiles",
+    "extract_latency_heatmap",
 ]
 
+# Cached in place of a View for View types that is_applicable() rejected.
+_NOT_APPLICABLE = "not applicable"
+
+
+class _Lazy:
+    def __repr__(self) -> str:
+        return "<lazy>"
+
+
+# Constructor default of lazy_member fields, replaced by the computed value on first access.
+_LAZY = _Lazy()
+
+
+class lazy_member:
+    """
+    An optional View member computed from the source DataStore on first access, and memoized.
+
+    Declare it as a dataclass field of a View subclass:
+
+        framedrops: Optional[pd.DataFrame] = lazy_member(_compute_framedrops)
+
+    compute(view, ds) returns the value; it is called at most once, with the DataStore the
+    extractor stored in view._source (without one the member is None). A value passed to
+    the constructor is used as is. A pickled View keeps the members computed so far, plus
+    the source DataStore if there are members left to compute; View.materialize() computes
+    them all first, so the View can be pickled without its source.
+    """
+
+    def __init__(self, compute: Callable[[Any, DataStore], Any]) -> None:
+        self.compute = compute
+        self.name = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj: Any, owner: Optional[type] = None) -> Any:
+        if obj is None:
+            return _LAZY  # The dataclass default
+        source = obj._source
+        value = self.compute(obj, source) if source is not None else None
+        obj.__dict__[self.name] = value  # Shadows this (non-data) descriptor from now on
+        return value
+
 
 @dataclass
 class View:
@@ -32,6 +87,35 @@ class View:
     default_filename: ClassVar[str] = ""
     required_annotation: ClassVar[Optional[str]] = None
     description: str
+    # Set by extractors with lazy members. Not a constructor argument, so subclass fields can still be positional.
+    _source: Optional[DataStore] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Lazy members not passed to the constructor: remove the placeholder so lazy_member.__get__ runs.
+        for name in [name for name, value in self.__dict__.items() if value is _LAZY]:
+            del self.__dict__[name]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Lazy members that were not computed are left out (and computed after unpickling),
+        # so the source is only needed while there are any.
+        state = dict(self.__dict__)
+        if not self._uncomputed():
+            state["_source"] = None
+        return state
+
+    def _uncomputed(self) -> List[str]:
+        """Names of the lazy members that have not been computed (or passed to the constructor)."""
+        return [f.name for f in fields(self) if f.name not in self.__dict__ and getattr(type(self), f.name, None) is _LAZY]
+
+    def materialize(self) -> View:
+        """
+        Compute all lazy members now and drop the reference to the source DataStore, so that
+        the View pickles without it (to a cache, or to another process). Returns self.
+        """
+        for name in self._uncomputed():
+            getattr(self, name)
+        self._source = None
+        return self
 
     def __init_subclass__(cls, **kwargs: Any) -> None:
         super().__init_subclass__(**kwargs)
@@ -39,9 +123,15 @@ class View:
             View._registry[cls.name] = cls
 
     @classmethod
-    def register_extractor(cls, extractor: Callable) -> None:
-        """Register a function as the extractor for this View type. Can be called again to override."""
+    def register_extractor(cls, extractor: Callable, version: Any = None) -> None:
+        """
+        Register a function as the extractor for this View type. Can be called again to override.
+
+        version is part of the ViewCache key: change it when the extractor output changes
+        in a way that its own bytecode does not show (for example through a helper function).
+        """
         cls._extractor = extractor
+        cls._extractor_version = version
 
     @classmethod
     def register_renderer(cls, renderer: Callable) -> None:
@@ -49,16 +139,63 @@ class View:
         cls._renderer = renderer
 
     @classmethod
-    def extract(cls, ds: DataStore, **kwargs: Any) -> View:
-        """Extract a View from a DataStore using the registered extractor."""
+    def register_queries(cls, queries: Callable[..., Union[List[Query], Dict[str, Query]]]) -> None:
+        """
+        Register a function returning the DataStore queries the extractor of this View type makes.
+
+        It is called with the same arguments as the extractor and returns the exact
+        (predicate, fields) pairs the extractor passes to ds.get_dataframe() (as a list, or
+        a dict of named queries), so that extract_views() can run the queries of several
+        View types in one scan. Queries that differ from what the extractor asks for are
+        harmless, they only cost an unused scan result.
+        """
+        cls._queries = queries
+
+    @classmethod
+    def queries(cls, ds: DataStore, **kwargs: Any) -> List[Query]:
+        """Return the DataStore queries of the registered extractor (empty if none were registered)."""
+        queries = getattr(cls, '_queries', None)
+        if queries is None:
+            return []
+        rv = queries(ds, **kwargs)
+        return list(rv.values()) if isinstance(rv, dict) else list(rv)
+
+    @classmethod
+    def is_applicable(cls, ds: DataStore) -> bool:
+        """Return True if this View type can be extracted from ds (after its required_annotation has been applied)."""
+        return True
+
+    @classmethod
+    def extract(cls, ds: DataStore, *, cache: Union[None, bool, ViewCache] = None, **kwargs: Any) -> View:
+        """
+        Extract a View from a DataStore using the registered extractor.
+
+        With cache (True for the default ViewCache next to the datastore file) the View is
+        looked up in the cache first and stored there after extraction. ds may then be
+        passed unloaded: it is only loaded on a cache miss.
+        """
         extractor = getattr(cls, '_extractor', None)
         if extractor is None:
             raise NotImplementedError(f"No extractor registered for {cls.__name__}")
-        return extractor(ds, **kwargs)
+        if not cache:
+            return extractor(ds, **kwargs)
+        if cache is True:
+            cache = ViewCache.for_datastore(ds)
+        key = cache.key(cls, ds, kwargs)
+        view = cache.get(key)
+        # Anything else (such as the marker extract_views() stores for inapplicable View types) is a miss
+        if not isinstance(view, cls):
+            _ensure_loaded(ds)
+            view = extractor(ds, **kwargs)
+            cache.put(key, view.materialize())
+        return view
 
     def render(self, **kwargs: Any) -> list:
         """Render this View using the registered renderer."""
         renderer = getattr(type(self), '_renderer', None)
+        if renderer is None and type(self).__module__ == __name__:
+            from . import plots  # Registers the standard renderers (and imports matplotlib)
+            renderer = getattr(type(self), '_renderer', None)
         if renderer is None:
             raise NotImplementedError(f"No renderer registered for {type(self).__name__}")
         return renderer(self, **kwargs)
@@ -72,8 +209,10 @@ class LatencyView(View):
     required_annotation: ClassVar[str] = "latency"
     area: pd.DataFrame
     end2end: pd.DataFrame
-    framedrops: Optional[pd.DataFrame] = None
-    tileswitches: Optional[pd.DataFrame] = None
+    framedrops: Optional[pd.DataFrame] = lazy_member(lambda view, ds: _framedrops(ds) if view.show_framedrops else None)
+    tileswitches: Optional[pd.DataFrame] = lazy_member(lambda view, ds: _tileswitches(ds) if view.show_tileswitches else None)
+    show_framedrops: bool = field(default=False, kw_only=True)
+    show_tileswitches: bool = field(default=False, kw_only=True)
 
 
 @dataclass
@@ -87,6 +226,10 @@ class LatencyPerTileView(View):
     sender: str
     receiver: str
 
+    @classmethod
+    def is_applicable(cls, ds: DataStore) -> bool:
+        return ds.applied_annotations.get("latency", {}).get("nTiles", 1) > 1
+
 
 @dataclass
 class ResourceView(View):
@@ -124,9 +267,86 @@ class ProgressView(View):
     progress: pd.DataFrame
 
 
+@dataclass
+class LatencyPercentileView(View):
+    """Windowed latency percentiles (and count/mean/std) per pipeline stage."""
+    name: ClassVar[str] = "latency-percentiles"
+    default_filename: ClassVar[str] = "latency-percentiles.pdf"
+    required_annotation: ClassVar[str] = "latency"
+    statistics: pd.DataFrame
+    stages: List[str]
+    window: float
+    quantiles: List[float]
+
+
+@dataclass
+class LatencyHeatmapView(View):
+    """Latency distribution over time per pipeline stage, as 2D histograms."""
+    name: ClassVar[str] = "latency-heatmap"
+    default_filename: ClassVar[str] = "latency-heatmap.pdf"
+    required_annotation: ClassVar[str] = "latency"
+    heatmaps: Dict[str, pd.DataFrame]  # stage → counts, index sessiontime bucket, columns latency bucket
+
+
+def _latency_queries(ds: DataStore, *, show_framedrops: bool = False, show_tileswitches: bool = False) -> Dict[str, Query]:
+    """The DataStore queries of extract_latencies (framedrops and tileswitches are lazy members that query when used)."""
+    engine.ensure(ds, "latency")
+    sender = ds.applied_annotations["latency"]["sender"]
+    receiver = ds.applied_annotations["latency"]["receiver"]
+    queries: Dict[str, Query] = {
+        "area": (
+            f'"{sender}.pc.grabber" in component_role or "{sender}.pc.encoder" in component_role or "{receiver}.pc.decoder" in component_role or "{receiver}.pc.renderer" in component_role or component_role == "{receiver}.voice.renderer"',
+            [
+                'sessiontime',
+                'component_role.=encoder_queue_ms',
+                'component_role.=encoder_ms',
+                'component_role.=transmitter_queue_ms',
+                'component_role.=decoder_queue_ms',
+                'component_role.=decoder_ms',
+                'component_role.=renderer_queue_ms',
+            ]
+        ),
+        "end2end": (
+            f'"{receiver}.pc.renderer" in component_role or "{receiver}.synchronizer" in component_role or component_role == "{receiver}.voice.renderer"',
+            [
+                'sessiontime',
+                'component_role.=latency_ms',
+                'component_role.=latency_max_ms',
+            ]
+        ),
+    }
+    # framedrops and tileswitches are lazy members, queried when a renderer asks for them.
+    return queries
+
+
+def _framedrops(ds: DataStore) -> Optional[pd.DataFrame]:
+    """Frame drop events (fps_dropped > 0) of all components, for LatencyView.framedrops."""
+    framedrops_df = ds.get_dataframe(
+        predicate='"fps_dropped" in record and fps_dropped > 0',
+        fields=['component', 'sessiontime', 'fps_dropped']
+    )
+    if framedrops_df.shape[0] == 0:
+        return None
+    framedrops_df = framedrops_df.assign(fps_dropped=1)
+    return framedrops_df.rename(columns={'fps_dropped': 'PC Drop event'})
+
+
+def _tileswitches(ds: DataStore) -> Optional[pd.DataFrame]:
+    """Tile selection events of the receiver tile selector, for LatencyView.tileswitches."""
+    tileswitches_df = ds.get_dataframe(
+        predicate='"component_role" in record and component_role == "receiver.pc.tileselector" and "tile0" in record',
+        fields=['sessiontime', 'component']
+    )
+    if tileswitches_df.shape[0] == 0:
+        return None
+    tileswitches_df = tileswitches_df.assign(tile_switch=0)
+    return tileswitches_df.rename(columns={'tile_switch': 'Tile switch event'})
+
+
 def extract_latencies(ds: DataStore, *, show_framedrops: bool = False, show_tileswitches: bool = False) -> LatencyView:
     """Extract latency contribution data from a DataStore."""
-    engine.ensure(ds, "latency")
+    from .analyze import TileCombiner
+    queries = _latency_queries(ds)
     sender = ds.applied_annotations["latency"]["sender"]
     receiver = ds.applied_annotations["latency"]["receiver"]
 
@@ -138,19 +358,7 @@ def extract_latencies(ds: DataStore, *, show_framedrops: bool = False, show_tile
         TileCombiner(f"{receiver}.pc.decoder.*.decoder_ms", "decoders", "max", combined=True) +
         TileCombiner(f"{receiver}.pc.renderer.*.renderer_queue_ms", "renderer queues", "mean", combined=True)
     )
-    area = ds.get_dataframe(
-        predicate=f'"{sender}.pc.grabber" in component_role or "{sender}.pc.encoder" in component_role or "{receiver}.pc.decoder" in component_role or "{receiver}.pc.renderer" in component_role or component_role == "{receiver}.voice.renderer"',
-        fields=[
-            'sessiontime',
-            'component_role.=encoder_queue_ms',
-            'component_role.=encoder_ms',
-            'component_role.=transmitter_queue_ms',
-            'component_role.=decoder_queue_ms',
-            'component_role.=decoder_ms',
-            'component_role.=renderer_queue_ms',
-        ]
-    )
-    area = area_filter(area)
+    area = area_filter.query(ds, *queries["area"])
 
     end2end_filter = (
         TileCombiner(f"{receiver}.synchronizer.latency_ms", "synchronizer latency", "max", combined=True) +
@@ -158,68 +366,55 @@ def extract_latencies(ds: DataStore, *, show_framedrops: bool = False, show_tile
         TileCombiner(f"{receiver}.pc.renderer.*.latency_max_ms", "max renderer latency", "max", combined=True) +
         TileCombiner(f"{receiver}.voice.renderer.latency_ms", "voice latency", "mean", combined=True, optional=True)
     )
-    end2end = ds.get_dataframe(
-        predicate=f'"{receiver}.pc.renderer" in component_role or "{receiver}.synchronizer" in component_role or component_role == "{receiver}.voice.renderer"',
-        fields=[
-            'sessiontime',
-            'component_role.=latency_ms',
-            'component_role.=latency_max_ms',
-        ]
-    )
-    end2end = end2end_filter(end2end)
-
-    framedrops: Optional[pd.DataFrame] = None
-    if show_framedrops:
-        framedrops_df = ds.get_dataframe(fields=['component', 'sessiontime', 'fps_dropped'])
-        framedrops_df = framedrops_df[framedrops_df['fps_dropped'] > 0].copy()
-        if framedrops_df.shape[0] > 0:
-            framedrops_df.loc[:, 'fps_dropped'] = 1
-            framedrops_df.rename(columns={'fps_dropped': 'PC Drop event'}, inplace=True)
-            framedrops = framedrops_df
-
-    tileswitches: Optional[pd.DataFrame] = None
-    if show_tileswitches:
-        tileswitches_df = ds.get_dataframe(
-            predicate='"component_role" in record and component_role == "receiver.pc.tileselector" and "tile0" in record',
-            fields=['sessiontime', 'component']
-        )
-        if tileswitches_df.shape[0] > 0:
-            tileswitches_df = tileswitches_df.assign(tile_switch=0)
-            tileswitches_df.rename(columns={'tile_switch': 'Tile switch event'}, inplace=True)
-            tileswitches = tileswitches_df
-
-    return LatencyView(
+    end2end = end2end_filter.query(ds, *queries["end2end"])
+
+    view = LatencyView(
         description=ds.describe(),
         area=area,
         end2end=end2end,
-        framedrops=framedrops,
-        tileswitches=tileswitches,
+        # Overlays that are not shown are None, the others are computed when first used
+        framedrops=_LAZY if show_framedrops else None,
+        tileswitches=_LAZY if show_tileswitches else None,
+        show_framedrops=show_framedrops,
+        show_tileswitches=show_tileswitches,
     )
+    if show_framedrops or show_tileswitches:
+        view._source = ds
+    return view
+
+
+def _latency_per_tile_queries(ds: DataStore) -> Dict[str, Query]:
+    """The DataStore queries of extract_latencies_per_tile."""
+    engine.ensure(ds, "latency")
+    receiver = ds.applied_annotations["latency"]["receiver"]
+    return {
+        "per_tile": (
+            f'".pc." in component_role or component_role == "{receiver}.voice.renderer" or component_role == "{receiver}.synchronizer"',
+            [
+                'sessiontime',
+                'component_role.=downsample_ms',
+                'component_role.=encoder_queue_ms',
+                'component_role.=encoder_ms',
+                'component_role.=transmitter_queue_ms',
+                'component_role.=receive_ms',
+                'component_role.=decoder_queue_ms',
+                'component_role.=decoder_ms',
+                'component_role.=renderer_queue_ms',
+                'component_role.=latency_ms',
+                'component_role.=latency_max_ms',
+            ]
+        ),
+    }
 
 
 def extract_latencies_per_tile(ds: DataStore) -> LatencyPerTileView:
     """Extract per-tile latency data from a DataStore. Requires nTiles > 1."""
-    engine.ensure(ds, "latency")
+    queries = _latency_per_tile_queries(ds)
     sender = ds.applied_annotations["latency"]["sender"]
     receiver = ds.applied_annotations["latency"]["receiver"]
     nTiles = ds.applied_annotations["latency"].get("nTiles", 1)
     assert nTiles > 1
-    per_tile = ds.get_dataframe(
-        predicate=f'".pc." in component_role or component_role == "{receiver}.voice.renderer" or component_role == "{receiver}.synchronizer"',
-        fields=[
-            'sessiontime',
-            'component_role.=downsample_ms',
-            'component_role.=encoder_queue_ms',
-            'component_role.=encoder_ms',
-            'component_role.=transmitter_queue_ms',
-            'component_role.=receive_ms',
-            'component_role.=decoder_queue_ms',
-            'component_role.=decoder_ms',
-            'component_role.=renderer_queue_ms',
-            'component_role.=latency_ms',
-            'component_role.=latency_max_ms',
-        ]
-    )
+    per_tile = ds.get_dataframe(*queries["per_tile"])
     return LatencyPerTileView(
         description=ds.describe(),
         per_tile=per_tile,
@@ -229,22 +424,39 @@ def extract_latencies_per_tile(ds: DataStore) -> LatencyPerTileView:
     )
 
 
+def _resource_queries(ds: DataStore) -> Dict[str, Query]:
+    """The DataStore queries of extract_resources."""
+    from .analyze import SessionTimeFilter
+    return {
+        "resources": SessionTimeFilter().query_args(
+            predicate='component == "ResourceConsumption"',
+            fields=['sessiontime', 'role.=cpu', 'role.=mem', 'role.=recv_bandwidth', 'role.=sent_bandwidth']
+        ),
+    }
+
+
 def extract_resources(ds: DataStore) -> ResourceView:
     """Extract resource usage data (CPU, memory, bandwidth) from a DataStore."""
-    dataFilter = SessionTimeFilter()
-    resources = ds.get_dataframe(
-        predicate='component == "ResourceConsumption"',
-        fields=['sessiontime', 'role.=cpu', 'role.=mem', 'role.=recv_bandwidth', 'role.=sent_bandwidth']
-    )
-    resources = dataFilter(resources)
+    # The SessionTimeFilter is pushed down into the query predicate.
+    resources = ds.get_dataframe(*_resource_queries(ds)["resources"])
     return ResourceView(description=ds.describe(), resources=resources)
 
 
+def _framerate_queries(ds: DataStore) -> Dict[str, Query]:
+    """The DataStore queries of extract_framerates."""
+    return {
+        "fps": ('component_role and "fps" in record', ['sessiontime', 'component_role.=fps']),
+        "fps_dropped": ('component_role and "fps_dropped" in record', ['sessiontime', 'component_role.=fps_dropped']),
+    }
+
+
 def extract_framerates(ds: DataStore) -> FramerateView:
     """Extract framerate data (fps and dropped frames per pipeline stage) from a DataStore."""
+    from .analyze import TileCombiner
     engine.ensure(ds, "latency")
     sender = ds.applied_annotations["latency"]["sender"]
     receiver = ds.applied_annotations["latency"]["receiver"]
+    queries = _framerate_queries(ds)
 
     fps_filter = (
         TileCombiner(f"{sender}.voice.grabber.fps", "voice capturer", "min", combined=True, optional=True) +
@@ -261,11 +473,7 @@ def extract_framerates(ds: DataStore) -> FramerateView:
         TileCombiner(f"{receiver}.pc.preparer.*.fps", "preparers", "min", combined=True) +
         TileCombiner(f"{receiver}.pc.renderer.*.fps", "renderers", "min", combined=True)
     )
-    fps = ds.get_dataframe(
-        predicate='component_role and "fps" in record',
-        fields=['sessiontime', 'component_role.=fps']
-    )
-    fps = fps_filter(fps)
+    fps = fps_filter.query(ds, *queries["fps"])
 
     fps_dropped_filter = (
         TileCombiner(f"{sender}.voice.grabber.fps_dropped", "voice capturer dropped", "min", combined=True, optional=True) +
@@ -278,55 +486,239 @@ def extract_framerates(ds: DataStore) -> FramerateView:
         TileCombiner(f"{receiver}.pc.decoder.*.fps_dropped", "decoders dropped", "sum", combined=True) +
         TileCombiner(f"{receiver}.pc.preparer.*.fps_dropped", "preparers dropped", "sum", combined=True)
     )
-    fps_dropped = ds.get_dataframe(
-        predicate='component_role and "fps_dropped" in record',
-        fields=['sessiontime', 'component_role.=fps_dropped']
-    )
-    fps_dropped = fps_dropped_filter(fps_dropped)
+    fps_dropped = fps_dropped_filter.query(ds, *queries["fps_dropped"])
 
     return FramerateView(description=ds.describe(), fps=fps, fps_dropped=fps_dropped)
 
 
+def _pointcount_queries(ds: DataStore) -> Dict[str, Query]:
+    """The DataStore queries of extract_pointcounts."""
+    engine.ensure(ds, "latency")
+    receiver = ds.applied_annotations["latency"]["receiver"]
+    return {
+        "pointcounts": (f'"{receiver}.pc.renderer" in component_role', ['sessiontime', 'component_role.=points_per_cloud']),
+    }
+
+
 def extract_pointcounts(ds: DataStore) -> PointcountView:
     """Extract receiver point count data from a DataStore."""
-    engine.ensure(ds, "latency")
+    from .analyze import TileCombiner
+    queries = _pointcount_queries(ds)
     receiver = ds.applied_annotations["latency"]["receiver"]
     dataFilter = TileCombiner(f"{receiver}.pc.renderer.*.points_per_cloud", "points per cloud", "sum", combined=True, keep=True)
-    pointcounts = ds.get_dataframe(
-        predicate=f'"{receiver}.pc.renderer" in component_role',
-        fields=['sessiontime', 'component_role.=points_per_cloud']
-    )
-    pointcounts = dataFilter(pointcounts)
+    pointcounts = dataFilter.query(ds, *queries["pointcounts"])
     return PointcountView(description=ds.describe(), pointcounts=pointcounts)
 
 
+def _progress_queries(ds: DataStore) -> Dict[str, Query]:
+    """The DataStore queries of extract_progress."""
+    return {
+        "progress": ('"aggregate_packets" in record and component_role', ['sessiontime', 'component_role=aggregate_packets']),
+    }
+
+
 def extract_progress(ds: DataStore) -> ProgressView:
     """Extract point cloud pipeline progress data from a DataStore."""
+    from .analyze import normalize_progress
     engine.ensure(ds, "latency")
     sender = ds.applied_annotations["latency"]["sender"]
     nTiles = ds.applied_annotations["latency"].get("nTiles", 1)
     nQualities = ds.applied_annotations["latency"].get("nQualities", 1)
 
-    df = ds.get_dataframe(
-        predicate='"aggregate_packets" in record and component_role',
-        fields=['sessiontime', 'component_role=aggregate_packets']
-    )
+    df = ds.get_dataframe(*_progress_queries(ds)["progress"])
     grabber_col = f'{sender}.pc.grabber'
     if grabber_col in df.columns:
         df = df.drop(columns=[grabber_col])
-    if nTiles > 1:
-        df = df.copy()
-        for col in df.columns:
-            if col == 'sessiontime':
-                continue
-            if '.all' in col:
-                df[col] = df[col] / nTiles
-            elif col == f"{sender}.pc.encoder":
-                df[col] = df[col] / (nTiles * nQualities)
+    df = normalize_progress(df, sender=sender, nTiles=nTiles, nQualities=nQualities)
 
     return ProgressView(description=ds.describe(), progress=df)
 
 
+def _stage_latency_queries(ds: DataStore, **kwargs: Any) -> Dict[str, Query]:
+    """The DataStore query of _stage_latencies (extract_latency_percentiles and extract_latency_heatmap)."""
+    from .analyze import STAGE_LATENCY_FIELDS
+    engine.ensure(ds, "latency")
+    sender = ds.applied_annotations["latency"]["sender"]
+    receiver = ds.applied_annotations["latency"]["receiver"]
+    return {
+        "stages": (
+            f'component_role.startswith(("{sender}.", "{receiver}.")) and (' + ' or '.join(f'"{f}" in record' for f in STAGE_LATENCY_FIELDS) + ')',
+            ['sessiontime'] + [f'component_role.={f}' for f in STAGE_LATENCY_FIELDS]
+        ),
+    }
+
+
+def _stage_latencies(ds: DataStore) -> pd.DataFrame:
+    """Return sessiontime plus one {component_role}.{field} column per stage latency field of the sender and receiver."""
+    return ds.get_dataframe(*_stage_latency_queries(ds)["stages"])
+
+
+def extract_latency_percentiles(ds: DataStore, *, window: float = 10.0, step: Optional[float] = None, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> LatencyPercentileView:
+    """
+    Extract windowed latency statistics per pipeline stage from a DataStore.
+
+    Every stage duration and latency field (encoder_ms, decoder_queue_ms, latency_ms, ...) of
+    every component_role of the sender and receiver is one stage. See windowed_statistics for
+    the meaning of window and step.
+    """
+    from .analyze import windowed_statistics
+    df = _stage_latencies(ds)
+    stages = [c for c in df.columns if c != 'sessiontime']
+    statistics = windowed_statistics(df, stages, window=window, step=step, quantiles=quantiles)
+    return LatencyPercentileView(
+        description=ds.describe(),
+        statistics=statistics,
+        stages=stages,
+        window=window,
+        quantiles=list(quantiles),
+    )
+
+
+def extract_latency_heatmap(ds: DataStore, *, time_bins: int = 200, latency_bins: int = 100, latency_max: Optional[float] = None) -> LatencyHeatmapView:
+    """
+    Extract (session time bucket × latency bucket) counts per pipeline stage from a DataStore.
+
+    Stages are the same as for extract_latency_percentiles. See histogram2d_over_time for the
+    binning; latency_max (ms) fixes the top of the latency axis for all stages.
+    """
+    from .analyze import histogram2d_over_time
+    df = _stage_latencies(ds)
+    stages = [c for c in df.columns if c != 'sessiontime']
+    heatmaps = histogram2d_over_time(df, stages, time_bins=time_bins, value_bins=latency_bins, value_max=latency_max)
+    return LatencyHeatmapView(
+        description=ds.describe(),
+        heatmaps=heatmaps,
+    )
+
+
+def _ensure_loaded(ds: DataStore) -> None:
+    """Load ds if it was created but never loaded (extraction with a cache defers loading)."""
+    if ds.filename and not ds.data and not ds.session_metadata:
+        ds.load()
+
+
+def extract_views(
+        ds: DataStore,
+        views: Iterable[Union[str, Type[View]]],
+        *,
+        options: Optional[Dict[str, Dict[str, Any]]] = None,
+        errors: Optional[Dict[str, Exception]] = None,
+        cache: Union[None, bool, ViewCache] = None
+) -> Dict[str, View]:
+    """
+    Extract several View types from a DataStore with a single scan over its records.
+
+    views are View classes or registered View type names. The required annotations are
+    applied first, View types that are not applicable to ds (see View.is_applicable) are
+    skipped, then the registered queries of all View types are run at once with
+    ds.prefetch() and every extractor gets its DataFrames from the prefetched results.
+
+    options maps View type names to extra extractor arguments. If errors is given, View
+    types whose extraction fails are recorded there (name → exception) and skipped instead
+    of raising. cache is used as for View.extract(): only the View types not found in the
+    cache are extracted (and ds is only loaded if there are any).
+
+    Returns the extracted Views by View type name, in the order given.
+    """
+    options = options or {}
+    classes = [View._registry[view] if isinstance(view, str) else view for view in views]
+    if cache is True:
+        cache = ViewCache.for_datastore(ds)
+    cached: Dict[str, Any] = {}
+    keys: Dict[str, str] = {}
+    if cache:
+        for view_cls in classes:
+            keys[view_cls.name] = cache.key(view_cls, ds, options.get(view_cls.name, {}))
+            view = cache.get(keys[view_cls.name])
+            if isinstance(view, view_cls) or view == _NOT_APPLICABLE:
+                cached[view_cls.name] = view
+    todo: List[Type[View]] = []
+    for view_cls in classes:
+        if view_cls.name in cached:
+            continue
+        _ensure_loaded(ds)
+        if view_cls.required_annotation:
+            engine.ensure(ds, view_cls.required_annotation)
+        if view_cls.is_applicable(ds):
+            todo.append(view_cls)
+        elif cache:
+            cache.put(keys[view_cls.name], _NOT_APPLICABLE)
+    queries = [q for view_cls in todo for q in view_cls.queries(ds, **options.get(view_cls.name, {}))]
+    with ds.prefetch(queries):
+        for view_cls in todo:
+            try:
+                cached[view_cls.name] = view_cls.extract(ds, **options.get(view_cls.name, {}))
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[view_cls.name] = e
+                continue
+            if cache:
+                cache.put(keys[view_cls.name], cached[view_cls.name].materialize())
+    return {
+        view_cls.name: cached[view_cls.name]
+        for view_cls in classes
+        if isinstance(cached.get(view_cls.name), View)
+    }
+
+
+def extract_pages(
+        ds: DataStore,
+        views: Iterable[Union[str, Type[View]]],
+        page_duration: float,
+        *,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        options: Optional[Dict[str, Dict[str, Any]]] = None,
+        errors: Optional[Dict[str, Exception]] = None
+) -> Iterator[Tuple[float, float, Dict[str, View]]]:
+    """
+    Extract several View types per page_duration seconds of session time, one window at a time.
+
+    The windows [t, t + page_duration) run from start (default: the multiple of
+    page_duration at or before the first sessiontime) to end (default: the last
+    sessiontime), and are taken with DataStore.iter_time_slices(). Windows without
+    records are skipped. The View types are extracted from every window with
+    extract_views(). Yields (window start, window end, Views by View type name) per
+    window, so only one window's Views need to be held at a time.
+
+    If ds has not been loaded and its file already has the required annotations, the
+    records are streamed from the file and only one window's records are in memory at a
+    time. Otherwise (ds loaded, or annotations still to be applied, which needs all
+    records) the whole store is loaded and annotated first.
+
+    options and errors are as for extract_views(); errors are keyed by View type name and
+    window start, as "name@start".
+    """
+    if page_duration <= 0:
+        raise ValueError(f"extract_pages: page_duration must be positive, not {page_duration}")
+    classes = [View._registry[view] if isinstance(view, str) else view for view in views]
+    required = [view_cls.required_annotation for view_cls in classes if view_cls.required_annotation]
+    windows: Optional[Iterator[DataStore]] = None
+    if ds.filename and ds.filename.endswith(".json") and not ds.data and not ds.session_metadata:
+        # Not loaded: stream it. The file header with the annotations is read with the first window.
+        streamed = ds.iter_time_slices(page_duration, start, end)
+        first = next(streamed, None)
+        if all(name in ds.applied_annotations for name in required):
+            windows = itertools.chain([first] if first else [], streamed)
+        else:
+            streamed.close()
+            ds.load()
+    if windows is None:
+        for name in required:
+            engine.ensure(ds, name)
+        windows = ds.iter_time_slices(page_duration, start, end)
+    for window in windows:
+        assert window.time_window
+        t0, t1 = window.time_window
+        window_errors: Dict[str, Exception] = {}
+        found = extract_views(window, classes, options=options, errors=None if errors is None else window_errors)
+        if errors is not None:
+            for name, e in window_errors.items():
+                errors[f"{name}@{t0:g}"] = e
+        yield t0, t1, found
+
+
 # ── Register extractors ────────────────────────────────────────────────────────
 
 LatencyView.register_extractor(extract_latencies)
@@ -335,3 +727,14 @@ ResourceView.register_extractor(extract_resources)
 FramerateView.register_extractor(extract_framerates)
 PointcountView.register_extractor(extract_pointcounts)
 ProgressView.register_extractor(extract_progress)
+LatencyPercentileView.register_extractor(extract_latency_percentiles)
+LatencyHeatmapView.register_extractor(extract_latency_heatmap)
+
+LatencyView.register_queries(_latency_queries)
+LatencyPerTileView.register_queries(_latency_per_tile_queries)
+ResourceView.register_queries(_resource_queries)
+FramerateView.register_queries(_framerate_queries)
+PointcountView.register_queries(_pointcount_queries)
+ProgressView.register_queries(_progress_queries)
+LatencyPercentileView.register_queries(_stage_latency_queries)
+LatencyHeatmapView.register_queries(_stage_latency_queries)
@@ -0,0 +1,433 @@
+import math
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from VRTstatistics.analyze import DataFrameFilter, SessionTimeFilter, TileCombiner, dataframe_to_frame_latencies, dataframe_to_pcindex, downsample_dataframe, histogram2d_over_time, windowed_statistics
+from VRTstatistics.datastore import DataStore, DataStoreError
+
+# Progress reports: column name → [(sessiontime, aggregate_packets)], in time order.
+type Reports = Dict[str, List[Tuple[float, float]]]
+
+
+def _random_reports(columns: List[str], seed: int, n: int = 200) -> Reports:
+    """Every column reports a non-decreasing sequence number at random times, sometimes repeating it."""
+    rnd = random.Random(seed)
+    reports: Reports = {}
+    for column in columns:
+        t = rnd.random()
+        seq = rnd.randint(0, 2)
+        reports[column] = []
+        for _ in range(n):
+            reports[column].append((round(t, 3), seq))
+            t += rnd.random() * 0.1
+            seq += rnd.choice([0, 1, 1, 2, 3])
+    return reports
+
+
+def _progress(reports: Reports) -> pd.DataFrame:
+    """A progress dataframe like ProgressView's: one row per report, NaN in the other columns."""
+    rows = [{"sessiontime": t, column: seq} for column, values in reports.items() for t, seq in values]
+    rows.sort(key=lambda row: row["sessiontime"])
+    return pd.DataFrame(rows, columns=["sessiontime", *reports])
+
+
+def _first_reports(values: List[Tuple[float, float]]) -> Dict[int, float]:
+    """pc_index → first time it was reported (pc_index 0 is not a point cloud)."""
+    rv: Dict[int, float] = {}
+    for t, seq in values:
+        if seq > 0 and (seq not in rv or t < rv[seq]):
+            rv[int(seq)] = t
+    return rv
+
+
+def test_frame_latencies_match_brute_force():
+    tiles = ["0", "1"]
+    columns = [f"sender.pc.writer.{tile}" for tile in tiles]
+    columns += [f"receiver.pc.{stage}.{tile}" for stage in ("reader", "decoder") for tile in tiles]
+    columns += ["receiver.pc.renderer.all"]
+    reports = _random_reports(columns, seed=3)
+    rv = dataframe_to_frame_latencies(_progress(reports))
+
+    expected = []
+    for tile in tiles:
+        for pc_index, writer_time in sorted(_first_reports(reports[f"sender.pc.writer.{tile}"]).items()):
+            row = {"tile": tile, "pc_index": pc_index, "writer.sessiontime": writer_time}
+            for stage in ("reader", "decoder", "renderer"):
+                column = f"receiver.pc.{stage}.{tile}" if stage != "renderer" else "receiver.pc.renderer.all"
+                first = _first_reports(reports[column])
+                # The first report where the stage had reached at least this point cloud
+                reached = [seq for seq in first if seq >= pc_index]
+                time = first[min(reached)] if reached else math.nan
+                row[f"{stage}.sessiontime"] = time
+                row[f"{stage}.latency_ms"] = (time - writer_time) * 1000
+            expected.append(row)
+    expected_df = pd.DataFrame(expected)
+
+    assert len(rv) == len(expected_df)
+    assert rv["tile"].tolist() == expected_df["tile"].tolist()
+    assert rv["pc_index"].tolist() == expected_df["pc_index"].tolist()
+    for column in expected_df.columns[2:]:
+        np.testing.assert_allclose(rv[column].to_numpy(float), expected_df[column].to_numpy(float), equal_nan=True, err_msg=column)
+
+
+def test_pcindex_matches_brute_force():
+    tiles = ["0", "1", "2"]
+    stages = [("sender", "writer"), ("receiver", "reader"), ("receiver", "decoder"), ("receiver", "preparer")]
+    columns = [f"{role}.pc.{stage}.{tile}" for role, stage in stages for tile in tiles]
+    # Umbrella columns are not per tile and must not show up
+    columns += ["receiver.pc.reader.all"]
+    reports = _random_reports(columns, seed=5)
+    rv = dataframe_to_pcindex(_progress(reports), include_sender=True)
+
+    expected = {}
+    for tile in tiles:
+        first = {stage: _first_reports(reports[f"{role}.pc.{stage}.{tile}"]) for role, stage in stages}
+        for pc_index, writer_time in first["writer"].items():
+            expected[(int(tile), pc_index)] = [writer_time] + [first[stage].get(pc_index, math.nan) for _, stage in stages[1:]]
+
+    assert list(rv.columns) == [f"{role}.pc.{stage}.sessiontime" for role, stage in stages]
+    assert list(rv.index) == sorted(expected)
+    np.testing.assert_allclose(rv.to_numpy(float), np.array([expected[key] for key in sorted(expected)]), equal_nan=True)
+
+
+def _latency_frame(seed: int) -> pd.DataFrame:
+    """Two latency columns at random times over 60 s, with missing values and a quiet stretch."""
+    rnd = random.Random(seed)
+    times = sorted(rnd.uniform(0, 60) for _ in range(300))
+    times = [t for t in times if not 31 < t < 44]
+    return pd.DataFrame({
+        "sessiontime": times,
+        "a": [rnd.gauss(50, 10) if rnd.random() > 0.2 else math.nan for _ in times],
+        "b": [rnd.expovariate(0.1) if rnd.random() > 0.5 else math.nan for _ in times],
+    })
+
+
+def _window_stats(values: List[float], quantiles: List[float]) -> List[float]:
+    values = [v for v in values if not math.isnan(v)]
+    count = len(values)
+    mean = sum(values) / count if count else math.nan
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / (count - 1)) if count > 1 else math.nan
+    return [count, mean, std] + [float(np.quantile(values, q)) if count else math.nan for q in quantiles]
+
+
+def _check_windows(rv: pd.DataFrame, expected: Dict[float, Dict[str, List[float]]]) -> None:
+    """Compare with the expected [count, mean, std, p50, p95] per window end and column."""
+    assert rv["sessiontime"].tolist() == pytest.approx(sorted(expected))
+    for column in ("a", "b"):
+        names = [f"{column}.{stat}" for stat in ("count", "mean", "std", "p50", "p95")]
+        got = rv[names].to_numpy(float)
+        want = np.array([expected[end][column] for end in sorted(expected)])
+        np.testing.assert_allclose(got, want, equal_nan=True, err_msg=column)
+
+
+def test_tumbling_windows_match_brute_force():
+    df = _latency_frame(seed=6)
+    quantiles = [0.5, 0.95]
+    rv = windowed_statistics(df, window=5.0, quantiles=quantiles)
+    expected = {}
+    for start in range(0, 60, 5):
+        rows = df[(df["sessiontime"] >= start) & (df["sessiontime"] < start + 5)]
+        if len(rows):
+            expected[start + 5.0] = {c: _window_stats(rows[c].tolist(), quantiles) for c in ("a", "b")}
+    _check_windows(rv, expected)
+
+
+def test_rolling_windows_match_brute_force():
+    df = _latency_frame(seed=7)
+    quantiles = [0.5, 0.95]
+    rv = windowed_statistics(df, window=5.0, step=1.0, quantiles=quantiles)
+    expected = {}
+    for start in range(60):
+        in_step = df[(df["sessiontime"] >= start) & (df["sessiontime"] < start + 1)]
+        if not len(in_step):
+            continue
+        # The statistics of the window [end - 5, end) ending at the step boundary
+        end = start + 1.0
+        rows = df[(df["sessiontime"] >= end - 5) & (df["sessiontime"] < end)]
+        expected[end] = {c: _window_stats(rows[c].tolist(), quantiles) for c in ("a", "b")}
+    _check_windows(rv, expected)
+
+
+def test_rolling_windows_end_at_their_label():
+    # Sparse: the last sample before the boundary at 12.5 is at 10, a window ending there would include 6.5
+    df = pd.DataFrame({"sessiontime": [2.0, 5.0, 6.5, 10.0, 14.99], "a": [100.0, 1.0, 2.0, 3.0, 4.0]})
+    rv = windowed_statistics(df, window=4.0, step=2.5, quantiles=[])
+    # Only steps with samples are reported: windows [-1.5, 2.5), [3.5, 7.5), [8.5, 12.5), [11, 15)
+    assert rv["sessiontime"].tolist() == [2.5, 7.5, 12.5, 15.0]
+    assert rv["a.count"].tolist() == [1, 2, 1, 1]
+    assert rv["a.mean"].tolist() == [100.0, 1.5, 3.0, 4.0]
+    # A sample on a boundary belongs to the next window, as with tumbling windows
+    df = pd.DataFrame({"sessiontime": [5.0, 7.5, 9.0], "a": [1.0, 10.0, 3.0]})
+    rv = windowed_statistics(df, window=4.0, step=2.5, quantiles=[])
+    assert rv["a.count"].tolist() == [1, 2]  # [3.5, 7.5) and [6, 10)
+
+
+def _tile_samples(seed: int) -> Dict[str, List[Tuple[float, float]]]:
+    """Two tiles reporting every ~0.5 s at their own times; tile 1 stops reporting for 10 s halfway."""
+    rnd = random.Random(seed)
+    samples: Dict[str, List[Tuple[float, float]]] = {"tile.0": [], "tile.1": []}
+    for column, offset in (("tile.0", 0.0), ("tile.1", 0.2)):
+        t = offset
+        while t < 40:
+            if not (column == "tile.1" and 15 < t < 25):
+                samples[column].append((round(t, 3), rnd.uniform(0, 100)))
+            t += rnd.uniform(0.4, 0.6)
+    return samples
+
+
+def _tile_dataframe(samples: Dict[str, List[Tuple[float, float]]]) -> pd.DataFrame:
+    rows = [{"sessiontime": t, column: v} for column, values in samples.items() for t, v in values]
+    rows.sort(key=lambda row: row["sessiontime"])
+    return pd.DataFrame(rows, columns=["sessiontime", *samples])
+
+
+def _default_tolerance(values: List[Tuple[float, float]]) -> float:
+    times = sorted({t for t, _ in values})
+    return 2 * float(np.median(np.diff(times)))
+
+
+def _lookup_nearest(values: List[Tuple[float, float]], t: float, tolerance: float) -> float:
+    # Closest sample, the earlier one on a tie
+    dt, _, v = min((abs(st - t), st, v) for st, v in values)
+    return v if dt <= tolerance else math.nan
+
+
+def _lookup_asof(values: List[Tuple[float, float]], t: float, tolerance: float) -> float:
+    before = [(st, v) for st, v in values if st <= t]
+    if not before:
+        return math.nan
+    st, v = max(before)
+    return v if t - st <= tolerance else math.nan
+
+
+def _lookup_bin(values: List[Tuple[float, float]], t: float, interval: float) -> float:
+    in_bin = [v for st, v in values if math.floor(st / interval) == math.floor(t / interval)]
+    return sum(in_bin) / len(in_bin) if in_bin else math.nan
+
+
+def _combine_brute_force(samples: Dict[str, List[Tuple[float, float]]], lookup, reduce) -> List[float]:
+    rv = []
+    for t, _ in samples["tile.0"]:
+        found = [v for v in (lookup(column, values, t) for column, values in samples.items()) if not math.isnan(v)]
+        rv.append(reduce(found) if found else math.nan)
+    return rv
+
+
+def _combine(samples: Dict[str, List[Tuple[float, float]]], **kwargs) -> np.ndarray:
+    rv = TileCombiner("tile.*", "combined", **kwargs)(_tile_dataframe(samples))
+    return rv["combined"].to_numpy(float)
+
+
+def test_tile_combiner_nearest_matches_brute_force():
+    samples = _tile_samples(seed=1)
+    tolerances = {column: _default_tolerance(values) for column, values in samples.items()}
+    expected = _combine_brute_force(samples, lambda column, values, t: _lookup_nearest(values, t, tolerances[column]), max)
+    np.testing.assert_allclose(_combine(samples, function="max"), expected, equal_nan=True)
+
+
+def test_tile_combiner_asof_matches_brute_force():
+    samples = _tile_samples(seed=2)
+    expected = _combine_brute_force(samples, lambda column, values, t: _lookup_asof(values, t, 1.0), min)
+    np.testing.assert_allclose(_combine(samples, function="min", align="asof", tolerance=1.0), expected, equal_nan=True)
+
+
+def test_tile_combiner_bins_matches_brute_force():
+    samples = _tile_samples(seed=3)
+    expected = _combine_brute_force(samples, lambda column, values, t: _lookup_bin(values, t, 2.0), lambda found: sum(found) / len(found))
+    np.testing.assert_allclose(_combine(samples, function="mean", align="bins", interval=2.0), expected, equal_nan=True)
+
+
+def test_tile_combiner_gap_longer_than_tolerance_is_missing():
+    samples = _tile_samples(seed=4)
+    times = [t for t, _ in samples["tile.0"]]
+    tile0 = np.array([v for _, v in samples["tile.0"]])
+    in_gap = np.array([16 < t < 24 for t in times])
+    outside_gap = np.array([t < 14 or t > 26 for t in times])
+    summed = _combine(samples, function="sum")
+    # In the gap only tile 0 counts, instead of a stale tile 1 sample from before it.
+    np.testing.assert_allclose(summed[in_gap], tile0[in_gap])
+    assert (summed[outside_gap] > tile0[outside_gap]).all()
+    # Unless the tolerance is lifted explicitly
+    assert (_combine(samples, function="sum", tolerance=math.inf) > tile0).all()
+
+
+def _multi_tile_store(nTiles: int = 4, seed: int = 5) -> DataStore:
+    """Per-tile bandwidth and queue length reports from two roles, starting before session time 0."""
+    rnd = random.Random(seed)
+    records = []
+    for tile in range(nTiles):
+        t = -5 + rnd.random()
+        while t < 30:
+            role = rnd.choice(["sender", "receiver"])
+            records.append({"sessiontime": round(t, 3), "role": role, f"bw.{tile}": rnd.uniform(0, 100), f"queue.{tile}": rnd.randint(0, 5)})
+            t += rnd.uniform(0.3, 0.7)
+    # Samples just before session time 0 are the nearest ones for the first tile 0 sample after it,
+    # so running the row filters before a combiner that precedes them changes the combined values
+    records.append({"sessiontime": 0.001, "role": "receiver", "bw.0": 1.0, "queue.0": 1})
+    for tile in range(1, nTiles):
+        records.append({"sessiontime": -0.001, "role": "receiver", f"bw.{tile}": 1000.0, f"queue.{tile}": 9})
+    records.sort(key=lambda record: record["sessiontime"])
+    ds = DataStore()
+    ds.load_data(records)
+    return ds
+
+
+def _run_unfused(chain: DataFrameFilter, dataframe: pd.DataFrame) -> pd.DataFrame:
+    for f in chain.chain():
+        dataframe = f._apply(dataframe)
+    return dataframe
+
+
+@pytest.mark.parametrize("make_chain", [
+    lambda: SessionTimeFilter() + TileCombiner("bw.*", "bw", "sum", combined=True) + TileCombiner("queue.*", "queue", "max", combined=True, keep=True),
+    lambda: TileCombiner("bw.*", "bw", "mean", combined=True) + SessionTimeFilter() + TileCombiner("queue.*", "queue", "min", combined=True, align="asof"),
+    lambda: TileCombiner("bw.*", "bw", "max", combined=True, tolerance=1.0) + SessionTimeFilter(),
+    lambda: SessionTimeFilter() + TileCombiner("bw.*", "bw", "sum", combined=True, align="bins", interval=2.0),
+])
+def test_fused_filters_match_unfused_filters(make_chain):
+    ds = _multi_tile_store()
+    fields = ["sessiontime", "role", *(f"bw.{tile}" for tile in range(4)), *(f"queue.{tile}" for tile in range(4))]
+    predicate = 'role == "receiver"'
+    expected = _run_unfused(make_chain(), ds.get_dataframe(predicate=predicate, fields=fields))
+    chain = make_chain()
+    fused = DataFrameFilter._run_fused(chain.chain(), ds.get_dataframe(predicate=predicate, fields=fields))
+    if fused is not None:
+        pd.testing.assert_frame_equal(fused, expected)
+    pd.testing.assert_frame_equal(chain(ds.get_dataframe(predicate=predicate, fields=fields)), expected)
+    # Pushing the row filters down may change the order in which columns first appear
+    pd.testing.assert_frame_equal(make_chain().query(ds, predicate, fields).reset_index(drop=True), expected.reset_index(drop=True), check_like=True)
+
+
+def _noisy_series(m: int, seed: int) -> pd.DataFrame:
+    """A noisy signal with one upward and one downward spike, at uneven session times."""
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.01, 0.03, m))
+    y = np.sin(t) + rng.normal(0, 0.05, m)
+    y[m // 3] = 50.0
+    y[2 * m // 3] = -50.0
+    return pd.DataFrame({"sessiontime": t, "y": y})
+
+
+@pytest.mark.parametrize("method, limit", [("lttb", lambda n: n), ("minmax", lambda n: 2 * n + 2)])
+@pytest.mark.parametrize("m, n", [(1000, 10), (1000, 100), (5003, 37), (250, 5)])
+def test_downsample_keeps_spikes_and_ends(method, limit, m, n):
+    df = _noisy_series(m, seed=m + n)
+    rv = downsample_dataframe(df, n, method=method)
+    assert len(rv) <= limit(n)
+    assert rv.index.is_monotonic_increasing
+    kept = set(rv.index)
+    assert {0, m - 1, m // 3, 2 * m // 3} <= kept
+    pd.testing.assert_frame_equal(rv, df.loc[rv.index])
+
+
+def test_downsample_minmax_keeps_every_bucket_extreme():
+    df = _noisy_series(2000, seed=1)
+    n = 40
+    rv = downsample_dataframe(df, n, method="minmax")
+    t = df["sessiontime"].to_numpy()
+    bucket = np.clip(((t - t[0]) * (n / (t[-1] - t[0]))).astype(int), 0, n - 1)
+    for b in range(n):
+        rows = df.index[bucket == b]
+        if len(rows):
+            assert df.loc[rows, "y"].idxmax() in rv.index and df.loc[rows, "y"].idxmin() in rv.index
+
+
+@pytest.mark.parametrize("method, limit", [("lttb", lambda n: n), ("minmax", lambda n: 2 * n + 2)])
+def test_downsample_series_with_nan_gaps(method, limit):
+    m, n = 3000, 50
+    df = _noisy_series(m, seed=7)
+    df.loc[1200:1499, "y"] = np.nan  # A gap in the middle
+    # A sparse second series, reported only in the second half
+    df["z"] = np.where(df.index >= m // 2, df["y"] * 2, np.nan)
+    df.loc[m - 10:, "z"] = np.nan
+    for column, first, last in [("y", 0, m - 1), ("z", m // 2, m - 11)]:
+        selected = downsample_dataframe(df, n, columns=[column], method=method)
+        assert len(selected) <= limit(n)
+        assert {first, last} <= set(selected.index)
+        assert not selected[column].isna().any()
+    # Together: the union of the rows of both series, and never a row where both are NaN
+    rv = downsample_dataframe(df, n, method=method)
+    assert len(rv) <= 2 * limit(n)
+    assert {0, m // 3, 2 * m // 3, m - 1, m - 11} <= set(rv.index)
+    assert not rv[["y", "z"]].isna().all(axis=1).any()
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_small_input_passes_through(method):
+    df = _noisy_series(100, seed=3)
+    assert downsample_dataframe(df, 100, method=method) is df
+    assert downsample_dataframe(df, 1000, method=method) is df
+    # Min/max keeps everything up to 2n points
+    if method == "minmax":
+        pd.testing.assert_frame_equal(downsample_dataframe(df, 50, method=method), df)
+
+
+def test_downsample_errors():
+    df = _noisy_series(100, seed=3)
+    with pytest.raises(ValueError, match="unknown method"):
+        downsample_dataframe(df, 10, method="every-other")
+    with pytest.raises(ValueError, match="n must be positive"):
+        downsample_dataframe(df, 0)
+
+
+def _latency_samples(seed: int) -> pd.DataFrame:
+    """100 samples at sessiontime 0..99 of a few stages, with NaN gaps and outliers."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "sessiontime": np.arange(100.0),
+        "a": rng.exponential(20, 100),
+        "b": rng.normal(50, 5, 100),
+    })
+    df.loc[rng.choice(100, 30, replace=False), "a"] = np.nan
+    df.loc[[10, 60], "b"] = 10000.0
+    return df
+
+
+def test_histogram2d_totals_match_samples():
+    df = _latency_samples(1)
+    heatmaps = histogram2d_over_time(df, time_bins=4, value_bins=20)
+    assert sorted(heatmaps) == ["a", "b"]
+    for column, counts in heatmaps.items():
+        assert counts.shape == (4, 20)
+        assert counts.to_numpy().sum() == df[column].notna().sum()
+        # Time buckets of 99/4 s: 25 samples each
+        per_bucket = df[column].notna().groupby(np.minimum(df["sessiontime"] // 24.75, 3)).sum()
+        assert counts.sum(axis=1).tolist() == per_bucket.tolist()
+        assert counts.index.name == "sessiontime"
+        assert counts.index.tolist() == pytest.approx([12.375, 37.125, 61.875, 86.625])
+
+
+def test_histogram2d_clips_to_quantile_or_value_max():
+    df = _latency_samples(2)
+    values = df["b"].to_numpy()
+    # The two outliers are above the 0.9 quantile: counted in the top bucket, not stretching the range
+    counts = histogram2d_over_time(df, ["b"], time_bins=1, value_bins=10, clip_quantile=0.9)["b"]
+    top = np.quantile(values, 0.9)
+    width = top / 10
+    assert counts.columns[-1] == pytest.approx(top - width / 2)
+    assert counts.iloc[0, -1] == (values >= top - width).sum()
+    assert counts.iloc[0, -1] >= 10
+    # A fixed value_max
+    counts = histogram2d_over_time(df, ["b"], time_bins=1, value_bins=10, value_max=40.0)["b"]
+    assert counts.columns.tolist() == pytest.approx([2.0 + 4.0 * i for i in range(10)])
+    assert counts.iloc[0, -1] == (values >= 36.0).sum()
+    assert counts.to_numpy().sum() == 100
+
+
+def test_histogram2d_empty_and_constant_stages():
+    df = _latency_samples(3)
+    df["empty"] = np.nan
+    df["zero"] = 0.0
+    heatmaps = histogram2d_over_time(df, ["a", "empty", "zero"], time_bins=5, value_bins=4)
+    # Stages without values are left out
+    assert sorted(heatmaps) == ["a", "zero"]
+    # A constant stage gets a range of 1 above its value, with everything in the first bucket
+    assert heatmaps["zero"].columns.tolist() == pytest.approx([0.125, 0.375, 0.625, 0.875])
+    assert heatmaps["zero"].iloc[:, 0].sum() == 100 and heatmaps["zero"].iloc[:, 1:].to_numpy().sum() == 0
+    df["sessiontime"] = np.nan
+    with pytest.raises(DataStoreError, match="no sessiontime values"):
+        histogram2d_over_time(df, ["a"])
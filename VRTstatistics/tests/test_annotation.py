@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+from VRTstatistics.annotation import PROFILE_KEY, AnnotationEngine, AnnotationStep, ProfilingHook, format_profiles, stored_profiles
+from VRTstatistics.annotation import ComponentRoleAnnotation, LatencyAnnotation, LatencySketchAnnotation
+from VRTstatistics.datastore import DataStore, DataStoreError
+
+
+def _step(name: str, dependencies: List[str] = [], reads: Optional[List[str]] = [], writes: Optional[List[str]] = []) -> type:
+    """An AnnotationStep class that appends its name to ds.session_metadata["applied"]."""
+
+    def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
+        ds.session_metadata.setdefault("applied", []).append(self.name)
+        return {"params": params}
+
+    return type(f"Step_{name}", (AnnotationStep,), {
+        "name": name, "dependencies": dependencies, "reads": reads, "writes": writes, "apply": apply,
+    })
+
+
+def _threaded_step(name: str, body: Callable[[], None], dependencies: List[str] = [], releases_gil: bool = True) -> type:
+    """An AnnotationStep class with declared (empty) reads and writes, that runs body and records its thread."""
+
+    def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
+        body()
+        return {"thread": threading.current_thread().name}
+
+    return type(f"Step_{name}", (AnnotationStep,), {
+        "name": name, "dependencies": dependencies, "reads": [], "writes": [], "releases_gil": releases_gil, "apply": apply,
+    })
+
+
+def _engine(*steps: type) -> AnnotationEngine:
+    rv = AnnotationEngine()
+    for step in steps:
+        rv.register(step)
+    return rv
+
+
+def _store() -> DataStore:
+    ds = DataStore("combined.json")
+    ds.load_data([{"sessiontime": 0.0}])
+    return ds
+
+
+def test_plan_puts_dependencies_first():
+    engine = _engine(_step("a"), _step("b", ["a"]), _step("c", ["b"]), _step("d"))
+    plan = engine._plan(_store(), ["c", "d"])
+    assert sorted(plan) == ["a", "b", "c", "d"]
+    assert plan.index("a") < plan.index("b") < plan.index("c")
+
+
+def test_ensure_many_applies_shared_dependencies_once():
+    engine = _engine(_step("base"), _step("x", ["base"]), _step("y", ["base"]))
+    ds = _store()
+    engine.ensure_many(ds, ["x", "y"], params={"y": {"n": 1}})
+    assert ds.session_metadata["applied"] == ["base", "x", "y"]
+    assert ds.applied_annotations["y"] == {"params": {"n": 1}}
+    assert ds.applied_annotations["x"] == {"params": {}}
+
+
+def test_plan_skips_applied_steps():
+    engine = _engine(_step("a"), _step("b", ["a"]))
+    ds = _store()
+    ds.applied_annotations["a"] = {}
+    assert engine._plan(ds, ["b"]) == ["b"]
+
+
+def test_plan_rejects_cycles():
+    engine = _engine(_step("a", ["c"]), _step("b", ["a"]), _step("c", ["b"]))
+    with pytest.raises(DataStoreError, match="cycle"):
+        engine._plan(_store(), ["c"])
+
+
+def test_plan_rejects_unknown_steps():
+    engine = _engine(_step("a", ["missing"]))
+    with pytest.raises(DataStoreError, match="Unknown annotation step 'missing'"):
+        engine._plan(_store(), ["a"])
+    with pytest.raises(DataStoreError, match="Unknown annotation step 'other'"):
+        engine._plan(_store(), ["other"])
+
+
+def test_plan_rejects_unordered_write_conflicts():
+    engine = _engine(_step("a", writes=["f"]), _step("b", writes=["f", "g"]))
+    with pytest.raises(DataStoreError, match="both write"):
+        engine._plan(_store(), ["a", "b"])
+
+
+def test_plan_rejects_unordered_read_write_conflicts():
+    engine = _engine(_step("a", writes=["f"]), _step("b", reads=["f"]))
+    with pytest.raises(DataStoreError, match="reads \\['f'\\] written by 'a'"):
+        engine._plan(_store(), ["b", "a"])
+
+
+def test_plan_allows_conflicts_ordered_by_dependency():
+    engine = _engine(
+        _step("a", writes=["f"]),
+        _step("b", ["a"], reads=["f"], writes=["f"]),
+        _step("c", ["b"], reads=["f"]),
+        _step("d", reads=None, writes=None),
+    )
+    ds = _store()
+    engine.ensure_many(ds, ["c", "d"])
+    assert ds.session_metadata["applied"] == ["a", "b", "c", "d"]
+
+
+def test_profiling_hook_stores_profiles_in_the_annotations(tmp_path):
+    class Touching(AnnotationStep):
+        name = "touching"
+        reads: List[str] = []
+        writes = ["f"]
+
+        def apply(self, ds: DataStore, **params) -> Dict[str, Any]:
+            for record in ds.data:
+                record["f"] = 1
+            self.records_touched = len(ds.data)
+            return {}
+
+    engine = _engine(Touching, _step("meta", ["touching"]), _step("undeclared", reads=None, writes=None))
+    hook = ProfilingHook()
+    engine.add_hook(hook)
+    ds = DataStore(os.path.join(tmp_path, "combined.json"))
+    ds.load_data([{"sessiontime": 0.0}])
+    engine.ensure_many(ds, ["meta", "undeclared"])
+    assert {name: result[PROFILE_KEY]["records_touched"] for name, result in ds.applied_annotations.items()} == {"touching": 1, "meta": 0, "undeclared": None}
+    assert ds.applied_annotations["meta"]["params"] == {}
+    assert stored_profiles(ds) == hook.profiles
+    assert all(prof["wall_s"] >= 0 and prof["peak_mem_bytes"] >= 0 for prof in hook.profiles.values())
+    assert format_profiles(hook.profiles).splitlines()[1].startswith("touching")
+    # Saved with the DataStore
+    ds.save()
+    loaded = DataStore(ds.filename)
+    loaded.load()
+    assert stored_profiles(loaded) == hook.profiles
+
+
+def test_builtin_steps_report_records_touched():
+    ds = DataStore("combined.json")
+    ds.load_data([{"sessiontime": 0.0, "role": "sender", "component": "grabber"}])
+    ds.session_metadata.update({"roles": ["sender"], "component_map": {"sender": {"grabber": "sender.pc.grabber"}}})
+    engine = _engine(ComponentRoleAnnotation, LatencyAnnotation, LatencySketchAnnotation)
+    engine.add_hook(ProfilingHook())
+    engine.ensure_many(ds, ["latency", "latency_sketch"])
+    assert {name: prof["records_touched"] for name, prof in stored_profiles(ds).items()} == {"component_role": 1, "latency": 0, "latency_sketch": 0}
+
+
+def test_ensure_many_runs_independent_steps_concurrently():
+    # Both steps must be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=10)
+    engine = _engine(_step("base"), _threaded_step("x", barrier.wait, ["base"]), _threaded_step("y", barrier.wait, ["base"]),
+                     _threaded_step("after", lambda: None, ["x", "y"]))
+    ds = _store()
+    engine.ensure_many(ds, ["after"])
+    applied = list(ds.applied_annotations)
+    assert applied[0] == "base" and sorted(applied[1:3]) == ["x", "y"] and applied[3] == "after"
+    assert ds.applied_annotations["x"]["thread"].startswith("annotation")
+
+
+@pytest.mark.skipif(not getattr(sys, "_is_gil_enabled", lambda: True)(), reason="all steps release the GIL on free-threaded builds")
+def test_ensure_many_does_not_overlap_steps_holding_the_gil():
+    lock = threading.Lock()
+    active: List[int] = [0, 0]  # currently running, most running at once
+
+    def body() -> None:
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        threading.Event().wait(0.05)
+        with lock:
+            active[0] -= 1
+
+    engine = _engine(*[_threaded_step(name, body, releases_gil=False) for name in "abc"], _step("undeclared", reads=None, writes=None))
+    engine.ensure_many(_store(), ["a", "b", "c", "undeclared"])
+    assert active[1] == 1
+
+
+def test_ensure_many_failure_stops_scheduling():
+    def fail() -> None:
+        raise ValueError("broken")
+
+    engine = _engine(_threaded_step("bad", fail), _threaded_step("ok", lambda: None), _threaded_step("after", lambda: None, ["bad"]))
+    ds = _store()
+    with pytest.raises(DataStoreError, match="annotation step 'bad' failed: broken"):
+        engine.ensure_many(ds, ["after", "ok"])
+    assert "bad" not in ds.applied_annotations and "after" not in ds.applied_annotations
+
+
+def test_ensure_many_applies_steps_one_at_a_time_with_profiling():
+    engine = _engine(_threaded_step("x", lambda: None), _threaded_step("y", lambda: None))
+    engine.add_hook(ProfilingHook())
+    ds = _store()
+    engine.ensure_many(ds, ["x", "y"])
+    assert ds.applied_annotations["x"]["thread"] == ds.applied_annotations["y"]["thread"] == threading.current_thread().name
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import VRTstatistics.cache
+from VRTstatistics.cache import ViewCache
+from VRTstatistics.datastore import DataStore
+from VRTstatistics.views import ResourceView
+
+
+@pytest.fixture
+def store(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": 0.0, "role": "sender"}])
+    ds.save()
+    return filename
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Names of the stores that DataStore.fingerprint() hashed."""
+    monkeypatch.setattr(VRTstatistics.cache, "_fingerprints", {})
+    calls = []
+    fingerprint = DataStore.fingerprint
+
+    def counting_fingerprint(self):
+        calls.append(self.filename)
+        return fingerprint(self)
+
+    monkeypatch.setattr(DataStore, "fingerprint", counting_fingerprint)
+    return calls
+
+
+def test_fingerprint_is_remembered_across_caches_and_processes(store, hashed, monkeypatch):
+    key = ViewCache.for_datastore(DataStore(store)).key(ResourceView, DataStore(store), {})
+    assert ViewCache.for_datastore(DataStore(store)).key(ResourceView, DataStore(store), {}) == key
+    assert len(hashed) == 1
+    # A new process starts without the in-memory fingerprints, and reads them from the manifest
+    monkeypatch.setattr(VRTstatistics.cache, "_fingerprints", {})
+    assert ViewCache.for_datastore(DataStore(store)).key(ResourceView, DataStore(store), {}) == key
+    assert len(hashed) == 1
+
+
+def test_fingerprint_is_recomputed_after_change(store, hashed):
+    key = ViewCache.for_datastore(DataStore(store)).key(ResourceView, DataStore(store), {})
+    ds = DataStore(store)
+    ds.load()
+    ds.applied_annotations["test"] = {}
+    ds.save_delta(["test"])
+    assert ViewCache.for_datastore(DataStore(store)).key(ResourceView, DataStore(store), {}) != key
+    assert len(hashed) == 2
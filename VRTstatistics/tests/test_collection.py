@@ -0,0 +1,101 @@
+import os
+
+import pandas as pd
+import pytest
+
+from VRTstatistics.collection import DataStoreCollection, RunError
+from VRTstatistics.datastore import DataStore, DataStoreError
+
+
+def _make_run(root, run: str, nrecords: int, protocol: str = "dash") -> None:
+    os.makedirs(os.path.join(root, run))
+    ds = DataStore(os.path.join(root, run, "combined.json"))
+    ds.load_data([{"sessiontime": float(i), "role": "sender", "value": i} for i in range(nrecords)])
+    ds.session_metadata = {"roles": ["sender", "receiver"]}
+    ds.applied_annotations["latency"] = {"sender": "sender", "receiver": "receiver", "protocol": protocol, "nTiles": 1, "columns": [1, 2]}
+    ds.save()
+
+
+@pytest.fixture
+def runs(tmp_path):
+    _make_run(tmp_path, "run-a", 3)
+    _make_run(tmp_path, "run-b", 5, protocol="socketio")
+    _make_run(tmp_path, "run-c", 1)
+    os.makedirs(os.path.join(tmp_path, "run-d"))
+    with open(os.path.join(tmp_path, "run-d", "combined.json"), "w") as fp:
+        fp.write("{not json")
+    # Not a run: no combined.json
+    os.makedirs(os.path.join(tmp_path, "notes"))
+    return DataStoreCollection(os.path.join(tmp_path, "*"))
+
+
+def summary(ds: DataStore) -> dict:
+    total = sum(record["value"] for record in ds.data)
+    if not total:
+        raise ValueError("nothing counted")
+    return {"nrecords": len(ds.data), "total": total}
+
+
+def values(ds: DataStore) -> pd.DataFrame:
+    return pd.DataFrame({"value": [record["value"] for record in ds.data]})
+
+
+def test_runs_are_found(runs):
+    assert list(runs) == ["run-a", "run-b", "run-c", "run-d"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_map_tags_rows_and_skips_failing_runs(runs, jobs):
+    rv = runs.map(summary, annotations=(), jobs=jobs)
+    assert rv["run"].tolist() == ["run-a", "run-b"]
+    assert rv["nrecords"].tolist() == [3, 5]
+    assert rv["total"].tolist() == [3, 10]
+    # Scalar latency metadata is added, other values are not
+    assert rv["protocol"].tolist() == ["dash", "socketio"]
+    assert "columns" not in rv.columns
+    assert [error.run for error in runs.errors] == ["run-c", "run-d"]
+    assert all(isinstance(error, RunError) for error in runs.errors)
+    assert runs.errors[0].message == "ValueError: nothing counted"
+    assert runs.errors[1].filename.endswith(os.path.join("run-d", "combined.json"))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_map_concatenates_frames_in_run_order(runs, jobs):
+    rv = runs.map(values, annotations=(), jobs=jobs)
+    assert rv["run"].tolist() == ["run-a"] * 3 + ["run-b"] * 5 + ["run-c"]
+    assert rv["value"].tolist() == [0, 1, 2, 0, 1, 2, 3, 4, 0]
+    assert [error.run for error in runs.errors] == ["run-d"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_map_on_error_raise(runs, jobs):
+    with pytest.raises(DataStoreError, match="run-[cd]: (ValueError|JSONDecodeError|DataStoreError)"):
+        runs.map(summary, annotations=(), jobs=jobs, on_error="raise")
+    assert runs.errors
+
+
+def test_map_errors_are_reset_per_call(runs):
+    runs.map(summary, annotations=(), jobs=1)
+    assert len(runs.errors) == 2
+    ok = DataStoreCollection([runs.runs["run-a"], runs.runs["run-b"]])
+    ok.map(summary, annotations=(), jobs=1)
+    assert ok.errors == []
+
+
+def test_map_argument_errors(runs):
+    with pytest.raises(ValueError):
+        runs.map(summary, on_error="ignore")
+    with pytest.raises(DataStoreError):
+        runs.map("no-such-view")
+
+
+def test_map_with_no_results_is_empty(runs):
+    only_bad = DataStoreCollection(runs.runs["run-d"])
+    assert only_bad.map(summary, annotations=(), jobs=1).empty
+    assert [error.run for error in only_bad.errors] == ["run-d"]
+
+
+def test_metadata(runs):
+    rv = runs.metadata(jobs=1)
+    assert rv["run"].tolist() == ["run-a", "run-b", "run-c"]
+    assert rv["protocol"].tolist() == ["dash", "socketio", "dash"]
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from VRTstatistics.datastore import DataStore, DataStoreError
+
+
+def _make_store(path: str) -> DataStore:
+    ds = DataStore(str(path))
+    ds.load_data([
+        {"sessiontime": 0.0, "role": "sender", "component": "G"},
+        {"sessiontime": 1.0, "role": "sender", "component": "E", "gone": 1},
+        {"sessiontime": 2.0, "role": "receiver", "component": "R"},
+    ])
+    ds.save()
+    return ds
+
+
+def _annotate(ds: DataStore) -> None:
+    ds.data[0]["k"] = None
+    ds.data[1]["k"] = 3
+    ds.data[1].pop("gone")
+    ds.data[2]["gone"] = "back"
+    ds.applied_annotations["test"] = {"ok": True}
+    ds.save_delta(["test"], ["k", "gone"])
+
+
+def _annotate_and_reload(filename: str) -> DataStore:
+    _annotate(_make_store(filename))
+    ds = DataStore(filename)
+    ds.load()
+    return ds
+
+
+def test_save_delta_roundtrip_keeps_null_values(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = _annotate_and_reload(filename)
+    assert ds.applied_annotations["test"] == {"ok": True}
+    assert ds.data[0] == {"sessiontime": 0.0, "role": "sender", "component": "G", "k": None}
+    assert ds.data[1] == {"sessiontime": 1.0, "role": "sender", "component": "E", "k": 3}
+    assert ds.data[2] == {"sessiontime": 2.0, "role": "receiver", "component": "R", "gone": "back"}
+
+
+def test_streamed_records_match_loaded_records(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    loaded = _annotate_and_reload(filename)
+    streamed = DataStore(filename)
+    records = [record for chunk in streamed.iter_chunks(2) for record in chunk]
+    assert records == loaded.data
+    assert streamed.applied_annotations["test"] == {"ok": True}
+
+
+def _windows(slices):
+    return [(window.time_window, window.data) for window in slices]
+
+
+def test_streamed_time_slices_match_loaded_time_slices(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": t / 10, "i": i} for i, t in enumerate([3, 5, 10, 19, 20, 21, 55, 60, 61])] + [{"role": "x"}])
+    ds.save()
+    loaded = DataStore(filename)
+    loaded.load()
+    for args in [(1.0,), (0.7,), (1.0, 0.5, 5.0), (2.0, None, 1.9)]:
+        streamed = DataStore(filename)
+        assert _windows(streamed.iter_time_slices(*args)) == _windows(loaded.iter_time_slices(*args))
+        assert streamed.data == []
+    assert [w for w, _ in _windows(loaded.iter_time_slices(1.0))] == [(0.0, 1.0), (1.0, 2.0), (2.0, 3.0), (5.0, 6.0), (6.0, 7.0)]
+
+
+def test_streamed_time_slices_need_sorted_records(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": 0.0}, {"sessiontime": 2.0}, {"sessiontime": 1.0}])
+    ds.save()
+    with pytest.raises(DataStoreError, match="not in sessiontime order"):
+        list(DataStore(filename).iter_time_slices(1.0))
+    loaded = DataStore(filename)
+    loaded.load()
+    assert [len(w.data) for w in loaded.iter_time_slices(1.0)] == [1, 1, 1]
@@ -0,0 +1,135 @@
+import csv
+import json
+import os
+
+import pytest
+
+from VRTstatistics.datastore import DataStore, DataStoreError
+from VRTstatistics.scripts.filter import _CSVWriter, _Export, _JSONLinesWriter, _ParquetWriter, _export, _read_spec
+
+# Chunks of records in which columns appear late (b in the second chunk, c in the third).
+CHUNKS = [
+    [{"sessiontime": 0.0, "a": 1}, {"sessiontime": 0.5, "a": 2}],
+    [{"sessiontime": 1.0, "a": 3, "b": "x"}, {"sessiontime": 1.5, "a": None}],
+    [{"sessiontime": 2.0, "c": 1.5, "b": "y"}],
+]
+
+
+def _write(writer, chunks=CHUNKS) -> None:
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+    finally:
+        writer.close()
+
+
+def test_csv_header_is_rewritten_for_late_columns(tmp_path):
+    path = os.path.join(tmp_path, "out.csv")
+    _write(_CSVWriter(path))
+    with open(path, newline="") as fp:
+        rows = list(csv.reader(fp))
+    assert rows == [
+        ["sessiontime", "a", "b", "c"],
+        ["0.0", "1", "", ""],
+        ["0.5", "2", "", ""],
+        ["1.0", "3", "x", ""],
+        ["1.5", "", "", ""],
+        ["2.0", "", "y", "1.5"],
+    ]
+    assert os.listdir(tmp_path) == ["out.csv"]
+
+
+def test_csv_without_late_columns_is_written_once(tmp_path):
+    path = os.path.join(tmp_path, "out.csv")
+    _write(_CSVWriter(path), [[{"a": 1, "b": 2}], [], [{"b": 3}]])
+    with open(path, newline="") as fp:
+        assert list(csv.reader(fp)) == [["a", "b"], ["1", "2"], ["", "3"]]
+
+
+def test_jsonlines_keeps_records_as_is(tmp_path):
+    path = os.path.join(tmp_path, "out.jsonl")
+    _write(_JSONLinesWriter(path))
+    with open(path) as fp:
+        assert [json.loads(line) for line in fp] == [record for chunk in CHUNKS for record in chunk]
+
+
+def test_parquet_parts_are_merged(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = os.path.join(tmp_path, "out.parquet")
+    # The last chunk also turns the integers of a into floats
+    _write(_ParquetWriter(path), CHUNKS + [[{"sessiontime": 2.5, "a": 4.5}]])
+    table = pq.read_table(path)
+    assert table.column_names == ["sessiontime", "a", "b", "c"]
+    assert table.to_pylist() == [
+        {"sessiontime": 0.0, "a": 1, "b": None, "c": None},
+        {"sessiontime": 0.5, "a": 2, "b": None, "c": None},
+        {"sessiontime": 1.0, "a": 3, "b": "x", "c": None},
+        {"sessiontime": 1.5, "a": None, "b": None, "c": None},
+        {"sessiontime": 2.0, "a": None, "b": "y", "c": 1.5},
+        {"sessiontime": 2.5, "a": 4.5, "b": None, "c": None},
+    ]
+    assert os.listdir(tmp_path) == ["out.parquet"]
+
+
+def test_parquet_conflicting_types_are_an_error(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = os.path.join(tmp_path, "out.parquet")
+    with pytest.raises(DataStoreError, match="cannot combine columns"):
+        _write(_ParquetWriter(path), [[{"a": 1}], [{"a": "one"}]])
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_export_writes_every_output_in_one_scan(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([record for chunk in CHUNKS for record in chunk])
+    ds.save()
+    exports = [
+        _Export(os.path.join(tmp_path, "all.csv")),
+        _Export(os.path.join(tmp_path, "b.jsonl"), predicate='"b" in record', fields=["sessiontime", "b"]),
+    ]
+    assert _export(DataStore(filename), exports, chunk_size=2) == [5, 2]
+    with open(exports[0].output, newline="") as fp:
+        assert next(csv.reader(fp)) == ["sessiontime", "a", "b", "c"]
+    with open(exports[1].output) as fp:
+        assert [json.loads(line) for line in fp] == [{"sessiontime": 1.0, "b": "x"}, {"sessiontime": 2.0, "b": "y"}]
+
+
+def test_read_spec_json_and_toml(tmp_path):
+    json_spec = os.path.join(tmp_path, "spec.json")
+    with open(json_spec, "w") as fp:
+        json.dump({"exports": [
+            {"output": "lat.csv", "predicate": "latency_ms", "fields": ["sessiontime", "latency_ms"]},
+            {"output": "all.parquet", "fields": []},
+        ]}, fp)
+    toml_spec = os.path.join(tmp_path, "spec.toml")
+    with open(toml_spec, "w") as fp:
+        fp.write(
+            '[[exports]]\noutput = "lat.csv"\npredicate = "latency_ms"\nfields = ["sessiontime", "latency_ms"]\n\n'
+            '[[exports]]\noutput = "all.parquet"\nfields = []\n'
+        )
+    expected = [
+        _Export(os.path.join("out", "lat.csv"), "latency_ms", ["sessiontime", "latency_ms"]),
+        _Export(os.path.join("out", "all.parquet")),
+    ]
+    assert _read_spec(json_spec, "out") == expected
+    assert _read_spec(toml_spec, "out") == expected
+    with open(json_spec, "w") as fp:
+        json.dump([{"output": "a.csv"}], fp)
+    assert _read_spec(json_spec, None) == [_Export("a.csv")]
+
+
+@pytest.mark.parametrize("entries, message", [
+    ([], "non-empty list"),
+    ([{"output": "a.csv", "colour": "red"}], "unknown key"),
+    ([{"predicate": "x"}], "output must be a file name"),
+    ([{"output": "a.csv", "fields": "x"}], "fields must be a list"),
+    ([{"output": "a.csv", "format": "xls"}], "format must be one of"),
+    ([{"output": "a.csv"}, {"output": "a.csv"}], "more than one export writes a.csv"),
+])
+def test_read_spec_errors(tmp_path, entries, message):
+    spec = os.path.join(tmp_path, "spec.json")
+    with open(spec, "w") as fp:
+        json.dump(entries, fp)
+    with pytest.raises(ValueError, match=message):
+        _read_spec(spec, None)
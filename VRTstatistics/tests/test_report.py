@@ -0,0 +1,119 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import ClassVar
+
+import pandas as pd
+import pytest
+
+from VRTstatistics.datastore import DataStore
+from VRTstatistics.scripts.report import MANIFEST_FILENAME, _build_run
+from VRTstatistics.views import View
+
+
+@dataclass
+class _FieldView(View):
+    """The values of one record field over session time."""
+    field: ClassVar[str] = ""
+    values: pd.DataFrame
+
+    @classmethod
+    def is_applicable(cls, ds: DataStore) -> bool:
+        return any(cls.field in record for record in ds.data)
+
+    @classmethod
+    def _extract(cls, ds: DataStore) -> View:
+        return cls(description=ds.describe(), values=ds.get_dataframe(f'"{cls.field}" in record', ["sessiontime", cls.field]))
+
+
+def _render(view: _FieldView, **kwargs) -> list:
+    return [view.values.plot(x="sessiontime")]
+
+
+def _field_view(field: str) -> type:
+    cls = type(f"View_{field}", (_FieldView,), {
+        "name": f"test-report-{field}", "default_filename": f"test-report-{field}.pdf", "field": field,
+    })
+    cls.register_extractor(cls._extract)
+    cls.register_renderer(_render)
+    return cls
+
+
+VIEWS = [_field_view(field).name for field in ["a", "b", "c"]]
+
+
+@pytest.fixture
+def store(tmp_path):
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": t, "a": t, "b": 2 * t} for t in [0.0, 1.0, 2.0]])
+    ds.save()
+    return filename
+
+
+def _build(filename: str, force: bool = False, dry_run: bool = False):
+    result = _build_run("run", filename, VIEWS, "report", force, dry_run, None)
+    assert result.ok, result.message
+    return result
+
+
+def _delta(filename: str, field: str, value) -> None:
+    ds = DataStore(filename)
+    ds.load()
+    for record in ds.data:
+        record[field] = value(record)
+    ds.applied_annotations[f"set-{field}"] = {}
+    ds.save_delta([f"set-{field}"], [field])
+
+
+def test_report_rebuilds_only_the_views_a_delta_changes(store, tmp_path):
+    outdir = os.path.join(tmp_path, "report")
+    result = _build(store)
+    assert result.built == VIEWS
+    with open(os.path.join(outdir, MANIFEST_FILENAME)) as fp:
+        entries = json.load(fp)["outputs"]
+    assert entries["test-report-a"]["outputs"] == ["test-report-a.pdf", "test-report-a.values.csv"]
+    # Not applicable: recorded without outputs, and not retried
+    assert entries["test-report-c"]["outputs"] == []
+    assert all(os.path.exists(os.path.join(outdir, fn)) for entry in entries.values() for fn in entry["outputs"])
+
+    result = _build(store)
+    assert (result.built, result.uptodate) == ([], VIEWS)
+
+    # Changes the data of b only: a and c are kept, but their manifest entries follow the new fingerprint
+    a_mtime = os.stat(os.path.join(outdir, "test-report-a.pdf")).st_mtime_ns
+    _delta(store, "b", lambda record: 3 * record["sessiontime"])
+    assert _build(store, dry_run=True).built == VIEWS
+    result = _build(store)
+    assert result.built == ["test-report-b"]
+    assert sorted(result.uptodate) == ["test-report-a", "test-report-c"]
+    assert os.stat(os.path.join(outdir, "test-report-a.pdf")).st_mtime_ns == a_mtime
+    assert pd.read_csv(os.path.join(outdir, "test-report-b.values.csv"))["b"].tolist() == [0.0, 3.0, 6.0]
+    assert _build(store, dry_run=True).built == []
+
+    # Makes c applicable
+    _delta(store, "c", lambda record: 1)
+    assert _build(store).built == ["test-report-c"]
+    assert _build(store, force=True).built == VIEWS
+
+
+def test_report_rebuilds_missing_outputs(store, tmp_path):
+    _build(store)
+    os.remove(os.path.join(tmp_path, "report", "test-report-b.values.csv"))
+    result = _build(store)
+    assert (result.built, result.uptodate) == (["test-report-b"], ["test-report-a", "test-report-c"])
+
+
+def test_report_hashes_the_store_only_when_its_files_change(store, monkeypatch):
+    _build(store)
+    hashed = []
+    original = DataStore.fingerprint
+    monkeypatch.setattr(DataStore, "fingerprint", lambda self: hashed.append(self.filename) or original(self))
+    assert _build(store).built == []
+    assert hashed == []
+    _delta(store, "b", lambda record: 0.0)
+    assert _build(store).built == ["test-report-b"]
+    assert _build(store).built == []
+    assert hashed == [store]
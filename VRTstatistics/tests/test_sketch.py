@@ -0,0 +1,112 @@
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+from VRTstatistics.sketch import QuantileSketch, merge_sketches
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999, 1.0]
+
+
+def _latencies(seed: int, n: int = 5000) -> list:
+    """Mostly positive latencies over several decades, some exact zeros and some negative (desync) ones."""
+    rnd = random.Random(seed)
+    rv = [rnd.lognormvariate(3, 1.5) for _ in range(n)]
+    rv += [0.0] * (n // 100)
+    rv += [-rnd.lognormvariate(1, 1) for _ in range(n // 20)]
+    rnd.shuffle(rv)
+    return rv
+
+
+def _exact_quantile(values: list, q: float) -> float:
+    # The sketch answers with the value of rank floor(q * (n - 1)), no interpolation
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def _assert_within_accuracy(sketch: QuantileSketch, values: list, accuracy: float) -> None:
+    got = sketch.quantile(QUANTILES)
+    for q, v in zip(QUANTILES, got):
+        exact = _exact_quantile(values, q)
+        assert abs(v - exact) <= accuracy * abs(exact) + 1e-12, f"q={q}: {v} vs {exact}"
+
+
+def _same_sketch(a: QuantileSketch, b: QuantileSketch) -> bool:
+    da, db = a.to_dict(), b.to_dict()
+    sum_a, sum_b = da.pop("sum"), db.pop("sum")
+    return da == db and math.isclose(sum_a, sum_b)
+
+
+@pytest.mark.parametrize("accuracy,max_buckets", [(0.05, 2048), (0.01, 2048), (0.001, 20000)])
+def test_quantiles_within_relative_accuracy(accuracy, max_buckets):
+    # Enough buckets for the whole range of values, so nothing is collapsed
+    values = _latencies(seed=1)
+    sketch = QuantileSketch(accuracy, max_buckets=max_buckets).add(values)
+    assert sketch.count == len(values)
+    assert sketch.min == min(values)
+    assert sketch.max == max(values)
+    assert sketch.sum == pytest.approx(sum(values))
+    _assert_within_accuracy(sketch, values, accuracy)
+
+
+def test_scalar_and_nan_input():
+    sketch = QuantileSketch().add([1.0, math.nan, 2.0]).add(3.0)
+    assert sketch.count == 3
+    assert sketch.quantile(0.5) == pytest.approx(2.0, rel=0.01)
+    assert math.isnan(QuantileSketch().quantile(0.5))
+
+
+def test_merge_equals_sketch_of_all_values():
+    parts = [_latencies(seed) for seed in (2, 3, 4)]
+    merged = merge_sketches(QuantileSketch(0.01).add(part) for part in parts)
+    whole = QuantileSketch(0.01).add([v for part in parts for v in part])
+    assert _same_sketch(merged, whole)
+    _assert_within_accuracy(merged, [v for part in parts for v in part], 0.01)
+
+
+def test_merge_is_associative_and_commutative():
+    a, b, c = (QuantileSketch(0.01).add(_latencies(seed, n=500 * seed)) for seed in (5, 6, 7))
+    left = merge_sketches([merge_sketches([a, b]), c])
+    right = merge_sketches([a, merge_sketches([b, c])])
+    reordered = merge_sketches([c, a, b])
+    assert _same_sketch(left, right)
+    assert _same_sketch(left, reordered)
+    # The inputs are not modified
+    assert a.count == len(_latencies(5, n=2500))
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_dict_roundtrip():
+    sketch = QuantileSketch(0.01).add(_latencies(seed=8))
+    d = json.loads(json.dumps(sketch.to_dict()))
+    copy = QuantileSketch.from_dict(d)
+    assert copy.to_dict() == sketch.to_dict()
+    np.testing.assert_array_equal(copy.quantile(QUANTILES), sketch.quantile(QUANTILES))
+    small = QuantileSketch(0.01, max_buckets=40).add(_latencies(seed=8))
+    assert QuantileSketch.from_dict(json.loads(json.dumps(small.to_dict()))).max_buckets == 40
+    empty = QuantileSketch.from_dict(json.loads(json.dumps(QuantileSketch().to_dict())))
+    assert empty.count == 0 and math.isnan(empty.quantile(0.5))
+
+
+def test_collapse_lowest_with_negative_values():
+    # Magnitudes from 1e-3 to 1e3 on both sides need ~700 buckets per side at 1%, 40 cover a factor ~2.2
+    rnd = random.Random(9)
+    values = [sign * 10 ** rnd.uniform(-3, 3) for sign in (1, -1) for _ in range(2000)]
+    sketch = QuantileSketch(0.01, max_buckets=40).add(values)
+    assert len(sketch._positive.counts) <= 40
+    assert len(sketch._negative.counts) <= 40
+    assert sketch._positive.counts.sum() + sketch._negative.counts.sum() + sketch.zero_count == len(values)
+    got = sketch.quantile(QUANTILES)
+    assert np.all(np.diff(got) >= 0)
+    # Collapsing only loses accuracy for the smallest magnitudes: the tails on both sides stay exact(ish)
+    for q in (0.0, 0.01, 0.99, 1.0):
+        exact = _exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * abs(exact), q
+    # Small negative values are reported with a larger magnitude, never with the wrong sign
+    assert sketch.quantile(0.49) < 0 < sketch.quantile(0.51)
+
@@ -0,0 +1,139 @@
+import os
+import pickle
+from dataclasses import dataclass
+from typing import Optional
+
+import pytest
+
+from VRTstatistics.cache import ViewCache
+from VRTstatistics.datastore import DataStore
+from VRTstatistics.views import LatencyHeatmapView, LatencyView, View, extract_latency_heatmap, extract_pages, extract_views, lazy_member
+
+
+@dataclass
+class CountView(View):
+    """Number of records. Applicable only to stores with more than one record."""
+    count: int
+
+    @classmethod
+    def is_applicable(cls, ds: DataStore) -> bool:
+        return len(ds.data) > 1
+
+
+CountView.register_extractor(lambda ds: CountView(description=ds.describe(), count=len(ds.data)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": 0.0, "role": "sender"}])
+    ds.save()
+    return filename
+
+
+def test_extract_after_not_applicable_in_extract_views(store, tmp_path):
+    cache = ViewCache(os.path.join(tmp_path, "cache"))
+    ds = DataStore(store)
+    assert extract_views(ds, [CountView], cache=cache) == {}
+    # The same cache key now holds the not-applicable marker: extract() must not return it
+    view = CountView.extract(DataStore(store), cache=cache)
+    assert isinstance(view, CountView)
+    assert view.count == 1
+    assert isinstance(CountView.extract(DataStore(store), cache=cache), CountView)
+
+
+def test_cached_object_of_other_type_is_a_miss(store, tmp_path):
+    cache = ViewCache(os.path.join(tmp_path, "cache"))
+    ds = DataStore(store)
+    cache.put(cache.key(CountView, ds, {}), {"count": 1})
+    assert isinstance(CountView.extract(ds, cache=cache), CountView)
+
+
+@dataclass
+class SlowView(View):
+    """A View with a lazy member that counts how often it is computed."""
+    count: int
+    extra: Optional[int] = lazy_member(lambda view, ds: _computed.append(view) or len(ds.data) * 10)
+
+
+_computed: list = []
+
+
+def _slow_view(store: str) -> SlowView:
+    ds = DataStore(store)
+    ds.load()
+    view = SlowView(description="", count=len(ds.data))
+    view._source = ds
+    return view
+
+
+def test_pickle_keeps_lazy_members_lazy(store):
+    _computed.clear()
+    view = _slow_view(store)
+    copy = pickle.loads(pickle.dumps(view))
+    assert _computed == []
+    # The source came along, so the member can still be computed
+    assert copy.extra == 10
+    assert len(_computed) == 1
+
+
+def test_pickle_drops_source_when_nothing_is_lazy(store):
+    _computed.clear()
+    view = _slow_view(store)
+    assert view.extra == 10
+    assert pickle.loads(pickle.dumps(view))._source is None
+    assert pickle.loads(pickle.dumps(view)).extra == 10
+    assert len(_computed) == 1
+
+
+def test_materialize(store):
+    _computed.clear()
+    view = _slow_view(store).materialize()
+    assert len(_computed) == 1
+    assert view._source is None
+    assert pickle.loads(pickle.dumps(view)).extra == 10
+
+
+def test_latency_view_positional_fields():
+    # Fields added later are keyword-only, so positional construction is as before
+    view = LatencyView("run", "area", "end2end", "framedrops", "tileswitches")
+    assert (view.area, view.end2end, view.framedrops, view.tileswitches) == ("area", "end2end", "framedrops", "tileswitches")
+    assert view.show_framedrops is False
+    with pytest.raises(TypeError):
+        LatencyView("run", "area", "end2end", None, None, True)
+    assert LatencyView("run", "area", "end2end").framedrops is None
+
+
+def test_extract_pages_streams_an_unloaded_store(tmp_path):
+    filename = os.path.join(tmp_path, "combined.json")
+    ds = DataStore(filename)
+    ds.load_data([{"sessiontime": t} for t in [0.5, 1.0, 1.5, 1.7, 4.2, 4.3, 4.9]])
+    ds.save()
+    ds = DataStore(filename)
+    pages = [(t0, t1, [view.count for view in views.values()]) for t0, t1, views in extract_pages(ds, [CountView], 1.0)]
+    # CountView is not applicable to the window with a single record, empty windows are skipped
+    assert pages == [(0.0, 1.0, []), (1.0, 2.0, [3]), (4.0, 5.0, [3])]
+    assert ds.data == []
+
+
+def test_latency_heatmap_counts_every_stage_sample():
+    ds = DataStore("combined.json")
+    records = []
+    for i in range(60):
+        records.append({"sessiontime": float(i), "component_role": "sender.pc.encoder", "encoder_ms": float(i % 7)})
+        if i % 3:
+            records.append({"sessiontime": i + 0.5, "component_role": "receiver.pc.renderer", "latency_ms": 100.0 + i})
+        # A stage that reports the field without a value
+        records.append({"sessiontime": i + 0.2, "component_role": "receiver.pc.decoder", "decoder_ms": None})
+    ds.load_data(records)
+    ds.applied_annotations["latency"] = {"sender": "sender", "receiver": "receiver"}
+    view = extract_latency_heatmap(ds, time_bins=6, latency_bins=8, latency_max=150.0)
+    assert isinstance(view, LatencyHeatmapView)
+    assert sorted(view.heatmaps) == ["receiver.pc.renderer.latency_ms", "sender.pc.encoder.encoder_ms"]
+    assert view.heatmaps["sender.pc.encoder.encoder_ms"].to_numpy().sum() == 60
+    latency = view.heatmaps["receiver.pc.renderer.latency_ms"]
+    assert latency.to_numpy().sum() == 40
+    # latency_max: 100 + i > 150 is counted in the top bucket
+    assert latency.shape == (6, 8)
+    assert latency.iloc[:, -1].sum() == sum(1 for i in range(60) if i % 3 and 100.0 + i >= 150.0 - 150.0 / 8)
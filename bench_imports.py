@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the VRTstatistics command line tools.
+
+Runs the quick paths of every entry point (--version, --help, --list, --list-types)
+in fresh interpreters, and reports for each the median wall time (compared to a bare
+interpreter start) and which heavy modules (pandas, numpy, matplotlib, socketio,
+requests) it imported. None of these paths should import any of them.
+
+Usage:
+  python bench_imports.py [-n REPEAT] [--check] [--importtime MODULE]
+
+--check exits with status 1 if a quick path imports a heavy module.
+--importtime MODULE prints the slowest imports of MODULE (python -X importtime).
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+CASES: List[Tuple[str, List[str]]] = [
+    ("VRTstatistics.scripts.plot", ["--version"]),
+    ("VRTstatistics.scripts.plot", ["--help"]),
+    ("VRTstatistics.scripts.plot", ["--list-types"]),
+    ("VRTstatistics.scripts.annotate", ["--help"]),
+    ("VRTstatistics.scripts.annotate", ["--list"]),
+    ("VRTstatistics.scripts.filter", ["--help"]),
+    ("VRTstatistics.scripts.ingest", ["--help"]),
+    ("VRTstatistics.scripts.report", ["--help"]),
+]
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "socketio", "requests"]
+
+# Runs an entry point like `python -m`, then reports the heavy modules it imported on the last line.
+PROBE = """
+import runpy, sys
+sys.argv = {argv!r}
+try:
+    runpy.run_module({module!r}, run_name="__main__", alter_sys=True)
+except SystemExit:
+    pass
+print("@@" + " ".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def run_time(cmd: List[str], repeat: int) -> float:
+    """Median wall time in ms of running cmd repeat times."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def heavy_imports(module: str, args: List[str]) -> List[str]:
+    """The heavy modules imported by running module with args."""
+    code = PROBE.format(argv=[module] + args, module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout
+    last = [line for line in out.splitlines() if line.startswith("@@")]
+    return last[-1][2:].split() if last else ["?"]
+
+
+def print_importtime(module: str, top: int = 15) -> None:
+    """Print the top imports of module by cumulative time."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    print(f"Slowest imports of {module} (cumulative ms):")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark start-up time of the VRTstatistics command line tools")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="Runs per case, the median is reported (default: 5)")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a case imports a heavy module")
+    parser.add_argument("--importtime", metavar="MODULE", help="Print the slowest imports of MODULE and exit")
+    args = parser.parse_args()
+
+    if args.importtime:
+        print_importtime(args.importtime)
+        return
+
+    baseline = run_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'command':50s} {'ms':>8s} {'+ms':>8s}  heavy imports")
+    print(f"{'python -c pass':50s} {baseline:8.1f} {0:8.1f}")
+    failed = False
+    for module, case_args in CASES:
+        ms = run_time([sys.executable, "-m", module] + case_args, args.repeat)
+        heavy = heavy_imports(module, case_args)
+        failed = failed or bool(heavy)
+        label = f"{module.rsplit('.', 1)[-1]} {' '.join(case_args)}"
+        print(f"{label:50s} {ms:8.1f} {ms - baseline:8.1f}  {' '.join(heavy) or '-'}")
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
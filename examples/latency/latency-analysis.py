@@ -14,7 +14,8 @@ import os
 import glob
 
 from VRTstatistics.datastore import DataStore
-from VRTstatistics.plots import plot_latencies, plot_framerates_and_dropped, plot_pointcounts
+from VRTstatistics.views import LatencyView, FramerateView, PointcountView, extract_views
+from VRTstatistics.plots import PlotStyle, render_latencies, render_framerates_and_dropped, render_pointcounts
 import matplotlib.pyplot as plt
 
 if len(sys.argv) > 1:
@@ -32,9 +33,9 @@ print(f"Using: {combined_json}")
 ds = DataStore(combined_json)
 ds.load()
 
-plot_latencies(ds)
-plt.figure()
-plot_framerates_and_dropped(ds)
-plt.figure()
-plot_pointcounts(ds)
+# Extract all three views with a single pass over the data
+views = extract_views(ds, [LatencyView, FramerateView, PointcountView])
+render_latencies(views["latencies"], style=PlotStyle(figsize=(6, 4)))
+render_framerates_and_dropped(views["framerates"])
+render_pointcounts(views["pointcounts"])
 plt.show()
@@ -1,133 +1,319 @@
 #!/usr/bin/env python3
 """
-Regression test for plot output. For each run directory passed as argument:
-  - Renames existing plots to .old. variants
-  - Regenerates all applicable plots using the current API
-  - Does NOT show plots interactively; saves to files for eyeball comparison
+Rendering benchmark and regression test for plot output.
 
-Usage:
-  python test_plots.py <run-dir> [<run-dir> ...]
+Renders every registered View type for a set of DataStores: the combined.json of each run
+directory passed as argument and/or synthetic stores generated here (--synthetic, the
+default without run directories). For every (store, View type) it records
+
+  - render time (View.render), minimum over --repeat renders
+  - save time (publish_plots to PDF), minimum over --repeat saves
+  - output file size of that PDF
+  - a perceptual hash (256 bit difference hash) of the figures rendered to pixels
+
+and compares them with a baseline JSON file (--baseline, default test_plots-baseline.json
+next to this script, which holds the hashes and sizes of the synthetic stores). Visual
+changes (hash distance above --max-distance bits) and output growth (more than
+--size-tolerance larger) are reported as regressions, and make the exit status 1. With
+--timings slowdowns (more than --time-tolerance slower, and at least --min-time seconds)
+are regressions too: timings are only comparable on the same machine, so they are only
+recorded in the baseline and compared with --timings. Use --update-baseline to (re)write
+the baseline after an intended change.
+
+The plots are written to --output (default: a temporary directory), one subdirectory
+per store, for eyeball comparison.
 
-All plot types are attempted. Plots requiring nTiles > 1 are skipped silently
-for single-tile runs.
+Usage:
+  python test_plots.py [--synthetic] [--baseline FILE | --no-baseline] [--update-baseline] [--timings] [-o DIR] [<run-dir> ...]
 """
-import sys
+import argparse
+import io
+import json
 import os
-import shutil
+import platform
+import random
+import sys
+import tempfile
+import time
 import traceback
+from typing import Any, Dict, List, Tuple
 
 import matplotlib
 matplotlib.use('Agg')
+import matplotlib.image
 import matplotlib.pyplot as pyplot
+import numpy as np
 
-from VRTstatistics.datastore import DataStore, DataStoreError
+from VRTstatistics.datastore import DataStore, FILEVERSION
+from VRTstatistics.views import View, extract_views
 import VRTstatistics.plots as plots
 
+# Synthetic stores: name → (duration in seconds, nTiles).
+SYNTHETIC_STORES: Dict[str, Tuple[float, int]] = {
+    "synthetic-1tile-120s": (120.0, 1),
+    "synthetic-2tile-300s": (300.0, 2),
+    "synthetic-4tile-600s": (600.0, 4),
+}
 
-PLOTARGS = dict(alpha=0.6)
+HASH_SIZE = 16
 
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_plots-baseline.json")
 
-def rename_old(dir: str, name: str) -> None:
-    """Rename dir/name to dir/<stem>.old.<ext> if it exists."""
-    src = os.path.join(dir, name)
-    stem, ext = os.path.splitext(name)   # "latency", ".png"
-    dst = os.path.join(dir, f"{stem}.old{ext}")
-    if os.path.exists(src):
-        shutil.copy2(src, dst)
-        print(f"  saved old → {os.path.basename(dst)}")
 
+# ── Synthetic stores ──────────────────────────────────────────────────────────
+
+def make_synthetic_store(path: str, duration: float, nTiles: int, interval: float = 0.5, seed: int = 1) -> None:
+    """Write a deterministic combined.json of a sender/receiver point cloud session with nTiles tiles."""
+    rnd = random.Random(seed)
+    component_map: Dict[str, Dict[str, str]] = {
+        "sender": {"G": "sender.pc.grabber", "E": "sender.pc.encoder"},
+        "receiver": {"S": "receiver.synchronizer", "TS": "receiver.pc.tileselector"},
+    }
+    for tile in range(nTiles):
+        component_map["sender"][f"W{tile}"] = f"sender.pc.writer.{tile}"
+        for key, component in (("R", "reader"), ("D", "decoder"), ("P", "preparer"), ("X", "renderer")):
+            component_map["receiver"][f"{key}{tile}"] = f"receiver.pc.{component}.{tile}"
+    data: List[Dict[str, Any]] = []
+    t = 0.0
+    seq = 0
+    while t < duration:
+        seq += int(15 * interval)
+        # A slow periodic swell plus noise, so the plots have some shape to preserve.
+        swell = 1.0 + 0.5 * np.sin(2 * np.pi * t / 60.0)
+
+        def add(role: str, component: str, **fields: Any) -> None:
+            data.append(dict(sessiontime=round(t + rnd.random() * interval, 4), role=role, component=component, **fields))
+
+        add("sender", "G", fps=15.0, fps_dropped=rnd.choice([0, 0, 0, 0.5]), encoder_queue_ms=rnd.uniform(1, 5), downsample_ms=1.0, aggregate_packets=seq)
+        add("sender", "E", fps=15.0, encoder_ms=rnd.uniform(20, 40) * swell, transmitter_queue_ms=rnd.uniform(1, 10), aggregate_packets=seq * nTiles)
+        for tile in range(nTiles):
+            add("sender", f"W{tile}", fps=15.0, aggregate_packets=seq)
+            add("receiver", f"R{tile}", fps=15.0, fps_dropped=0, receive_ms=rnd.uniform(1, 3), aggregate_packets=seq - 2)
+            add("receiver", f"D{tile}", fps=15.0, fps_dropped=0, decoder_queue_ms=rnd.uniform(1, 5), decoder_ms=rnd.uniform(10, 30) * swell, aggregate_packets=seq - 3)
+            add("receiver", f"P{tile}", fps=15.0, fps_dropped=0, aggregate_packets=seq - 4)
+            add("receiver", f"X{tile}", fps=15.0, renderer_queue_ms=rnd.uniform(1, 20), latency_ms=rnd.uniform(200, 400) * swell,
+                latency_max_ms=rnd.uniform(400, 600) * swell, points_per_cloud=rnd.randint(10000, 20000))
+        add("receiver", "S", fps=15.0, latency_ms=rnd.uniform(150, 300) * swell)
+        if rnd.random() < 0.05:
+            add("receiver", "TS", tile0=1)
+        for role in ("sender", "receiver"):
+            add(role, "ResourceConsumption", cpu=rnd.uniform(10, 90), mem=rnd.uniform(1e8, 2e8), recv_bandwidth=rnd.uniform(0, 1e6), sent_bandwidth=rnd.uniform(0, 1e6))
+        t += interval
+    data.sort(key=lambda record: record["sessiontime"])
+    session = {
+        "session_id": "synthetic",
+        "session_start_time": 1760000000.0,
+        "roles": ["sender", "receiver"],
+        "user_names": {"sender": "sender", "receiver": "receiver"},
+        "desyncs": {"sender": 0.0, "receiver": 0.01},
+        "desync_uncertainties": {"sender": 0.002, "receiver": 0.002},
+        "component_map": component_map,
+        "role_topology": {
+            "sender": {"protocol": "dash", "nTiles": nTiles, "nQualities": 1, "compressed": True},
+            "receiver": {"protocol": None, "nTiles": 1, "nQualities": 1, "compressed": False},
+        },
+    }
+    with open(path, "w") as fp:
+        json.dump({"fileversion": FILEVERSION, "session": session, "data": data}, fp)
+
+
+# ── Measurements ──────────────────────────────────────────────────────────────
+
+def perceptual_hash(figures: List[Any], dpi: int = 50) -> str:
+    """Difference hash of the figures (stacked vertically), as a hex string of HASH_SIZE**2 bits."""
+    images = []
+    for fig in figures:
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi)
+        buf.seek(0)
+        images.append(matplotlib.image.imread(buf, format="png")[:, :, :3].mean(axis=2))
+    width = min(image.shape[1] for image in images)
+    gray = np.vstack([image[:, :width] for image in images])
+    # Area-average down to HASH_SIZE rows and HASH_SIZE + 1 columns, then compare neighbours.
+    rows = np.array_split(np.arange(gray.shape[0]), HASH_SIZE)
+    cols = np.array_split(np.arange(gray.shape[1]), HASH_SIZE + 1)
+    small = np.array([[gray[np.ix_(r, c)].mean() for c in cols] for r in rows])
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):0{HASH_SIZE * HASH_SIZE // 4}x}"
 
-def try_plot(label: str, fn, *args, **kwargs):
-    try:
-        result = fn(*args, **kwargs)
-        print(f"  {label}: OK")
-        return result
-    except Exception as e:
-        print(f"  {label}: FAILED — {e}")
-        traceback.print_exc()
-        return None
-    finally:
-        pyplot.close('all')
 
+def hash_distance(a: str, b: str) -> int:
+    """Number of differing bits of two perceptual hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
 
-def process_dir(run_dir: str) -> None:
-    print(f"\n=== {run_dir}")
-    combined = os.path.join(run_dir, "combined.json")
-    if not os.path.exists(combined):
-        print("  SKIP: no combined.json")
-        return
 
-    ds = DataStore(combined)
+def measure_view(view: View, outdir: str, repeat: int) -> Dict[str, Any]:
+    """Render and save one View repeat times; return its timings, PDF size and perceptual hash."""
+    render_times = []
+    save_times = []
+    path = os.path.join(outdir, view.default_filename or f"{view.name}.pdf")
+    phash = ""
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        axes = view.render(style=plots.PlotStyle())
+        render_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        plots.publish_plots(axes, showplot=False, saveplot=True, dirname=outdir, file_name=os.path.basename(path))
+        save_times.append(time.perf_counter() - t0)
+        if i == 0:
+            phash = perceptual_hash(list(dict.fromkeys(ax.get_figure() for ax in axes)))
+        pyplot.close('all')
+    return {
+        "render_s": round(min(render_times), 4),
+        "save_s": round(min(save_times), 4),
+        "size_bytes": os.path.getsize(path),
+        "phash": phash,
+    }
+
+
+def measure_store(name: str, filename: str, outdir: str, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Measure every applicable registered View type of one store. Failures are recorded as {"error": ...}."""
+    print(f"\n=== {name} ({filename})")
+    ds = DataStore(filename)
     ds.load()
+    errors: Dict[str, Exception] = {}
+    t0 = time.perf_counter()
+    views = extract_views(ds, sorted(View._registry), errors=errors)
+    print(f"  extracted {len(views)} views in {time.perf_counter() - t0:.2f}s")
+    os.makedirs(outdir, exist_ok=True)
+    results: Dict[str, Dict[str, Any]] = {}
+    for view_name in sorted(View._registry):
+        if view_name in errors:
+            results[view_name] = {"error": f"extract: {type(errors[view_name]).__name__}: {errors[view_name]}"}
+        elif view_name not in views:
+            print(f"  {view_name}: SKIP (not applicable)")
+            continue
+        else:
+            try:
+                results[view_name] = measure_view(views[view_name], outdir, repeat)
+            except Exception as e:
+                traceback.print_exc()
+                pyplot.close('all')
+                results[view_name] = {"error": f"render: {type(e).__name__}: {e}"}
+        m = results[view_name]
+        if "error" in m:
+            print(f"  {view_name}: FAILED — {m['error']}")
+        else:
+            print(f"  {view_name}: render {m['render_s']:.3f}s, save {m['save_s']:.3f}s, {m['size_bytes'] / 1024:.0f} KiB")
+    return results
+
+
+# ── Baseline comparison ───────────────────────────────────────────────────────
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "matplotlib": matplotlib.__version__,
+    }
 
-    nTiles = ds.applied_annotations.get("latency", {}).get("nTiles", 1)
-    print(f"  nTiles={nTiles}")
-
-    # Rename existing plots to .old before regenerating
-    for name in ["latency.png", "framerates.pdf", "resources.pdf",
-                 "pointcounts.pdf", "progress.pdf", "latencies-per-tile.pdf"]:
-        rename_old(run_dir, name)
-
-    # latency
-    try_plot("plot_latencies", plots.plot_latencies,
-        ds,
-        showplot=False, saveplot=True,
-        dirname=run_dir, file_name="latency.png",
-        dpi=150, format="png",
-        ncols=2, use_row_major=False, labelspacing=0.2,
-        figsize=(6.4, 3.5),
-        title="Latency contributions",
-        show_disruptions=True,
-        plotargs=PLOTARGS,
-    )
-
-    # framerates
-    try_plot("plot_framerates_and_dropped", plots.plot_framerates_and_dropped,
-        ds,
-        showplot=False, saveplot=True,
-        dirname=run_dir,
-        plotargs=PLOTARGS,
-    )
-
-    # resources
-    try_plot("plot_resources", plots.plot_resources,
-        ds,
-        showplot=False, saveplot=True,
-        dirname=run_dir,
-    )
-
-    # pointcounts
-    try_plot("plot_pointcounts", plots.plot_pointcounts,
-        ds,
-        showplot=False, saveplot=True,
-        dirname=run_dir,
-    )
-
-    # progress
-    try_plot("plot_progress", plots.plot_progress,
-        ds,
-        showplot=False, saveplot=True,
-        dirname=run_dir,
-    )
-
-    # latencies per tile (only if nTiles > 1)
-    if nTiles > 1:
-        try_plot("plot_latencies_per_tile", plots.plot_latencies_per_tile,
-            ds,
-            showplot=False, saveplot=True,
-            dirname=run_dir,
-        )
-    else:
-        print("  plot_latencies_per_tile: SKIP (nTiles=1)")
 
+def compare(results: Dict[str, Dict[str, Dict[str, Any]]], baseline: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """Return a description of every regression of results relative to baseline."""
+    regressions = []
+    base_results = baseline.get("results", {})
+    for store, views in results.items():
+        if store not in base_results:
+            print(f"  {store}: not in baseline")
+            continue
+        for view_name, base in base_results[store].items():
+            label = f"{store}/{view_name}"
+            current = views.get(view_name)
+            if current is None:
+                regressions.append(f"{label}: missing (was rendered in baseline)")
+                continue
+            if "error" in current:
+                if "error" not in base:
+                    regressions.append(f"{label}: {current['error']}")
+                continue
+            if "error" in base:
+                continue
+            distance = hash_distance(current["phash"], base["phash"])
+            if distance > args.max_distance:
+                regressions.append(f"{label}: looks different (perceptual hash distance {distance} bits)")
+            for key in ("render_s", "save_s"):
+                if not args.timings or key not in base:
+                    continue
+                if current[key] > base[key] * (1 + args.time_tolerance) and current[key] - base[key] > args.min_time:
+                    regressions.append(f"{label}: {key[:-2]} time {current[key]:.3f}s, was {base[key]:.3f}s ({current[key] / base[key]:.1f}x)")
+            if current["size_bytes"] > base["size_bytes"] * (1 + args.size_tolerance):
+                regressions.append(f"{label}: output {current['size_bytes']} bytes, was {base['size_bytes']} ({current['size_bytes'] / base['size_bytes']:.1f}x)")
+        for view_name in views:
+            if view_name not in base_results[store]:
+                print(f"  {store}/{view_name}: not in baseline")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rendering benchmark and regression test for all registered plot types")
+    parser.add_argument("runs", nargs="*", metavar="RUN-DIR", help="Run directories containing combined.json")
+    parser.add_argument("--synthetic", action="store_true", help="Also use the synthetic stores (default if no run directories are given)")
+    parser.add_argument("-o", "--output", metavar="DIR", help="Directory for the rendered plots (default: a temporary directory)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Render and save every plot N times, report the fastest (default: 3)")
+    parser.add_argument("--baseline", metavar="FILE", default=DEFAULT_BASELINE, help="Baseline JSON file to compare with (default: %(default)s)")
+    parser.add_argument("--no-baseline", action="store_true", help="Only measure, do not compare with a baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the --baseline file instead of comparing")
+    parser.add_argument("--timings", action="store_true", help="Also compare (or with --update-baseline: record) render and save times, only meaningful on the machine that recorded them")
+    parser.add_argument("--max-distance", type=int, default=12, help=f"Perceptual hash bits (of {HASH_SIZE * HASH_SIZE}) that may differ (default: 12)")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="Fraction render/save time may grow (default: 0.5)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Ignore time increases below this many seconds (default: 0.05)")
+    parser.add_argument("--size-tolerance", type=float, default=0.2, help="Fraction output size may grow (default: 0.2)")
+    args = parser.parse_args()
+    if args.update_baseline and args.no_baseline:
+        parser.error("--update-baseline cannot be combined with --no-baseline")
+
+    outdir = args.output or tempfile.mkdtemp(prefix="test_plots-")
+    stores: Dict[str, str] = {}
+    if args.synthetic or not args.runs:
+        for name, (duration, nTiles) in SYNTHETIC_STORES.items():
+            filename = os.path.join(outdir, name, "combined.json")
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            make_synthetic_store(filename, duration, nTiles)
+            stores[name] = filename
+    for run_dir in args.runs:
+        filename = os.path.join(os.path.abspath(run_dir), "combined.json")
+        if not os.path.exists(filename):
+            print(f"{run_dir}: SKIP, no combined.json")
+            continue
+        stores[os.path.basename(os.path.abspath(run_dir))] = filename
+
+    results = {name: measure_store(name, filename, os.path.join(outdir, name), args.repeat) for name, filename in stores.items()}
+    failures = [f"{store}/{view}: {m['error']}" for store, views in results.items() for view, m in views.items() if "error" in m]
+    print(f"\nPlots written to {outdir}")
+
+    if args.update_baseline:
+        baseline: Dict[str, Any] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fp:
+                baseline = json.load(fp)
+        baseline["environment"] = environment()
+        if not args.timings:
+            del baseline["environment"]["node"]
+            results = {
+                store: {view: {k: v for k, v in m.items() if k not in ("render_s", "save_s")} for view, m in views.items()}
+                for store, views in results.items()
+            }
+        baseline.setdefault("results", {}).update(results)
+        with open(args.baseline, "w") as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+        print(f"Baseline {args.baseline} updated")
+        regressions: List[str] = []
+    elif args.no_baseline:
+        regressions = []
+    else:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if args.timings and baseline.get("environment", {}).get("node") != platform.node():
+            print(f"Note: baseline was recorded on {baseline.get('environment', {}).get('node')}, timings may not be comparable")
+        regressions = compare(results, baseline, args)
 
-def main():
-    if len(sys.argv) < 2:
-        print(__doc__)
+    for line in failures + regressions:
+        print(f"REGRESSION {line}" if line in regressions else f"FAILED {line}")
+    if failures or regressions:
+        print(f"\n{len(failures)} failures, {len(regressions)} regressions")
         sys.exit(1)
-    for run_dir in sys.argv[1:]:
-        process_dir(os.path.abspath(run_dir))
-    print("\nDone.")
+    print("\nOK")
 
 
 if __name__ == "__main__":